@@ -1,11 +1,21 @@
-from fastapi import FastAPI, Query
+from fastapi import FastAPI, Query, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 import aiomysql, os
-import psutil
-import time
+import asyncio
+import importlib.util
 import httpx
+from datetime import datetime
+from urllib.parse import quote
+from metrics import MetricsSampler
+import export
+import rollup
+import live
+from responses import FastJSONResponse, json_response, parse_fields
+import db
+from db import get_pool, get_read_pool
 
-app = FastAPI(title="OCPP API")
+app = FastAPI(title="OCPP API", default_response_class=FastJSONResponse)
 
 # Add CORS middleware
 app.add_middleware(
@@ -16,50 +26,108 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Config dari docker-compose environment
-DB_CONFIG = dict(
-    host=os.getenv("DB_HOST", "localhost"),
-    user=os.getenv("DB_USER", "ocppuser"),
-    password=os.getenv("DB_PASS", "ocpppass"),
-    db=os.getenv("DB_NAME", "ocpp"),
-)
+# Kolom yang boleh diminta lewat ?fields= (di-push ke SELECT)
+CP_COLUMNS = ["id", "vendor", "model", "firmware_version", "last_heartbeat", "connected", "site_id"]
+CP_FIELDS = CP_COLUMNS + ["total_kwh", "connectors"]
+TX_FIELDS = ["id", "cp_id", "connector_id", "id_tag", "meter_start", "meter_stop", "start_ts", "stop_ts"]
 
-async def get_pool():
-    return await aiomysql.create_pool(**DB_CONFIG)
+def _fields_or_400(fields, allowed):
+    try:
+        return parse_fields(fields, allowed)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-@app.get("/cps")
-async def get_cps():
-    pool = await get_pool()
-    result = []
+async def load_cps(wanted, limit=None, offset=0):
+    columns = [c for c in wanted if c in CP_COLUMNS]
+    if "id" not in columns:
+        columns.insert(0, "id")  # dibutuhkan untuk join kWh & connectors
+
+    pool = await get_read_pool()
     async with pool.acquire() as conn:
         async with conn.cursor(aiomysql.DictCursor) as cur:
-            # ambil charge points
-            await cur.execute("SELECT * FROM charge_points")
+            # ambil charge points (hanya kolom & halaman yang diminta)
+            sql, args = f"SELECT {', '.join(columns)} FROM charge_points ORDER BY id", ()
+            if limit is not None:
+                sql, args = sql + " LIMIT %s OFFSET %s", (limit, offset)
+            await cur.execute(sql, args)
             cps = await cur.fetchall()
 
-            for cp in cps:
-                cp_id = cp["id"]
+            # kalau dipaginasi, kWh & connectors hanya untuk CP di halaman ini
+            where, ids = "", [cp["id"] for cp in cps]
+            if limit is not None:
+                if not ids:
+                    return []
+                where = "WHERE cp_id IN (" + ",".join(["%s"] * len(ids)) + ")"
+            id_args = ids if where else None
 
-                # total kWh dihitung dari transaksi
-                await cur.execute("""
-                    SELECT SUM(meter_stop - meter_start)/1000 AS total_kwh
-                    FROM transactions
-                    WHERE cp_id=%s AND meter_stop IS NOT NULL
-                """, (cp_id,))
-                total = await cur.fetchone()
-                cp["total_kwh"] = total["total_kwh"] or 0
+            # total kWh per CP dari rollup harian (satu query, bukan satu per CP)
+            if "total_kwh" in wanted:
+                await cur.execute(f"SELECT cp_id, SUM(kwh) AS total_kwh FROM energy_rollup_daily {where} GROUP BY cp_id", id_args)
+                kwh = {r["cp_id"]: r["total_kwh"] for r in await cur.fetchall()}
+                for cp in cps:
+                    cp["total_kwh"] = round(kwh.get(cp["id"]) or 0, 3)
 
-                # ambil connector per CP
-                await cur.execute("""
-                    SELECT connector_id, status, error_code, last_update as last_heartbeat
-                    FROM connectors WHERE cp_id=%s
-                """, (cp_id,))
-                connectors = await cur.fetchall()
-                cp["connectors"] = connectors
+            # semua connector sekaligus, lalu dikelompokkan per CP
+            if "connectors" in wanted:
+                await cur.execute(f"""
+                    SELECT cp_id, connector_id, status, error_code, last_update as last_heartbeat
+                    FROM connectors {where}
+                """, id_args)
+                by_cp = {}
+                for c in await cur.fetchall():
+                    by_cp.setdefault(c.pop("cp_id"), []).append(c)
+                for cp in cps:
+                    cp["connectors"] = by_cp.get(cp["id"], [])
 
-                result.append(cp)
+    if "id" not in wanted:
+        for cp in cps:
+            del cp["id"]
+    return cps
 
-    return result
+async def load_stats():
+    # angka ringkasan: tabel kecil / rollup, tidak menyentuh transactions
+    pool = await get_read_pool()
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT COUNT(*) FROM charge_points")
+            (total_cps,) = await cur.fetchone()
+            await cur.execute("SELECT COUNT(*) FROM connectors WHERE status='Charging'")
+            (active_sessions,) = await cur.fetchone()
+            await cur.execute("SELECT COALESCE(SUM(kwh), 0) FROM energy_rollup_daily")
+            (total_energy,) = await cur.fetchone()
+    return {
+        "total_cps": total_cps,
+        "active_sessions": active_sessions,
+        "total_energy": round(float(total_energy), 2),
+    }
+
+async def load_top_kwh(n):
+    pool = await get_read_pool()
+    async with pool.acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cur:
+            await cur.execute(
+                "SELECT cp_id AS id, SUM(kwh) AS total_kwh FROM energy_rollup_daily GROUP BY cp_id ORDER BY total_kwh DESC LIMIT %s",
+                (n,),
+            )
+            return [{"id": r["id"], "total_kwh": round(r["total_kwh"] or 0, 3)} for r in await cur.fetchall()]
+
+@app.get("/cps")
+async def get_cps(
+    request: Request,
+    fields: str = Query(None, description="Comma-separated subset of: " + ",".join(CP_FIELDS)),
+    page: int = Query(None, ge=1),
+    limit: int = Query(None, ge=1, le=1000),
+):
+    wanted = _fields_or_400(fields, CP_FIELDS)
+    if page is None and limit is None:
+        return json_response(request, await load_cps(wanted))
+    page, limit = page or 1, limit or 50
+    cps, stats = await asyncio.gather(load_cps(wanted, limit, (page - 1) * limit), load_stats())
+    return json_response(request, cps, headers={"X-Total-Count": str(stats["total_cps"])})
+
+@app.get("/stats")
+async def get_stats():
+    return await load_stats()
 
 @app.get("/connectors/{cp_id}")
 async def get_connectors(cp_id: str):
@@ -69,23 +137,205 @@ async def get_connectors(cp_id: str):
             await cur.execute("SELECT * FROM connectors WHERE cp_id=%s", (cp_id,))
             return await cur.fetchall()
 
+async def load_transactions(columns, limit, offset):
+    pool = await get_read_pool()
+    async with pool.acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cur:
+            await cur.execute(f"SELECT {', '.join(columns)} FROM transactions ORDER BY id DESC LIMIT %s OFFSET %s", (limit, offset))
+            return await cur.fetchall()
+
 @app.get("/transactions")
-async def get_transactions(page: int = Query(1, ge=1), limit: int = Query(5, ge=1, le=100)):
-    pool = await get_pool()
+async def get_transactions(
+    request: Request,
+    page: int = Query(1, ge=1),
+    limit: int = Query(5, ge=1, le=100),
+    fields: str = Query(None, description="Comma-separated subset of: " + ",".join(TX_FIELDS)),
+):
+    columns = _fields_or_400(fields, TX_FIELDS)
+    # ambil satu baris ekstra untuk tahu ada halaman berikutnya (tanpa COUNT(*) di tabel besar)
+    rows = await load_transactions(columns, limit + 1, (page - 1) * limit)
+    has_more = len(rows) > limit
+    return json_response(request, rows[:limit], headers={"X-Has-More": "1" if has_more else "0"})
+
+@app.get("/export/transactions")
+async def export_transactions(
+    start: datetime = Query(..., description="Inclusive start of start_ts range"),
+    end: datetime = Query(None, description="Exclusive end of start_ts range (default: now)"),
+    cp_id: str = None,
+    format: str = Query("ndjson", pattern="^(ndjson|csv|parquet)$"),
+):
+    # Bulk export tanpa batas 100 baris, di-stream langsung dari SSCursor
+    if format == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        raise HTTPException(status_code=501, detail="Parquet export needs pyarrow installed")
+    end = end or datetime.now()
+    extra, args = "", [start, end]
+    if cp_id:
+        extra, args = "AND cp_id=%s", args + [cp_id]
+    sql = export.TRANSACTION_SQL.format(extra=extra)
+
+    batches = export.stream_rows(db.read_config(), sql, args)
+    body = export.ENCODERS[format](batches, export.TRANSACTION_COLUMNS)
+    filename = f"transactions_{start:%Y%m%d}_{end:%Y%m%d}.{format}"
+    return StreamingResponse(
+        body,
+        media_type=export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+# ---------------------
+# Analytics (dari rollup tables, bukan scan transaksi)
+# ---------------------
+@app.get("/analytics/energy")
+async def get_energy_analytics(
+    bucket: str = Query("day", pattern="^(hour|day|month)$"),
+    group_by: str = Query("fleet", pattern="^(cp|site|fleet)$"),
+    start: datetime = None,
+    end: datetime = None,
+    cp_id: str = None,
+    site_id: str = None,
+):
+    return await load_energy(bucket, group_by, start, end, cp_id, site_id)
+
+async def load_energy(bucket, group_by, start=None, end=None, cp_id=None, site_id=None):
+    sql, args = rollup.energy_query(bucket, group_by, start, end, cp_id, site_id)
+    pool = await get_read_pool()
     async with pool.acquire() as conn:
         async with conn.cursor(aiomysql.DictCursor) as cur:
-            offset = (page - 1) * limit
-            await cur.execute("SELECT * FROM transactions ORDER BY id DESC LIMIT %s OFFSET %s", (limit, offset))
+            await cur.execute(sql, args)
             rows = await cur.fetchall()
-            return rows
+            # jumlah CP per grup untuk menghitung occupancy (1 CP = 1 slot), dengan filter yang sama
+            await cur.execute(*rollup.cp_count_query(cp_id, site_id))
+            cps_per_site = {r["site"]: r["n"] for r in await cur.fetchall()}
+
+    result = []
+    for r in rows:
+        if group_by == "cp":
+            n_cps = 1
+        elif group_by == "site":
+            n_cps = cps_per_site.get(r["key"], 1)
+        else:
+            n_cps = sum(cps_per_site.values()) or 1
+        b = r["bucket"]
+        if isinstance(b, str):
+            b = datetime.strptime(b, "%Y-%m-%d")
+        seconds = float(r["occupied_seconds"] or 0)
+        result.append({
+            "bucket": b,
+            "key": r["key"],
+            "kwh": round(float(r["kwh"] or 0), 3),
+            "sessions": int(r["sessions"] or 0),
+            "occupied_hours": round(seconds / 3600, 2),
+            "occupancy": round(seconds / (rollup.bucket_seconds(bucket, b) * n_cps), 4),
+        })
+    return result
+
+@app.get("/analytics/top_cps")
+async def get_top_cps(n: int = Query(20, ge=1, le=500)):
+    # CP dengan total kWh terbesar (dari rollup harian)
+    return await load_top_kwh(n)
+
+@app.get("/analytics/heatmap")
+async def get_usage_heatmap(start: datetime = None, end: datetime = None, cp_id: str = None):
+    # Sesi per (jam, hari); weekday 0=Minggu
+    return await load_heatmap(start, end, cp_id)
+
+async def load_heatmap(start=None, end=None, cp_id=None):
+    sql, args = rollup.heatmap_query(start, end, cp_id)
+    pool = await get_read_pool()
+    async with pool.acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cur:
+            await cur.execute(sql, args)
+            rows = await cur.fetchall()
+    return [
+        {"hour": r["hour"], "weekday": r["weekday"], "sessions": int(r["sessions"]), "kwh": round(float(r["kwh"] or 0), 3)}
+        for r in rows
+    ]
+
+# ---------------------
+# Dashboard snapshot: semua data halaman utama dalam satu round trip
+# ---------------------
+@app.get("/dashboard/snapshot")
+async def get_dashboard_snapshot(
+    request: Request,
+    view: str = Query("dashboard", pattern="^(dashboard|stations|transactions|ai_insights|settings)$"),
+    page: int = Query(1, ge=1),
+    limit: int = Query(10, ge=1, le=100),
+):
+    # Hanya data yang dirender oleh view tsb; query independen jalan paralel
+    offset = (page - 1) * limit
+    if view == "dashboard":
+        stats, cps = await asyncio.gather(load_stats(), load_cps(["id", "connected", "total_kwh"], 3))
+        data = {"stats": stats, "cps": cps}
+    elif view == "stations":
+        stats, cps, heatmap = await asyncio.gather(load_stats(), load_cps(CP_FIELDS, limit, offset), load_heatmap())
+        data = {"stats": stats, "cps": cps, "heatmap": heatmap}
+    elif view == "transactions":
+        txs, top, daily = await asyncio.gather(
+            load_transactions(TX_FIELDS, limit + 1, offset),
+            load_top_kwh(20),
+            load_energy("day", "fleet"),
+        )
+        data = {"transactions": txs[:limit], "has_more": len(txs) > limit, "kwh_by_cp": top, "daily_usage": daily}
+    else:
+        # ai_insights & settings tidak butuh data fleet dari DB
+        data = {}
+    return json_response(request, data)
+
+# ---------------------
+# Live push (connector & transaction deltas)
+# ---------------------
+HUB = live.LiveHub(get_pool)
+SSE_KEEPALIVE = 15
+
+@app.websocket("/ws/live")
+async def live_ws(ws: WebSocket):
+    await ws.accept()
+    sub = await HUB.subscribe()
+    try:
+        await ws.send_text(live.encode(sub.snapshot))
+        while True:
+            event = await sub.queue.get()
+            await ws.send_text(live.encode(event))
+            if sub.dropped and sub.queue.empty():
+                await ws.close(code=1013, reason="slow consumer")
+                break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        HUB.unsubscribe(sub)
+
+@app.get("/stream/live")
+async def live_sse():
+    sub = await HUB.subscribe()
+
+    async def events():
+        try:
+            yield f"event: snapshot\ndata: {live.encode(sub.snapshot)}\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), SSE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {live.encode(event)}\n\n"
+                if sub.dropped and sub.queue.empty():
+                    yield "event: dropped\ndata: {}\n\n"
+                    break
+        finally:
+            HUB.unsubscribe(sub)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 # New ML endpoints
 ML_URL = os.getenv("ML_URL", "http://ml-service:8001")
 
 @app.get("/predict/availability")
-async def get_availability(hours: int = 24):
+async def get_availability(hours: int = 24, cp_id: str = None):
+    params = {"hours": hours}
+    if cp_id is not None:
+        params["cp_id"] = cp_id
     async with httpx.AsyncClient() as client:
-        resp = await client.get(f"{ML_URL}/predict/availability", params={"hours": hours})
+        resp = await client.get(f"{ML_URL}/predict/availability", params=params)
         return resp.json()
 
 @app.get("/predict/maintenance")
@@ -94,12 +344,27 @@ async def get_maintenance():
         resp = await client.get(f"{ML_URL}/predict/maintenance")
         return resp.json()
 
+@app.get("/predict/maintenance/alerts")
+async def get_maintenance_alerts(limit: int = 100, since: float = None):
+    params = {"limit": limit}
+    if since is not None:
+        params["since"] = since
+    async with httpx.AsyncClient() as client:
+        resp = await client.get(f"{ML_URL}/predict/maintenance/alerts", params=params)
+        return resp.json()
+
 @app.get("/analytics/users")
 async def get_user_analytics():
     async with httpx.AsyncClient() as client:
         resp = await client.get(f"{ML_URL}/analytics/users")
         return resp.json()
 
+@app.get("/analytics/users/{id_tag}/segment")
+async def get_user_segment(id_tag: str):
+    async with httpx.AsyncClient() as client:
+        resp = await client.get(f"{ML_URL}/analytics/users/{quote(id_tag, safe='')}/segment")
+        return FastJSONResponse(resp.json(), status_code=resp.status_code)
+
 @app.get("/optimize/load")
 async def get_load_optimization(duration: float = 1.0):
     async with httpx.AsyncClient() as client:
@@ -107,25 +372,82 @@ async def get_load_optimization(duration: float = 1.0):
         return resp.json()
 
 @app.get("/health/score")
-async def get_health_score():
+async def get_health_score(cp_id: str = None, site_id: str = None):
+    params = {k: v for k, v in (("cp_id", cp_id), ("site_id", site_id)) if v is not None}
+    async with httpx.AsyncClient() as client:
+        resp = await client.get(f"{ML_URL}/health/score", params=params)
+        return FastJSONResponse(resp.json(), status_code=resp.status_code)
+
+@app.get("/health/score/sites")
+async def get_health_score_sites(per_cp: bool = False):
+    async with httpx.AsyncClient() as client:
+        resp = await client.get(f"{ML_URL}/health/score/sites", params={"per_cp": per_cp})
+        return resp.json()
+
+@app.get("/health/score/history")
+async def get_health_score_history(limit: int = 96):
     async with httpx.AsyncClient() as client:
-        resp = await client.get(f"{ML_URL}/health/score")
+        resp = await client.get(f"{ML_URL}/health/score/history", params={"limit": limit})
         return resp.json()
 
+@app.post("/optimize/load/batch")
+@app.post("/predict/maintenance/batch")
+@app.post("/analytics/users/batch")
+async def ml_batch(request: Request):
+    # body & hasil diteruskan apa adanya (JSON atau Arrow IPC), tanpa decode di sini
+    headers = {k: v for k, v in request.headers.items() if k in ("content-type", "accept")}
+    async with httpx.AsyncClient(timeout=60) as client:
+        resp = await client.post(f"{ML_URL}{request.url.path}", content=await request.body(), headers=headers)
+    return Response(resp.content, status_code=resp.status_code, media_type=resp.headers.get("content-type"))
+
+# ---------------------
+# System monitoring
+# ---------------------
+SAMPLER = MetricsSampler(
+    "api-service",
+    pool_getter=lambda: db.POOLS,
+    peers={"ml-service": f"{ML_URL}/system/usage"},
+)
+
+BACKGROUND_TASKS = []
+
+@app.on_event("startup")
+async def start_sampler():
+    SAMPLER.start()
+    # /cps dan /stats membaca site_id & energy_rollup_daily: schema dibuat
+    # sebelum request pertama dilayani
+    try:
+        await rollup.ensure_schema(await get_pool())
+        schema_ready = True
+    except Exception as e:
+        rollup.logger.error("rollup schema gagal dibuat, dicoba ulang di background: %s", e)
+        schema_ready = False
+    BACKGROUND_TASKS.append(asyncio.create_task(rollup.rollup_loop(get_pool, schema_ready=schema_ready)))
+    if db.REPLICA_ENABLED:
+        BACKGROUND_TASKS.append(asyncio.create_task(db.replica_monitor()))
+
+@app.on_event("shutdown")
+async def stop_sampler():
+    await SAMPLER.stop()
+    await HUB.stop()
+    for task in BACKGROUND_TASKS:
+        task.cancel()
+    await db.close_pools()
+
 @app.get("/system/usage")
 async def get_system_usage():
-    # Monitor RAM and CPU usage
-    cpu_percent = psutil.cpu_percent(interval=1)
-    memory = psutil.virtual_memory()
-    ram_percent = memory.percent
-    ram_used_gb = memory.used / (1024 ** 3)
-    ram_total_gb = memory.total / (1024 ** 3)
+    # Monitor RAM and CPU usage (sampel terakhir dari background sampler)
+    return SAMPLER.latest()
 
+@app.get("/system/db")
+async def get_db_routing():
+    # Status routing read pool / replica
     return {
-        "cpu_percent": cpu_percent,
-        "ram_percent": ram_percent,
-        "ram_used_gb": round(ram_used_gb, 2),
-        "ram_total_gb": round(ram_total_gb, 2),
-        "timestamp": time.time()
+        "replica_enabled": db.REPLICA_ENABLED,
+        "replica": db.REPLICA_STATE,
+        "read_target": db.read_target(),
     }
 
+@app.get("/system/usage/history")
+async def get_system_usage_history(limit: int = Query(120, ge=1, le=5000), since: float = Query(None, ge=0)):
+    return SAMPLER.history(limit=limit, since=since)
@@ -0,0 +1,62 @@
+"""Compare two bench.load result files.
+
+    python -m bench.compare results/before.json results/after.json --threshold 10
+
+Prints throughput and p50/p99 change per endpoint and exits with status 1
+when any endpoint's p99 got worse by more than ``--threshold`` percent.
+"""
+import argparse
+import json
+import sys
+
+
+def pct(old, new):
+    if not old or new is None:
+        return None
+    return (new - old) / old * 100
+
+
+def fmt(v):
+    return "     -" if v is None else f"{v:+6.1f}%"
+
+
+def compare(before, after, threshold):
+    regressions = []
+    print(f"before: {before.get('label')} ({before.get('git_rev')}, {before.get('timestamp')})")
+    print(f"after : {after.get('label')} ({after.get('git_rev')}, {after.get('timestamp')})")
+    print(f"{'endpoint':24} {'rps':>8} {'p50':>8} {'p99':>8}")
+    for name, new in after["endpoints"].items():
+        old = before["endpoints"].get(name)
+        if old is None:
+            print(f"{name:24} (new)")
+            continue
+        d_rps = pct(old["throughput_rps"], new["throughput_rps"])
+        d_p50 = pct(old["p50_ms"], new["p50_ms"])
+        d_p99 = pct(old["p99_ms"], new["p99_ms"])
+        flag = ""
+        if d_p99 is not None and d_p99 > threshold:
+            regressions.append(name)
+            flag = "  <-- regression"
+        print(f"{name:24} {fmt(d_rps)} {fmt(d_p50)} {fmt(d_p99)}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two api-service benchmark runs")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10, help="allowed p99 increase in percent")
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    regressions = compare(before, after, args.threshold)
+    if regressions:
+        print(f"p99 regression > {args.threshold}% in: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Async load driver for api-service.
+
+Hits each endpoint with a fixed number of concurrent workers for a fixed
+duration and reports throughput, error count and latency percentiles. The
+result is written as JSON so runs can be compared with ``bench.compare``.
+
+    python -m bench.load --url http://localhost:5050 --duration 20 --concurrency 16 \\
+        --label "medium, 1 replica" --out results/medium.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import time
+
+import httpx
+
+# endpoint -> path; {cp_id} diisi dari /cps saat start
+ENDPOINTS = {
+    "cps": "/cps",
+    "cps_projected": "/cps?fields=id,connected",
+    "transactions": "/transactions?page=1&limit=100",
+    "transactions_deep_page": "/transactions?page=500&limit=100",
+    "connectors": "/connectors/{cp_id}",
+    "analytics_daily": "/analytics/energy?bucket=day&group_by=fleet",
+    "analytics_hourly_cp": "/analytics/energy?bucket=hour&group_by=cp&cp_id={cp_id}",
+    "analytics_heatmap": "/analytics/heatmap",
+    "predict_availability": "/predict/availability?hours=24",
+    "predict_maintenance": "/predict/maintenance",
+    "analytics_users": "/analytics/users",
+    "optimize_load": "/optimize/load?duration=1.5",
+    "health_score": "/health/score",
+}
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * p / 100
+    lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+async def _worker(client, path, deadline, latencies, errors):
+    while time.perf_counter() < deadline:
+        t0 = time.perf_counter()
+        try:
+            resp = await client.get(path)
+            await resp.aread()
+            if resp.status_code >= 400:
+                errors.append(resp.status_code)
+                continue
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append(time.perf_counter() - t0)
+
+
+async def run_endpoint(client, name, path, duration, concurrency):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    t0 = time.perf_counter()
+    await asyncio.gather(*[_worker(client, path, deadline, latencies, errors) for _ in range(concurrency)])
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    ms = lambda v: round(v * 1000, 2) if v is not None else None
+    return {
+        "path": path,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p90_ms": ms(percentile(latencies, 90)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1] if latencies else None),
+    }
+
+
+def _git_rev():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+async def run(url, names, duration, concurrency, warmup):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as client:
+        resp = await client.get("/cps", params={"fields": "id"})
+        cps = resp.json() if resp.status_code == 200 else []
+        cp_id = cps[0]["id"] if cps else "CP_00000"
+
+        results = {}
+        for name in names:
+            path = ENDPOINTS[name].format(cp_id=cp_id)
+            if warmup:
+                await run_endpoint(client, name, path, warmup, 1)
+            results[name] = await run_endpoint(client, name, path, duration, concurrency)
+            r = results[name]
+            print(
+                f"{name:24} {r['requests']:7d} req {r['errors']:5d} err {r['throughput_rps']:9.1f} rps  "
+                f"p50 {r['p50_ms']} ms  p90 {r['p90_ms']} ms  p99 {r['p99_ms']} ms"
+            )
+    return {"cps": len(cps), "endpoints": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark api-service endpoints")
+    parser.add_argument("--url", default="http://localhost:5050")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="comma-separated subset of: " + ",".join(ENDPOINTS))
+    parser.add_argument("--duration", type=float, default=10, help="seconds per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=float, default=1, help="seconds of single-worker warmup per endpoint")
+    parser.add_argument("--label", default="", help="free text stored in the result (e.g. dataset scale)")
+    parser.add_argument("--out", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    names = [n.strip() for n in args.endpoints.split(",") if n.strip()]
+    unknown = [n for n in names if n not in ENDPOINTS]
+    if unknown:
+        parser.error(f"unknown endpoint(s): {', '.join(unknown)}")
+
+    data = asyncio.run(run(args.url, names, args.duration, args.concurrency, args.warmup))
+    result = {
+        "label": args.label,
+        "url": args.url,
+        "git_rev": _git_rev(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "duration_s": args.duration,
+        "concurrency": args.concurrency,
+        **data,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
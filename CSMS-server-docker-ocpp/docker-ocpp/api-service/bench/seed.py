@@ -0,0 +1,231 @@
+"""Synthetic dataset seeder for api-service benchmarks.
+
+Generates ``charge_points``, ``connectors``, ``users`` and ``transactions``
+with a realistic shape: a daily usage curve with morning/evening peaks,
+log-normal session durations, kWh from power x duration, a skewed mix of
+frequent and occasional drivers, and a few open sessions. Rows are
+generated and inserted in chunks, so even the 10M scale runs in constant
+memory.
+
+    # into the docker-compose MariaDB (port 3307)
+    python -m bench.seed --scale medium --host 127.0.0.1 --port 3307 --user energy --password energypass
+
+    # into a SQLite file as a stand-in (no server needed)
+    python -m bench.seed --scale small --sqlite bench.db
+"""
+import argparse
+import asyncio
+import math
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+SCALES = {
+    # nama: (charge points, users, transactions)
+    "tiny": (10, 50, 10_000),
+    "small": (100, 1_000, 100_000),
+    "medium": (1_000, 10_000, 1_000_000),
+    "large": (10_000, 100_000, 10_000_000),
+}
+
+CHUNK = 10_000
+CONNECTORS_PER_CP = 2
+STATUSES = ["Available"] * 70 + ["Charging"] * 20 + ["Preparing"] * 4 + ["Finishing"] * 3 + ["Faulted"] * 3
+ERRORS = ["NoError"] * 97 + ["GroundFailure", "OverCurrentFailure", "PowerMeterFailure"]
+# bobot jam mulai sesi (0-23): puncak pagi & sore
+HOUR_WEIGHTS = [1, 0.5, 0.3, 0.3, 0.5, 1, 3, 6, 8, 6, 4, 4, 5, 4, 4, 5, 7, 9, 10, 8, 6, 4, 3, 2]
+
+SQLITE_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS charge_points (
+        id TEXT PRIMARY KEY, vendor TEXT, model TEXT, firmware_version TEXT,
+        last_heartbeat TEXT, connected INTEGER DEFAULT 0, site_id TEXT)""",
+    """CREATE TABLE IF NOT EXISTS connectors (
+        cp_id TEXT NOT NULL, connector_id INTEGER NOT NULL, status TEXT, error_code TEXT,
+        last_update TEXT, PRIMARY KEY (cp_id, connector_id))""",
+    """CREATE TABLE IF NOT EXISTS transactions (
+        id INTEGER PRIMARY KEY, cp_id TEXT, connector_id INTEGER, id_tag TEXT,
+        meter_start INTEGER, meter_stop INTEGER, start_ts TEXT, stop_ts TEXT)""",
+    """CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY, id_tag TEXT NOT NULL UNIQUE, name TEXT, email TEXT)""",
+    "CREATE INDEX IF NOT EXISTS idx_tx_start ON transactions (start_ts)",
+    "CREATE INDEX IF NOT EXISTS idx_tx_cp ON transactions (cp_id)",
+]
+
+
+def cp_rows(n_cps, rng, now):
+    for i in range(n_cps):
+        yield (
+            f"CP_{i:05d}",
+            rng.choice(["DemoVendor", "ABB", "Schneider", "Wallbox"]),
+            rng.choice(["DemoModel", "Terra AC", "EVlink Pro", "Pulsar"]),
+            rng.choice([None, "1.2.3", "2.0.1"]),
+            now - timedelta(seconds=rng.randint(0, 600)),
+            int(rng.random() < 0.9),
+            f"SITE_{i // 25:03d}",
+        )
+
+
+def connector_rows(n_cps, rng, now):
+    for i in range(n_cps):
+        for c in range(1, CONNECTORS_PER_CP + 1):
+            yield (
+                f"CP_{i:05d}", c, rng.choice(STATUSES), rng.choice(ERRORS),
+                now - timedelta(seconds=rng.randint(0, 3600)),
+            )
+
+
+def user_rows(n_users):
+    for i in range(n_users):
+        yield (i + 1, f"TAG-{i:06d}", f"Driver {i}", f"driver{i}@example.com")
+
+
+def transaction_rows(n_cps, n_users, n_tx, rng, now, days=365):
+    start = now - timedelta(days=days)
+    # sebagian kecil driver melakukan sebagian besar sesi (distribusi miring)
+    hot_users = max(1, n_users // 10)
+    # cp juga tidak merata: lokasi ramai vs sepi
+    cp_weights = [1 / (1 + i % 50) for i in range(n_cps)]
+    cp_cum = list(_cumulative(cp_weights))
+    hour_cum = list(_cumulative(HOUR_WEIGHTS))
+    for tx_id in range(1, n_tx + 1):
+        day = (tx_id - 1) * days // n_tx  # id naik seiring waktu, seperti AUTO_INCREMENT asli
+        hour = _pick(hour_cum, rng)
+        ts = start + timedelta(days=day, hours=hour, seconds=rng.randint(0, 3599))
+        duration_h = min(rng.lognormvariate(math.log(1.2), 0.6), 12)
+        power_kw = rng.choice([3.7, 7.4, 11, 22])
+        meter_start = rng.randint(0, 500_000)
+        user = rng.randrange(hot_users) if rng.random() < 0.7 else rng.randrange(n_users)
+        cp = _pick(cp_cum, rng)
+        open_session = tx_id > n_tx - max(1, n_tx // 10_000)  # beberapa sesi terakhir masih berjalan
+        stop = None if open_session else ts + timedelta(hours=duration_h)
+        meter_stop = None if open_session else meter_start + int(power_kw * duration_h * 1000 * rng.uniform(0.7, 1.0))
+        yield (
+            tx_id, f"CP_{cp:05d}", rng.randint(1, CONNECTORS_PER_CP), f"TAG-{user:06d}",
+            meter_start, meter_stop, ts, stop,
+        )
+
+
+def _cumulative(weights):
+    total = sum(weights)
+    acc = 0.0
+    for w in weights:
+        acc += w / total
+        yield acc
+
+
+def _pick(cum, rng):
+    r = rng.random()
+    lo, hi = 0, len(cum) - 1
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if cum[mid] < r:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def chunks(rows, size=CHUNK):
+    buf = []
+    for row in rows:
+        buf.append(row)
+        if len(buf) >= size:
+            yield buf
+            buf = []
+    if buf:
+        yield buf
+
+
+TABLES = [
+    ("charge_points", "id, vendor, model, firmware_version, last_heartbeat, connected, site_id"),
+    ("connectors", "cp_id, connector_id, status, error_code, last_update"),
+    ("users", "id, id_tag, name, email"),
+    ("transactions", "id, cp_id, connector_id, id_tag, meter_start, meter_stop, start_ts, stop_ts"),
+]
+
+
+def generators(scale, seed):
+    n_cps, n_users, n_tx = SCALES[scale]
+    rng = random.Random(seed)
+    now = datetime.now().replace(microsecond=0)
+    return {
+        "charge_points": cp_rows(n_cps, rng, now),
+        "connectors": connector_rows(n_cps, rng, now),
+        "users": user_rows(n_users),
+        "transactions": transaction_rows(n_cps, n_users, n_tx, rng, now),
+    }
+
+
+def seed_sqlite(path, scale, seed):
+    conn = sqlite3.connect(path)
+    for ddl in SQLITE_SCHEMA:
+        conn.execute(ddl)
+    gens = generators(scale, seed)
+    for table, cols in TABLES:
+        conn.execute(f"DELETE FROM {table}")
+        marks = ",".join("?" * len(cols.split(",")))
+        n = 0
+        for batch in chunks(gens[table]):
+            rows = [tuple(v.strftime("%Y-%m-%d %H:%M:%S") if isinstance(v, datetime) else v for v in r) for r in batch]
+            conn.executemany(f"INSERT INTO {table} ({cols}) VALUES ({marks})", rows)
+            n += len(rows)
+        conn.commit()
+        print(f"  {table}: {n} rows")
+    conn.close()
+
+
+async def seed_mysql(config, scale, seed):
+    import aiomysql
+
+    conn = await aiomysql.connect(**config, autocommit=False)
+    gens = generators(scale, seed)
+    try:
+        async with conn.cursor() as cur:
+            await cur.execute("ALTER TABLE charge_points ADD COLUMN IF NOT EXISTS site_id varchar(50) DEFAULT NULL")
+            await cur.execute("SET FOREIGN_KEY_CHECKS=0, UNIQUE_CHECKS=0")
+            for table, cols in TABLES:
+                await cur.execute(f"TRUNCATE TABLE {table}")
+                marks = ",".join(["%s"] * len(cols.split(",")))
+                n = 0
+                for batch in chunks(gens[table]):
+                    await cur.executemany(f"INSERT INTO {table} ({cols}) VALUES ({marks})", batch)
+                    await conn.commit()
+                    n += len(batch)
+                print(f"  {table}: {n} rows")
+            # rollup dibangun ulang oleh api-service dari watermark kosong
+            for table in ("energy_rollup_hourly", "energy_rollup_daily", "rollup_state"):
+                try:
+                    await cur.execute(f"TRUNCATE TABLE {table}")
+                except Exception:
+                    pass  # tabel belum dibuat (api-service belum pernah jalan)
+            await conn.commit()
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed a synthetic CSMS dataset")
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--sqlite", help="write to this SQLite file instead of MariaDB")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3307)
+    parser.add_argument("--user", default="energy")
+    parser.add_argument("--password", default="energypass")
+    parser.add_argument("--db", default="ocpp")
+    args = parser.parse_args()
+
+    n_cps, n_users, n_tx = SCALES[args.scale]
+    print(f"Seeding scale={args.scale}: {n_cps} CPs, {n_users} users, {n_tx} transactions")
+    t0 = time.perf_counter()
+    if args.sqlite:
+        seed_sqlite(args.sqlite, args.scale, args.seed)
+    else:
+        config = dict(host=args.host, port=args.port, user=args.user, password=args.password, db=args.db)
+        asyncio.run(seed_mysql(config, args.scale, args.seed))
+    print(f"Done in {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
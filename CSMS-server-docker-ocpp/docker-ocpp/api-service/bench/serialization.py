@@ -0,0 +1,126 @@
+"""Serialization benchmark for the /cps payload.
+
+Builds a synthetic fleet (default 10k charge points, 2 connectors each) shaped
+like the rows aiomysql returns, then compares:
+
+- FastAPI's default path (jsonable_encoder + json.dumps)
+- the FastJSONResponse path in responses.py (orjson when installed)
+- payload size raw / gzip / brotli, with and without a ``fields=`` projection
+
+Run from the api-service directory:
+
+    python -m bench.serialization --cps 10000 --out serialization.json
+"""
+import argparse
+import gzip
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from fastapi.encoders import jsonable_encoder
+
+import responses
+
+
+def make_fleet(n_cps, connectors_per_cp=2, seed=42):
+    rng = random.Random(seed)
+    now = datetime(2025, 10, 27, 10, 0, 0)
+    fleet = []
+    for i in range(n_cps):
+        cp = {
+            "id": f"CP_{i:05d}",
+            "vendor": rng.choice(["DemoVendor", "ABB", "Schneider", "Wallbox"]),
+            "model": rng.choice(["DemoModel", "Terra AC", "EVlink Pro", "Pulsar"]),
+            "firmware_version": rng.choice([None, "1.2.3", "2.0.1"]),
+            "last_heartbeat": now - timedelta(seconds=rng.randint(0, 3600)),
+            "connected": rng.randint(0, 1),
+            "site_id": f"SITE_{i // 50:03d}",
+            "total_kwh": Decimal(f"{rng.uniform(0, 5000):.4f}"),
+            "connectors": [
+                {
+                    "connector_id": c + 1,
+                    "status": rng.choice(["Available", "Charging", "Faulted", "Preparing"]),
+                    "error_code": rng.choice(["NoError"] * 9 + ["GroundFailure"]),
+                    "last_heartbeat": now - timedelta(seconds=rng.randint(0, 3600)),
+                }
+                for c in range(connectors_per_cp)
+            ],
+        }
+        fleet.append(cp)
+    return fleet
+
+
+def project(fleet, fields):
+    return [{k: cp[k] for k in fields} for cp in fleet]
+
+
+def timeit(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def default_path(rows):
+    return json.dumps(jsonable_encoder(rows)).encode()
+
+
+def run(n_cps, repeat):
+    fleet = make_fleet(n_cps)
+    cases = {
+        "all_fields": fleet,
+        "fields=id,connected,connectors": project(fleet, ["id", "connected", "connectors"]),
+        "fields=id,total_kwh": project(fleet, ["id", "total_kwh"]),
+    }
+    results = {
+        "cps": n_cps,
+        "orjson": responses.orjson is not None,
+        "brotli": responses.brotli is not None,
+        "cases": {},
+    }
+    for name, rows in cases.items():
+        t_default, _ = timeit(lambda: default_path(rows), repeat)
+        t_fast, body = timeit(lambda: responses.dumps(rows), repeat)
+        t_gzip, gz = timeit(lambda: gzip.compress(body, compresslevel=5), repeat)
+        case = {
+            "default_ms": round(t_default * 1000, 2),
+            "fast_ms": round(t_fast * 1000, 2),
+            "speedup": round(t_default / t_fast, 1) if t_fast else None,
+            "raw_bytes": len(body),
+            "gzip_bytes": len(gz),
+            "gzip_ms": round(t_gzip * 1000, 2),
+        }
+        if responses.brotli is not None:
+            t_br, br = timeit(lambda: responses.brotli.compress(body, quality=4), repeat)
+            case.update(br_bytes=len(br), br_ms=round(t_br * 1000, 2))
+        results["cases"][name] = case
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cps", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = run(args.cps, args.repeat)
+    print(f"{args.cps} CPs  (orjson={results['orjson']}, brotli={results['brotli']})")
+    print(f"{'case':34} {'default ms':>10} {'fast ms':>8} {'x':>5} {'raw KB':>8} {'gzip KB':>8} {'br KB':>7}")
+    for name, c in results["cases"].items():
+        br = f"{c['br_bytes'] / 1024:7.0f}" if "br_bytes" in c else "      -"
+        print(
+            f"{name:34} {c['default_ms']:10.1f} {c['fast_ms']:8.1f} {c['speedup']:5.1f} "
+            f"{c['raw_bytes'] / 1024:8.0f} {c['gzip_bytes'] / 1024:8.0f} {br}"
+        )
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
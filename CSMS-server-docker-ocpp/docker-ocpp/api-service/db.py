@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import os
+import time
+
+import aiomysql
+
+logger = logging.getLogger("api-service.db")
+
+# ---------------------
+# DB pools: primary vs read replica
+# ---------------------
+# - primary : data yang harus segar (/connectors, live) dan semua
+#             penulisan (rollup). Ini server yang juga dipakai ocpp-server
+#             untuk StartTransaction dll.
+# - read    : semua query baca dashboard (/cps, /stats, /transactions,
+#             /dashboard/snapshot) dan endpoint berat (analytics, export).
+#             Mengarah ke replica kalau DB_READ_HOST di-set, kalau tidak ke
+#             primary tapi tetap pool terpisah dengan batas koneksi sendiri.
+# Kalau replica tertinggal > DB_READ_MAX_LAG detik atau mati, query read
+# dialihkan ke pool fallback di primary sampai replica pulih.
+
+# Config dari docker-compose environment
+DB_CONFIG = dict(
+    host=os.getenv("DB_HOST", "localhost"),
+    port=int(os.getenv("DB_PORT", "3306")),
+    user=os.getenv("DB_USER", "ocppuser"),
+    password=os.getenv("DB_PASS", "ocpppass"),
+    db=os.getenv("DB_NAME", "ocpp"),
+)
+
+READ_DB_CONFIG = dict(
+    DB_CONFIG,
+    host=os.getenv("DB_READ_HOST", DB_CONFIG["host"]),
+    port=int(os.getenv("DB_READ_PORT", str(DB_CONFIG["port"]))),
+    user=os.getenv("DB_READ_USER", DB_CONFIG["user"]),
+    password=os.getenv("DB_READ_PASS", DB_CONFIG["password"]),
+)
+REPLICA_ENABLED = bool(os.getenv("DB_READ_HOST"))
+
+POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+READ_POOL_MAX = int(os.getenv("DB_READ_POOL_MAX", "5"))
+REPLICA_MAX_LAG = float(os.getenv("DB_READ_MAX_LAG", "30"))
+REPLICA_CHECK_INTERVAL = float(os.getenv("DB_READ_CHECK_INTERVAL", "10"))
+
+POOLS = {}  # nama -> aiomysql pool
+_LOCK = asyncio.Lock()
+
+# status replica terakhir, diperbarui oleh replica_monitor()
+REPLICA_STATE = {"healthy": REPLICA_ENABLED, "lag": None, "checked_at": None, "error": None}
+
+
+async def _pool(name, config, maxsize):
+    if name not in POOLS:
+        async with _LOCK:
+            if name not in POOLS:
+                POOLS[name] = await aiomysql.create_pool(**config, minsize=1, maxsize=maxsize, autocommit=True)
+    return POOLS[name]
+
+
+async def get_pool():
+    """Primary pool (fresh reads and all writes)."""
+    return await _pool("primary", DB_CONFIG, POOL_MAX)
+
+
+async def get_read_pool():
+    """Pool for heavy read-only endpoints, replica-aware."""
+    if REPLICA_ENABLED and not REPLICA_STATE["healthy"]:
+        return await _pool("read_fallback", DB_CONFIG, READ_POOL_MAX)
+    return await _pool("read", READ_DB_CONFIG, READ_POOL_MAX)
+
+
+def read_target():
+    if not REPLICA_ENABLED:
+        return "primary (separate read pool)"
+    return "replica" if REPLICA_STATE["healthy"] else "primary (fallback)"
+
+
+def read_config():
+    """Connection settings for dedicated read connections (e.g. export cursors)."""
+    if REPLICA_ENABLED and not REPLICA_STATE["healthy"]:
+        return DB_CONFIG
+    return READ_DB_CONFIG
+
+
+async def check_replica():
+    pool = await _pool("read", READ_DB_CONFIG, READ_POOL_MAX)
+    async with pool.acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cur:
+            await cur.execute("SHOW SLAVE STATUS")
+            status = await cur.fetchone()
+    if status is None:
+        # bukan replica sungguhan (mis. instance lokal kedua sebagai stand-in)
+        return 0.0
+    lag = status.get("Seconds_Behind_Master")
+    if lag is None:
+        raise RuntimeError("replication not running")
+    return float(lag)
+
+
+async def update_replica_state():
+    """One replica check: route reads to the fallback pool while it is down or lagging."""
+    try:
+        lag = await check_replica()
+        healthy = lag <= REPLICA_MAX_LAG
+        REPLICA_STATE.update(lag=lag, error=None)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        healthy = False
+        REPLICA_STATE.update(lag=None, error=str(e))
+    if healthy != REPLICA_STATE["healthy"]:
+        logger.warning("replica %s (lag=%s)", "pulih" if healthy else "dialihkan ke primary", REPLICA_STATE["lag"])
+    REPLICA_STATE.update(healthy=healthy, checked_at=time.time())
+
+
+async def replica_monitor():
+    while True:
+        await update_replica_state()
+        await asyncio.sleep(REPLICA_CHECK_INTERVAL)
+
+
+async def close_pools():
+    for pool in POOLS.values():
+        pool.close()
+        await pool.wait_closed()
+    POOLS.clear()
@@ -0,0 +1,142 @@
+import csv
+import io
+import json
+from datetime import datetime, date
+from decimal import Decimal
+
+import aiomysql
+
+# ---------------------
+# Streaming export
+# ---------------------
+# Baris dibaca dari server-side cursor (SSCursor) per batch lalu langsung
+# di-encode dan dikirim, jadi memori konstan berapapun jumlah barisnya.
+
+EXPORT_BATCH = 5000
+
+TRANSACTION_COLUMNS = [
+    ("id", "int"),
+    ("cp_id", "str"),
+    ("connector_id", "int"),
+    ("id_tag", "str"),
+    ("meter_start", "int"),
+    ("meter_stop", "int"),
+    ("start_ts", "datetime"),
+    ("stop_ts", "datetime"),
+    ("kwh", "float"),
+]
+
+TRANSACTION_SQL = """
+    SELECT id, cp_id, connector_id, id_tag, meter_start, meter_stop, start_ts, stop_ts,
+           (meter_stop - meter_start)/1000 AS kwh
+    FROM transactions
+    WHERE start_ts >= %s AND start_ts < %s {extra}
+    ORDER BY start_ts, id
+"""
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+async def stream_rows(db_config, sql, args, batch=EXPORT_BATCH):
+    """Yield lists of tuples from an unbuffered cursor on a dedicated connection."""
+    # koneksi sendiri (bukan dari pool) supaya export panjang tidak memakan slot pool
+    conn = await aiomysql.connect(**db_config)
+    try:
+        async with conn.cursor(aiomysql.SSCursor) as cur:
+            await cur.execute(sql, args)
+            while True:
+                rows = await cur.fetchmany(batch)
+                if not rows:
+                    break
+                yield rows
+    finally:
+        conn.close()
+
+
+async def encode_ndjson(batches, columns):
+    names = [c for c, _ in columns]
+    async for rows in batches:
+        yield "".join(
+            json.dumps(dict(zip(names, map(_plain, row)))) + "\n" for row in rows
+        ).encode()
+
+
+async def encode_csv(batches, columns):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow([c for c, _ in columns])
+    async for rows in batches:
+        writer.writerows([[_plain(v) for v in row] for row in rows])
+        yield buf.getvalue().encode()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode()
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back to the generator."""
+
+    def __init__(self):
+        self.chunks = []
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+async def encode_parquet(batches, columns):
+    # pyarrow opsional: hanya dibutuhkan kalau format=parquet
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # kolom timestamp (presisi detik) disimpan sebagai mikrodetik: tanpa
+    # pembulatan, dan sama dengan isoformat() di CSV/NDJSON
+    types = {"int": pa.int64(), "str": pa.string(), "datetime": pa.timestamp("us"), "float": pa.float64()}
+    schema = pa.schema([(name, types[kind]) for name, kind in columns])
+    sink = _ChunkSink()
+    # coerce_timestamps: format parquet lama menyimpan ms kalau tidak diminta eksplisit
+    writer = pq.ParquetWriter(sink, schema, compression="snappy", coerce_timestamps="us", allow_truncated_timestamps=False)
+    async for rows in batches:
+        cols = list(zip(*rows))
+        arrays = [
+            pa.array([float(v) if v is not None else None for v in col] if kind == "float" else col, type=types[kind])
+            for col, (_, kind) in zip(cols, columns)
+        ]
+        writer.write_table(pa.Table.from_arrays(arrays, schema=schema))  # satu row group per batch
+        data = sink.drain()
+        if data:
+            yield data
+    writer.close()
+    yield sink.drain()
+
+
+ENCODERS = {
+    "ndjson": encode_ndjson,
+    "csv": encode_csv,
+    "parquet": encode_parquet,
+}
@@ -0,0 +1,186 @@
+import asyncio
+import json
+import logging
+import os
+from collections import OrderedDict
+
+import aiomysql
+
+logger = logging.getLogger("api-service.live")
+
+# ---------------------
+# Live connector / transaction push
+# ---------------------
+# Satu poller per proses membaca delta dari DB, lalu di-fan-out ke semua
+# subscriber (WebSocket / SSE). Jumlah dashboard yang terbuka tidak menambah
+# query ke DB. Tiap subscriber punya antrian sendiri; kalau penuh (klien
+# lambat) subscriber tersebut diputus, bukan memperlambat yang lain.
+# Setiap delta diberi nomor version yang naik terus; snapshot membawa
+# version delta terakhir yang sudah tercakup. State hub hanya diubah di
+# bagian sinkron (tanpa await) bersama publish, dan subscriber didaftarkan
+# bersamaan dengan pengambilan snapshot-nya, jadi subscriber tidak pernah
+# kehilangan delta atau menerima delta yang sudah ada di snapshot-nya.
+
+LIVE_INTERVAL = float(os.getenv("LIVE_INTERVAL", "1"))
+LIVE_BUFFER = int(os.getenv("LIVE_BUFFER", "256"))
+_TX_MEMORY = 10000  # jumlah id transaksi yang diingat untuk dedupe
+
+
+def encode(event):
+    return json.dumps(event, default=str)
+
+
+class Subscriber:
+    def __init__(self, maxsize, snapshot):
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.snapshot = snapshot  # diambil saat didaftarkan, lihat LiveHub.subscribe
+        self.dropped = False
+
+
+class LiveHub:
+    def __init__(self, get_pool, interval=LIVE_INTERVAL, buffer=LIVE_BUFFER):
+        self.get_pool = get_pool
+        self.interval = interval
+        self.buffer = buffer
+        self.subscribers = set()
+        self.connectors = {}  # (cp_id, connector_id) -> state terakhir
+        self._conn_mark = None
+        self._tx_last_id = 0
+        self._tx_stop_mark = None
+        self._tx_seen = OrderedDict()  # id -> sudah stop?
+        self._task = None
+        self._primed = False
+        self._prime_lock = asyncio.Lock()
+        self.version = 0  # nomor delta terakhir yang dipublish
+
+    # --- subscriber management ---
+    async def subscribe(self):
+        if not self._primed:
+            async with self._prime_lock:  # subscriber yang datang bersamaan menunggu satu prime
+                if not self._primed:
+                    await self._prime()
+        # tanpa await di antara snapshot dan pendaftaran: delta berikutnya
+        # pasti version > snapshot["version"] dan pasti masuk antrian
+        sub = Subscriber(self.buffer, self.snapshot())
+        self.subscribers.add(sub)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return sub
+
+    def unsubscribe(self, sub):
+        self.subscribers.discard(sub)
+
+    def snapshot(self):
+        return {"type": "snapshot", "version": self.version, "connectors": list(self.connectors.values())}
+
+    def publish(self, event):
+        self.version += 1
+        event["version"] = self.version
+        for sub in list(self.subscribers):
+            try:
+                sub.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # slow consumer: putus, jangan tahan event untuk yang lain
+                sub.dropped = True
+                self.subscribers.discard(sub)
+                logger.warning("live: subscriber lambat diputus (buffer %d penuh)", self.buffer)
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # --- polling ---
+    async def _prime(self):
+        pool = await self.get_pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cur:
+                await cur.execute("SELECT cp_id, connector_id, status, error_code, last_update FROM connectors")
+                connectors = await cur.fetchall()
+                await cur.execute("SELECT MAX(id) AS id, MAX(stop_ts) AS stop_ts FROM transactions")
+                marks = await cur.fetchone()
+                stopped = []
+                if marks["stop_ts"] is not None:
+                    await cur.execute("SELECT id FROM transactions WHERE stop_ts = %s", (marks["stop_ts"],))
+                    stopped = await cur.fetchall()
+        for row in connectors:
+            self._remember_connector(row)
+        self._tx_last_id = marks["id"] or 0
+        self._tx_stop_mark = marks["stop_ts"]
+        for tx in stopped:
+            self._tx_seen[tx["id"]] = True
+        self._primed = True
+
+    def _remember_connector(self, row):
+        key = (row["cp_id"], row["connector_id"])
+        prev = self.connectors.get(key)
+        self.connectors[key] = row
+        if self._conn_mark is None or (row["last_update"] and row["last_update"] > self._conn_mark):
+            self._conn_mark = row["last_update"]
+        return prev is None or (prev["status"], prev["error_code"], prev["last_update"]) != (
+            row["status"], row["error_code"], row["last_update"]
+        )
+
+    async def _run(self):
+        # berhenti sendiri kalau tidak ada subscriber lagi
+        while self.subscribers:
+            try:
+                for event in await self._poll():
+                    self.publish(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("live poll gagal: %s", e)
+            await asyncio.sleep(self.interval)
+
+    async def _poll(self):
+        """Read changes since the marks; hub state is only touched after the last await."""
+        pool = await self.get_pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cur:
+                # >= karena resolusi timestamp 1 detik; duplikat disaring di _remember_connector
+                await cur.execute(
+                    """
+                    SELECT cp_id, connector_id, status, error_code, last_update
+                    FROM connectors WHERE %s IS NULL OR last_update >= %s
+                    """,
+                    (self._conn_mark, self._conn_mark),
+                )
+                connectors = await cur.fetchall()
+                await cur.execute(
+                    """
+                    SELECT id, cp_id, connector_id, id_tag, meter_start, meter_stop, start_ts, stop_ts
+                    FROM transactions
+                    WHERE id > %s OR stop_ts >= COALESCE(%s, '1970-01-02')
+                    ORDER BY id
+                    """,
+                    (self._tx_last_id, self._tx_stop_mark),
+                )
+                transactions = await cur.fetchall()
+        # dari sini sampai publish di _run tidak ada await lagi
+        events = [{"type": "connector", **row} for row in connectors if self._remember_connector(row)]
+        for row in transactions:
+            events.extend(self._transaction_events(row))
+        return events
+
+    def _transaction_events(self, row):
+        events = []
+        tx_id = row["id"]
+        stopped = row["stop_ts"] is not None
+        seen = self._tx_seen.get(tx_id)
+        if tx_id > self._tx_last_id:
+            self._tx_last_id = tx_id
+            events.append({"type": "transaction", "event": "started", **row})
+        if stopped and not seen:
+            events.append({"type": "transaction", "event": "stopped", **row})
+            if self._tx_stop_mark is None or row["stop_ts"] > self._tx_stop_mark:
+                self._tx_stop_mark = row["stop_ts"]
+        self._tx_seen[tx_id] = stopped
+        self._tx_seen.move_to_end(tx_id)
+        while len(self._tx_seen) > _TX_MEMORY:
+            self._tx_seen.popitem(last=False)
+        return events
@@ -0,0 +1,74 @@
+import gzip
+import json
+import os
+from decimal import Decimal
+
+from fastapi.responses import JSONResponse, Response
+
+# ---------------------
+# JSON response cepat + kompresi opsional
+# ---------------------
+# orjson dan brotli opsional: kalau tidak terpasang, fallback ke json stdlib
+# dan gzip. Endpoint yang mengembalikan Response langsung melewati
+# jsonable_encoder milik FastAPI (bagian paling lambat untuk list besar).
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - tergantung environment
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - tergantung environment
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "2048"))
+
+
+def _default(obj):
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if hasattr(obj, "isoformat"):
+        return obj.isoformat()
+    raise TypeError(f"Type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content):
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content):
+        return dumps(content)
+
+
+def compress(body, accept_encoding):
+    """Return (body, encoding) using brotli or gzip when the client accepts it."""
+    if len(body) < COMPRESS_MIN_BYTES:
+        return body, None
+    if brotli is not None and "br" in accept_encoding:
+        return brotli.compress(body, quality=4), "br"
+    if "gzip" in accept_encoding:
+        return gzip.compress(body, compresslevel=5), "gzip"
+    return body, None
+
+
+def json_response(request, content, status_code=200, headers=None):
+    body, encoding = compress(dumps(content), request.headers.get("accept-encoding", ""))
+    headers = {"Vary": "Accept-Encoding", **(headers or {})}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(body, status_code=status_code, media_type="application/json", headers=headers)
+
+
+def parse_fields(fields, allowed):
+    """Split a ``fields=`` query value and keep only known names (order preserved)."""
+    if not fields:
+        return list(allowed)
+    wanted = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in wanted if f not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    return wanted
@@ -0,0 +1,342 @@
+import asyncio
+import calendar
+import logging
+import os
+from datetime import datetime, timedelta
+
+logger = logging.getLogger("api-service.rollup")
+
+# ---------------------
+# Rollup tables untuk analytics
+# ---------------------
+# Transaksi yang sudah selesai (stop_ts terisi) diakumulasi ke tabel per jam
+# dan per hari. Watermark (stop_ts, id) disimpan di rollup_state sehingga
+# setiap refresh hanya memproses transaksi baru, bukan seluruh history.
+# kWh dan jumlah sesi masuk ke bucket waktu mulai; detik okupansi dibagi
+# ke setiap bucket yang dilewati sesi (sesi 5 jam = 5 bucket jam), jadi
+# occupancy per bucket tidak pernah > 1 per CP.
+
+ROLLUP_INTERVAL = float(os.getenv("ROLLUP_INTERVAL", "30"))
+ROLLUP_BATCH = 5000
+# transaksi yang stop_ts-nya < beberapa detik lalu belum diambil, supaya
+# tidak ada commit "terlambat" dengan stop_ts yang sama dengan watermark
+SETTLE_SECONDS = 5
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS energy_rollup_hourly (
+        cp_id varchar(50) NOT NULL,
+        bucket datetime NOT NULL,
+        kwh double NOT NULL DEFAULT 0,
+        sessions int NOT NULL DEFAULT 0,
+        occupied_seconds bigint NOT NULL DEFAULT 0,
+        PRIMARY KEY (cp_id, bucket),
+        KEY idx_bucket (bucket)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS energy_rollup_daily (
+        cp_id varchar(50) NOT NULL,
+        bucket date NOT NULL,
+        kwh double NOT NULL DEFAULT 0,
+        sessions int NOT NULL DEFAULT 0,
+        occupied_seconds bigint NOT NULL DEFAULT 0,
+        PRIMARY KEY (cp_id, bucket),
+        KEY idx_bucket (bucket)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS rollup_state (
+        name varchar(50) NOT NULL PRIMARY KEY,
+        last_stop_ts timestamp NULL DEFAULT NULL,
+        last_tx_id int NOT NULL DEFAULT 0
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci
+    """,
+]
+
+# (cek di information_schema, DDL) tanpa sintaks IF NOT EXISTS khusus MariaDB
+_SCHEMA_CHANGES = [
+    (
+        "SELECT 1 FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'charge_points' AND COLUMN_NAME = 'site_id'",
+        "ALTER TABLE charge_points ADD COLUMN site_id varchar(50) DEFAULT NULL",
+    ),
+    (
+        "SELECT 1 FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'transactions' AND INDEX_NAME = 'idx_tx_stop'",
+        "CREATE INDEX idx_tx_stop ON transactions (stop_ts, id)",
+    ),
+    # export.py: WHERE start_ts range ORDER BY start_ts, id (id ikut di index InnoDB)
+    (
+        "SELECT 1 FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'transactions' AND INDEX_NAME = 'idx_tx_start'",
+        "CREATE INDEX idx_tx_start ON transactions (start_ts)",
+    ),
+    # live.LiveHub: polling connectors yang berubah sejak last_update terakhir
+    (
+        "SELECT 1 FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'connectors' AND INDEX_NAME = 'idx_conn_update'",
+        "CREATE INDEX idx_conn_update ON connectors (last_update)",
+    ),
+]
+
+# nama watermark di rollup_state; "energy" = versi lama yang okupansinya
+# masuk seluruhnya ke bucket mulai, dibangun ulang sekali
+STATE_NAME = "energy_v2"
+_OLD_STATE_NAMES = ("energy",)
+
+
+def _hour(ts):
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def _day(ts):
+    return ts.date()
+
+
+# tabel rollup -> (awal bucket dari timestamp, awal bucket berikutnya)
+_TABLE_BUCKETS = {
+    "energy_rollup_hourly": (_hour, lambda b: b + timedelta(hours=1)),
+    "energy_rollup_daily": (_day, lambda b: b + timedelta(days=1)),
+}
+
+
+def split_sessions(rows, floor, next_bucket):
+    """Aggregate (cp_id, start_ts, stop_ts, kwh) rows into {(cp_id, bucket): [kwh, sessions, seconds]}.
+
+    kWh and the session count go to the start bucket; occupied seconds are
+    split over every bucket the session overlaps.
+    """
+    acc = {}
+    for cp_id, start, stop, kwh in rows:
+        first = floor(start)
+        entry = acc.setdefault((cp_id, first), [0.0, 0, 0])
+        entry[0] += float(kwh or 0)
+        entry[1] += 1
+        bucket, t = first, start
+        while t < stop:
+            end = next_bucket(bucket)
+            end_ts = end if isinstance(end, datetime) else datetime.combine(end, datetime.min.time())
+            seconds = (min(stop, end_ts) - t).total_seconds()
+            acc.setdefault((cp_id, bucket), [0.0, 0, 0])[2] += int(round(seconds))
+            bucket, t = end, end_ts
+    return acc
+
+
+async def ensure_schema(pool):
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            for ddl in SCHEMA:
+                await cur.execute(ddl)
+            for check, ddl in _SCHEMA_CHANGES:
+                await cur.execute(check)
+                if not await cur.fetchone():
+                    await cur.execute(ddl)
+
+
+async def _migrate_state(conn, cur):
+    """Rebuild the rollups once when only an old-format watermark exists."""
+    await cur.execute("SELECT name FROM rollup_state")
+    names = {r[0] for r in await cur.fetchall()}
+    if STATE_NAME in names or not names & set(_OLD_STATE_NAMES):
+        return
+    logger.info("rollup: format okupansi berubah, tabel rollup dibangun ulang")
+    await conn.begin()
+    try:
+        for table in _TABLE_BUCKETS:
+            await cur.execute(f"DELETE FROM {table}")
+        await cur.execute("DELETE FROM rollup_state WHERE name IN (" + ",".join(["%s"] * len(_OLD_STATE_NAMES)) + ")", _OLD_STATE_NAMES)
+        await conn.commit()
+    except Exception:
+        await conn.rollback()
+        raise
+
+
+async def refresh_rollups(pool):
+    """Fold newly finished transactions into the rollup tables.
+
+    Returns the number of transactions processed.
+    """
+    total = 0
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            # hanya satu instance api-service yang boleh menulis rollup
+            await cur.execute("SELECT GET_LOCK('energy_rollup', 0)")
+            (locked,) = await cur.fetchone()
+            if not locked:
+                return 0
+            try:
+                await _migrate_state(conn, cur)
+                while True:
+                    processed = await _refresh_batch(conn, cur)
+                    total += processed
+                    if processed < ROLLUP_BATCH:
+                        break
+            finally:
+                await cur.execute("SELECT RELEASE_LOCK('energy_rollup')")
+    return total
+
+
+async def _refresh_batch(conn, cur):
+    await conn.begin()
+    try:
+        await cur.execute(
+            "SELECT last_stop_ts, last_tx_id FROM rollup_state WHERE name=%s FOR UPDATE", (STATE_NAME,)
+        )
+        state = await cur.fetchone()
+        last_stop, last_id = state if state else (None, 0)
+
+        await cur.execute(
+            """
+            SELECT id, stop_ts, cp_id, start_ts, (meter_stop - meter_start)/1000 FROM transactions
+            WHERE stop_ts IS NOT NULL AND meter_stop IS NOT NULL
+              AND stop_ts < NOW() - INTERVAL %s SECOND
+              AND (%s IS NULL OR stop_ts > %s OR (stop_ts = %s AND id > %s))
+            ORDER BY stop_ts, id
+            LIMIT %s
+            """,
+            (SETTLE_SECONDS, last_stop, last_stop, last_stop, last_id, ROLLUP_BATCH),
+        )
+        rows = await cur.fetchall()
+        if not rows:
+            await conn.commit()
+            return 0
+
+        sessions = [(cp_id, start, stop, kwh) for _, stop, cp_id, start, kwh in rows if start is not None]
+        for table, (floor, next_bucket) in _TABLE_BUCKETS.items():
+            acc = split_sessions(sessions, floor, next_bucket)
+            await cur.executemany(
+                f"""
+                INSERT INTO {table} (cp_id, bucket, kwh, sessions, occupied_seconds)
+                VALUES (%s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    kwh = kwh + VALUES(kwh),
+                    sessions = sessions + VALUES(sessions),
+                    occupied_seconds = occupied_seconds + VALUES(occupied_seconds)
+                """,
+                [(cp_id, bucket, *values) for (cp_id, bucket), values in acc.items()],
+            )
+
+        new_id, new_stop = rows[-1][:2]
+        await cur.execute(
+            """
+            INSERT INTO rollup_state (name, last_stop_ts, last_tx_id) VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE last_stop_ts=VALUES(last_stop_ts), last_tx_id=VALUES(last_tx_id)
+            """,
+            (STATE_NAME, new_stop, new_id),
+        )
+        await conn.commit()
+        return len(rows)
+    except Exception:
+        await conn.rollback()
+        raise
+
+
+async def rollup_loop(get_pool, schema_ready=False):
+    # schema_ready=False: DDL di startup gagal (mis. DB belum siap), dicoba ulang di sini
+    while True:
+        try:
+            pool = await get_pool()
+            if not schema_ready:
+                await ensure_schema(pool)
+                schema_ready = True
+                logger.info("rollup: schema siap")
+            n = await refresh_rollups(pool)
+            if n:
+                logger.info("rollup: %d transaksi baru diproses", n)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("rollup gagal: %s", e)
+        await asyncio.sleep(ROLLUP_INTERVAL)
+
+
+# ---------------------
+# Query helpers
+# ---------------------
+BUCKET_SQL = {
+    # (tabel sumber, ekspresi bucket)
+    "hour": ("energy_rollup_hourly", "r.bucket"),
+    "day": ("energy_rollup_daily", "r.bucket"),
+    "month": ("energy_rollup_daily", "DATE_FORMAT(r.bucket, '%%Y-%%m-01')"),
+}
+
+GROUP_SQL = {
+    "cp": "r.cp_id",
+    "site": "COALESCE(cp.site_id, 'default')",
+    "fleet": "'fleet'",
+}
+
+
+def energy_query(bucket, group_by, start=None, end=None, cp_id=None, site_id=None):
+    table, bucket_expr = BUCKET_SQL[bucket]
+    key_expr = GROUP_SQL[group_by]
+    where, args = [], []
+    if start is not None:
+        where.append("r.bucket >= %s")
+        args.append(start)
+    if end is not None:
+        where.append("r.bucket < %s")
+        args.append(end)
+    if cp_id:
+        where.append("r.cp_id = %s")
+        args.append(cp_id)
+    if site_id:
+        where.append("COALESCE(cp.site_id, 'default') = %s")
+        args.append(site_id)
+    sql = f"""
+        SELECT {bucket_expr} AS bucket, {key_expr} AS `key`,
+               SUM(r.kwh) AS kwh, SUM(r.sessions) AS sessions,
+               SUM(r.occupied_seconds) AS occupied_seconds
+        FROM {table} r
+        LEFT JOIN charge_points cp ON cp.id = r.cp_id
+        {"WHERE " + " AND ".join(where) if where else ""}
+        GROUP BY 1, 2
+        ORDER BY 1, 2
+    """
+    return sql, args
+
+
+def cp_count_query(cp_id=None, site_id=None):
+    # jumlah CP per site dengan filter yang sama seperti energy_query (penyebut occupancy)
+    where, args = [], []
+    if cp_id:
+        where.append("id = %s")
+        args.append(cp_id)
+    if site_id:
+        where.append("COALESCE(site_id, 'default') = %s")
+        args.append(site_id)
+    sql = f"""
+        SELECT COALESCE(site_id, 'default') AS site, COUNT(*) AS n
+        FROM charge_points
+        {"WHERE " + " AND ".join(where) if where else ""}
+        GROUP BY 1
+    """
+    return sql, args
+
+
+def bucket_seconds(bucket, value):
+    if bucket == "hour":
+        return 3600
+    if bucket == "day":
+        return 86400
+    return calendar.monthrange(value.year, value.month)[1] * 86400
+
+
+def heatmap_query(start=None, end=None, cp_id=None):
+    where, args = [], []
+    if start is not None:
+        where.append("bucket >= %s")
+        args.append(start)
+    if end is not None:
+        where.append("bucket < %s")
+        args.append(end)
+    if cp_id:
+        where.append("cp_id = %s")
+        args.append(cp_id)
+    # DAYOFWEEK-1 -> 0=Minggu, sama dengan label chart di dashboard
+    sql = f"""
+        SELECT HOUR(bucket) AS hour, DAYOFWEEK(bucket) - 1 AS weekday,
+               SUM(sessions) AS sessions, SUM(kwh) AS kwh
+        FROM energy_rollup_hourly
+        {"WHERE " + " AND ".join(where) if where else ""}
+        GROUP BY 1, 2
+        ORDER BY 1, 2
+    """
+    return sql, args
@@ -0,0 +1,121 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeCursor:
+    """aiomysql DictCursor stand-in: ``handler(sql, args)`` returns the rows of each query."""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.rows = []
+
+    async def execute(self, sql, args=None):
+        await asyncio.sleep(0)  # seperti I/O sungguhan: task lain bisa jalan di sini
+        self.rows = list(self.handler(" ".join(sql.split()), args))
+
+    async def executemany(self, sql, args):
+        self.rows = list(self.handler(" ".join(sql.split()), list(args)))
+
+    async def fetchall(self):
+        return self.rows
+
+    async def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    async def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakePool:
+    def __init__(self, handler):
+        self.handler = handler
+
+    def acquire(self):
+        return self
+
+    def cursor(self, *args):
+        return FakeCursor(self.handler)
+
+    async def begin(self):
+        pass
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+@pytest.fixture
+def fake_pool():
+    def make(handler):
+        pool = FakePool(handler)
+
+        async def get_pool():
+            return pool
+        return get_pool
+    return make
+
+
+class FakeFleet:
+    """Small fleet behind the dashboard queries: 5 CPs, rollup kWh, ``n_tx`` transactions."""
+
+    def __init__(self, n_tx=12):
+        self.cps = [{"id": f"CP_{i}", "vendor": "ABB", "model": "T", "firmware_version": "1", "last_heartbeat": None,
+                     "connected": i % 2, "site_id": None} for i in range(1, 6)]
+        self.transactions = [{"id": i, "cp_id": "CP_1", "connector_id": 1, "id_tag": "TAG", "meter_start": 0,
+                              "meter_stop": 1000, "start_ts": None, "stop_ts": None} for i in range(n_tx, 0, -1)]
+        self.queries = []
+
+    def __call__(self, sql, args):
+        self.queries.append((sql, args))
+        if sql.startswith("SELECT COUNT(*) FROM charge_points"):
+            return [(len(self.cps),)]
+        if sql.startswith("SELECT COUNT(*) FROM connectors"):
+            return [(2,)]
+        if sql.startswith("SELECT COALESCE(SUM(kwh), 0)"):
+            return [(42.5,)]
+        if " FROM charge_points ORDER BY id" in sql:
+            columns = sql[len("SELECT "):sql.index(" FROM")].split(", ")
+            rows = [{c: cp[c] for c in columns} for cp in self.cps]
+            if args:
+                limit, offset = args
+                rows = rows[offset:offset + limit]
+            return rows
+        if "FROM energy_rollup_daily" in sql and "GROUP BY cp_id" in sql:
+            return [{"cp_id": cp["id"], "total_kwh": 10.0, "id": cp["id"]} for cp in self.cps]
+        if "FROM connectors" in sql:
+            return []
+        if "FROM transactions ORDER BY id DESC" in sql:
+            columns = sql[len("SELECT "):sql.index(" FROM")].split(", ")
+            limit, offset = args
+            return [{c: tx[c] for c in columns} for tx in self.transactions[offset:offset + limit]]
+        return []
+
+
+@pytest.fixture
+def fake_fleet(monkeypatch, fake_pool):
+    """Route api-service's read pool to a FakeFleet."""
+    import api
+
+    fleet = FakeFleet()
+    monkeypatch.setattr(api, "get_read_pool", fake_pool(fleet))
+    return fleet
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+import db
+
+
+class _Replica:
+    """``SHOW SLAVE STATUS`` answer of the replica: a row, None (no row) or an exception."""
+
+    def __init__(self):
+        self.status = None
+
+    def __call__(self, sql, args):
+        assert sql == "SHOW SLAVE STATUS"
+        if isinstance(self.status, Exception):
+            raise self.status
+        return [] if self.status is None else [self.status]
+
+
+@pytest.fixture
+def pools(monkeypatch, fake_pool):
+    replica = _Replica()
+    read = asyncio.run(fake_pool(replica)())
+    fallback = asyncio.run(fake_pool(lambda sql, args: [])())
+    monkeypatch.setattr(db, "POOLS", {"read": read, "read_fallback": fallback})
+    monkeypatch.setattr(db, "REPLICA_ENABLED", True)
+    monkeypatch.setattr(db, "REPLICA_MAX_LAG", 30)
+    monkeypatch.setattr(db, "REPLICA_STATE", {"healthy": True, "lag": None, "checked_at": None, "error": None})
+    return replica, read, fallback
+
+
+def _route(status, replica):
+    replica.status = status
+    asyncio.run(db.update_replica_state())
+    return asyncio.run(db.get_read_pool())
+
+
+def test_lag_threshold(pools):
+    replica, read, fallback = pools
+    assert _route({"Seconds_Behind_Master": 5}, replica) is read
+    assert db.REPLICA_STATE["lag"] == 5.0 and db.read_target() == "replica"
+    assert _route({"Seconds_Behind_Master": 31}, replica) is fallback
+    assert db.read_target() == "primary (fallback)" and db.read_config() is db.DB_CONFIG
+    assert _route({"Seconds_Behind_Master": 30}, replica) is read  # pulih
+    assert db.read_config() is db.READ_DB_CONFIG
+
+
+def test_stopped_replication_falls_back(pools):
+    replica, read, fallback = pools
+    assert _route({"Seconds_Behind_Master": None}, replica) is fallback
+    assert db.REPLICA_STATE["error"] == "replication not running"
+
+
+def test_unreachable_replica_falls_back_and_recovers(pools):
+    replica, read, fallback = pools
+    assert _route(ConnectionError("replica down"), replica) is fallback
+    assert db.REPLICA_STATE["lag"] is None and "replica down" in db.REPLICA_STATE["error"]
+    assert _route({"Seconds_Behind_Master": 0}, replica) is read
+    assert db.REPLICA_STATE["error"] is None
+
+
+def test_no_status_row_counts_as_current(pools):
+    # instance lokal kedua sebagai stand-in: tidak ada baris SHOW SLAVE STATUS
+    replica, read, fallback = pools
+    assert _route(None, replica) is read
+    assert db.REPLICA_STATE["lag"] == 0.0
+
+
+def test_without_replica_reads_use_separate_pool(pools, monkeypatch):
+    replica, read, fallback = pools
+    monkeypatch.setattr(db, "REPLICA_ENABLED", False)
+    monkeypatch.setitem(db.REPLICA_STATE, "healthy", False)
+    assert asyncio.run(db.get_read_pool()) is read
+    assert db.read_target() == "primary (separate read pool)"
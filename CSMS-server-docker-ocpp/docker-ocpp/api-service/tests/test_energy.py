@@ -0,0 +1,35 @@
+import asyncio
+from datetime import date
+
+import pytest
+
+import api
+
+SITES = {"CP_1": "north", "CP_2": "north", "CP_3": None, "CP_4": None}
+
+
+def _handler(sql, args):
+    if "FROM energy_rollup_daily r" in sql:
+        # satu CP penuh sepanjang hari
+        return [{"bucket": date(2024, 3, 1), "key": "fleet", "kwh": 10, "sessions": 1, "occupied_seconds": 86400}]
+    assert sql.startswith("SELECT COALESCE(site_id, 'default') AS site, COUNT(*) AS n FROM charge_points")
+    cps = dict(SITES)
+    if "id = %s" in sql:
+        cps = {k: v for k, v in cps.items() if k == args[0]}
+    if "COALESCE(site_id, 'default') = %s" in sql:
+        cps = {k: v for k, v in cps.items() if (v or "default") == args[-1]}
+    counts = {}
+    for site in cps.values():
+        counts[site or "default"] = counts.get(site or "default", 0) + 1
+    return [{"site": s, "n": n} for s, n in counts.items()]
+
+
+@pytest.mark.parametrize("filters, occupancy", [
+    ({}, 0.25),
+    ({"site_id": "north"}, 0.5),
+    ({"cp_id": "CP_3"}, 1.0),
+])
+def test_fleet_occupancy_uses_filtered_cp_count(monkeypatch, fake_pool, filters, occupancy):
+    monkeypatch.setattr(api, "get_read_pool", fake_pool(_handler))
+    rows = asyncio.run(api.load_energy("day", "fleet", **filters))
+    assert [r["occupancy"] for r in rows] == [occupancy]
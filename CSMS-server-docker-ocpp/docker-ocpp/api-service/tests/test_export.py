@@ -0,0 +1,52 @@
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime
+from decimal import Decimal
+
+import pyarrow.parquet as pq
+
+import export
+
+ROWS = [
+    (1, "CP_1", 1, "TAG-1", 1000, 8500, datetime(2024, 3, 1, 8, 0, 0, 123456), datetime(2024, 3, 1, 9, 30, 15, 654321), Decimal("7.5")),
+    (2, "CP_2", 2, None, 0, None, datetime(2024, 3, 1, 10, 0), None, None),
+]
+
+
+def _encode(fmt, batches=(ROWS[:1], ROWS[1:])):
+    async def rows():
+        for batch in batches:
+            yield list(batch)
+
+    async def collect():
+        return b"".join([chunk async for chunk in export.ENCODERS[fmt](rows(), export.TRANSACTION_COLUMNS)])
+    return asyncio.run(collect())
+
+
+def test_formats_agree():
+    ndjson = [json.loads(line) for line in _encode("ndjson").decode().splitlines()]
+    table = pq.read_table(io.BytesIO(_encode("parquet"))).to_pylist()
+    with io.StringIO(_encode("csv").decode()) as f:
+        rows = list(csv.DictReader(f))
+
+    assert [r["start_ts"] for r in ndjson] == ["2024-03-01T08:00:00.123456", "2024-03-01T10:00:00"]
+    assert [r["start_ts"] for r in rows] == [r["start_ts"] for r in ndjson]
+    # parquet: tanpa pembulatan ke ms/detik
+    assert [r["start_ts"] for r in table] == [ROWS[0][6], ROWS[1][6]]
+    assert table[0]["stop_ts"] == ROWS[0][7]
+    assert table[1]["stop_ts"] is None and ndjson[1]["stop_ts"] is None and rows[1]["stop_ts"] == ""
+    assert table[0]["kwh"] == ndjson[0]["kwh"] == float(rows[0]["kwh"]) == 7.5
+
+
+def test_parquet_schema_and_row_groups():
+    meta = pq.ParquetFile(io.BytesIO(_encode("parquet"))).metadata
+    assert meta.num_row_groups == 2  # satu row group per batch
+    assert str(meta.schema.to_arrow_schema().field("start_ts").type) == "timestamp[us]"
+
+
+def test_empty_export():
+    assert _encode("csv", batches=()).decode().strip() == ",".join(c for c, _ in export.TRANSACTION_COLUMNS)
+    assert _encode("ndjson", batches=()) == b""
+    assert pq.read_table(io.BytesIO(_encode("parquet", batches=()))).num_rows == 0
@@ -0,0 +1,102 @@
+import asyncio
+from datetime import datetime
+
+import live
+
+T0 = datetime(2024, 3, 1, 8, 0, 0)
+T1 = datetime(2024, 3, 1, 8, 0, 5)
+
+
+class _Db:
+    def __init__(self):
+        self.connectors = [{"cp_id": "CP_1", "connector_id": 1, "status": "Available", "error_code": "NoError", "last_update": T0}]
+        self.transactions = []
+        self.primes = 0
+        self.on_tx_query = None
+
+    def __call__(self, sql, args):
+        assert sql.startswith("SELECT"), sql  # subscribe hanya membaca; DDL ada di rollup.ensure_schema
+        if "FROM connectors" in sql:
+            return [dict(r) for r in self.connectors]
+        if "MAX(id)" in sql:
+            self.primes += 1
+            return [{"id": 0, "stop_ts": None}]
+        if "FROM transactions" in sql:
+            if self.on_tx_query:
+                self.on_tx_query()
+            return self.transactions
+        raise AssertionError(sql)
+
+
+def _hub(fake_pool, db):
+    return live.LiveHub(fake_pool(db), interval=3600)
+
+
+def test_concurrent_subscribers_prime_once(fake_pool):
+    db = _Db()
+
+    async def run():
+        hub = _hub(fake_pool, db)
+        subs = await asyncio.gather(hub.subscribe(), hub.subscribe(), hub.subscribe())
+        await hub.stop()
+        return subs
+
+    subs = asyncio.run(run())
+    assert db.primes == 1
+    assert all(s.snapshot["version"] == 0 and len(s.snapshot["connectors"]) == 1 for s in subs)
+
+
+def test_state_changes_only_with_publish(fake_pool):
+    db = _Db()
+
+    async def run():
+        hub = _hub(fake_pool, db)
+        await hub.subscribe()
+        await hub.stop()
+        db.connectors[0].update(status="Charging", last_update=T1)
+        # subscriber yang terdaftar di tengah poll (setelah query connector,
+        # sebelum publish) belum boleh melihat state baru di snapshot
+        seen = []
+        db.on_tx_query = lambda: seen.append(hub.snapshot())
+        events = await hub._poll()
+        return hub, seen, events
+
+    hub, seen, events = asyncio.run(run())
+    assert seen[0]["connectors"][0]["status"] == "Available"
+    assert [e["status"] for e in events] == ["Charging"]
+
+
+def test_versions_split_snapshot_and_deltas(fake_pool):
+    db = _Db()
+
+    async def run():
+        hub = _hub(fake_pool, db)
+        early = await hub.subscribe()
+        await hub.stop()
+        db.connectors[0].update(status="Charging", last_update=T1)
+        for event in await hub._poll():
+            hub.publish(event)
+        late = await hub.subscribe()
+        await hub.stop()
+        return early, late
+
+    early, late = asyncio.run(run())
+    delta = early.queue.get_nowait()
+    assert delta["version"] == 1 and delta["status"] == "Charging"
+    # subscriber baru: snapshot sudah mencakup delta 1, antrian kosong
+    assert late.snapshot["version"] == 1
+    assert late.snapshot["connectors"][0]["status"] == "Charging"
+    assert late.queue.empty()
+
+
+def test_slow_subscriber_dropped(fake_pool):
+    async def run():
+        hub = live.LiveHub(fake_pool(_Db()), interval=3600, buffer=1)
+        sub = await hub.subscribe()
+        await hub.stop()
+        hub.publish({"type": "connector"})
+        hub.publish({"type": "connector"})
+        return hub, sub
+
+    hub, sub = asyncio.run(run())
+    assert sub.dropped and sub not in hub.subscribers
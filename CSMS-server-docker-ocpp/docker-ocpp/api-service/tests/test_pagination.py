@@ -0,0 +1,42 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import api
+
+
+@pytest.fixture
+def client():
+    return TestClient(api.app)
+
+
+def test_cps_page(client, fake_fleet):
+    r = client.get("/cps", params={"page": 3, "limit": 2, "fields": "id,connected"})
+    assert r.json() == [{"id": "CP_5", "connected": 1}]
+    assert r.headers["X-Total-Count"] == "5"
+    # connectors/kWh hanya untuk CP di halaman ini
+    assert not any("GROUP BY cp_id" in sql for sql, _ in fake_fleet.queries)
+    assert client.get("/cps", params={"page": 4, "limit": 2}).json() == []
+
+
+def test_cps_unpaged_returns_all(client, fake_fleet):
+    r = client.get("/cps", params={"fields": "id"})
+    assert len(r.json()) == 5 and "X-Total-Count" not in r.headers
+
+
+def test_transactions_has_more(client, fake_fleet):
+    r = client.get("/transactions", params={"page": 2, "limit": 5, "fields": "id"})
+    assert r.json() == [{"id": i} for i in (7, 6, 5, 4, 3)] and r.headers["X-Has-More"] == "1"
+    r = client.get("/transactions", params={"page": 3, "limit": 5, "fields": "id"})
+    assert r.json() == [{"id": 2}, {"id": 1}] and r.headers["X-Has-More"] == "0"
+
+
+@pytest.mark.parametrize("path, params", [
+    ("/cps", {"page": 0}),
+    ("/cps", {"limit": 1001}),
+    ("/transactions", {"limit": 101}),
+    ("/transactions", {"page": -1}),
+    ("/dashboard/snapshot", {"limit": 0}),
+])
+def test_bounds(client, fake_fleet, path, params):
+    assert client.get(path, params=params).status_code == 422
+    assert fake_fleet.queries == []
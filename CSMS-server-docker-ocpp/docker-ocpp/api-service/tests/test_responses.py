@@ -0,0 +1,56 @@
+import gzip
+import json
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api
+import responses
+
+
+@pytest.fixture
+def client():
+    return TestClient(api.app)  # tanpa "with": startup (DB, rollup) tidak dijalankan
+
+
+def test_parse_fields():
+    assert responses.parse_fields(None, ["a", "b"]) == ["a", "b"]
+    assert responses.parse_fields(" b, a ,", ["a", "b"]) == ["b", "a"]
+    with pytest.raises(ValueError, match="Unknown field"):
+        responses.parse_fields("a,secret", ["a", "b"])
+
+
+def test_unknown_field_is_400(client):
+    assert client.get("/cps?fields=id,password").status_code == 400
+    assert client.get("/transactions?fields=nope").status_code == 400
+
+
+def test_fields_pushed_into_select(client, monkeypatch, fake_pool):
+    executed = []
+
+    def handler(sql, args):
+        executed.append(sql)
+        return [{"id": "CP_1", "vendor": "ABB"}]
+
+    monkeypatch.setattr(api, "get_read_pool", fake_pool(handler))
+    r = client.get("/cps?fields=vendor")
+    assert r.json() == [{"vendor": "ABB"}]
+    assert executed == ["SELECT id, vendor FROM charge_points ORDER BY id"]
+
+
+def test_stdlib_fallback_matches_orjson(monkeypatch):
+    content = {"kwh": Decimal("1.5"), "ts": datetime(2024, 3, 1, 8, 30), "n": [1, None]}
+    fast = responses.dumps(content)
+    monkeypatch.setattr(responses, "orjson", None)
+    assert json.loads(responses.dumps(content)) == json.loads(fast) == {"kwh": 1.5, "ts": "2024-03-01T08:30:00", "n": [1, None]}
+
+
+def test_compression_fallback(monkeypatch):
+    body = b"x" * responses.COMPRESS_MIN_BYTES
+    monkeypatch.setattr(responses, "brotli", None)
+    compressed, encoding = responses.compress(body, "br, gzip")
+    assert encoding == "gzip" and gzip.decompress(compressed) == body
+    assert responses.compress(body, "br") == (body, None)
+    assert responses.compress(body[:-1], "gzip") == (body[:-1], None)  # terlalu kecil
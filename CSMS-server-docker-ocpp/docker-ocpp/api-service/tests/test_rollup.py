@@ -0,0 +1,120 @@
+import asyncio
+from datetime import date, datetime
+
+import pytest
+
+import rollup
+
+HOURLY = rollup._TABLE_BUCKETS["energy_rollup_hourly"]
+DAILY = rollup._TABLE_BUCKETS["energy_rollup_daily"]
+
+
+def test_session_split_across_hours():
+    # 08:30 - 13:30: kWh & sesi di bucket mulai, okupansi di 6 bucket jam
+    acc = rollup.split_sessions([("CP_1", datetime(2024, 3, 1, 8, 30), datetime(2024, 3, 1, 13, 30), 30.0)], *HOURLY)
+    seconds = {b.hour: v[2] for (_, b), v in acc.items()}
+    assert seconds == {8: 1800, 9: 3600, 10: 3600, 11: 3600, 12: 3600, 13: 1800}
+    assert acc[("CP_1", datetime(2024, 3, 1, 8))][:2] == [30.0, 1]
+    assert sum(v[1] for v in acc.values()) == 1
+    assert all(v[2] <= 3600 for v in acc.values())
+
+
+def test_session_split_across_midnight():
+    acc = rollup.split_sessions([("CP_1", datetime(2024, 3, 1, 22), datetime(2024, 3, 2, 1, 15), 12.5)], *DAILY)
+    assert acc == {("CP_1", date(2024, 3, 1)): [12.5, 1, 7200], ("CP_1", date(2024, 3, 2)): [0.0, 0, 4500]}
+
+
+def test_sessions_accumulate_per_cp_and_bucket():
+    rows = [
+        ("CP_1", datetime(2024, 3, 1, 8, 0), datetime(2024, 3, 1, 8, 20), 2.0),
+        ("CP_1", datetime(2024, 3, 1, 8, 40), datetime(2024, 3, 1, 9, 10), 3.0),
+        ("CP_2", datetime(2024, 3, 1, 8, 0), datetime(2024, 3, 1, 8, 0), None),
+    ]
+    acc = rollup.split_sessions(rows, *HOURLY)
+    assert acc[("CP_1", datetime(2024, 3, 1, 8))] == [5.0, 2, 2400]
+    assert acc[("CP_1", datetime(2024, 3, 1, 9))] == [0.0, 0, 600]
+    assert acc[("CP_2", datetime(2024, 3, 1, 8))] == [0.0, 1, 0]
+
+
+def test_ensure_schema_adds_missing_objects_only(fake_pool):
+    executed = []
+
+    def handler(sql, args):
+        executed.append(sql)
+        if "COLUMN_NAME = 'site_id'" in sql or "INDEX_NAME = 'idx_conn_update'" in sql:
+            return []  # belum ada
+        if "information_schema" in sql:
+            return [(1,)]  # index lain sudah ada
+        return []
+
+    asyncio.run(rollup.ensure_schema(asyncio.run(fake_pool(handler)())))
+    assert any(sql.startswith("ALTER TABLE charge_points ADD COLUMN site_id") for sql in executed)
+    assert [sql for sql in executed if sql.startswith("CREATE INDEX")] == ["CREATE INDEX idx_conn_update ON connectors (last_update)"]
+    assert not any("IF NOT EXISTS site_id" in sql or "INDEX IF NOT EXISTS" in sql for sql in executed)
+
+
+def test_rollup_loop_retries_schema(monkeypatch, fake_pool):
+    calls = {"pool": 0, "schema": 0}
+    pool = asyncio.run(fake_pool(lambda sql, args: [])())
+
+    async def get_pool():
+        calls["pool"] += 1
+        if calls["pool"] == 1:
+            raise ConnectionError("db belum siap")
+        return pool
+
+    async def ensure_schema(p):
+        calls["schema"] += 1
+
+    async def refresh_rollups(p):
+        raise asyncio.CancelledError  # hentikan loop setelah schema berhasil
+
+    monkeypatch.setattr(rollup, "ROLLUP_INTERVAL", 0)
+    monkeypatch.setattr(rollup, "ensure_schema", ensure_schema)
+    monkeypatch.setattr(rollup, "refresh_rollups", refresh_rollups)
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(rollup.rollup_loop(get_pool))
+    assert calls == {"pool": 2, "schema": 1}
+
+
+def test_refresh_writes_split_rows_and_watermark(fake_pool):
+    writes = {}
+    rows = [(7, datetime(2024, 3, 1, 10, 0), "CP_1", datetime(2024, 3, 1, 8, 30), 15.0)]
+
+    def handler(sql, args):
+        if sql.startswith("SELECT GET_LOCK"):
+            return [(1,)]
+        if sql == "SELECT name FROM rollup_state":
+            return [("energy_v2",)]
+        if "FROM rollup_state" in sql:
+            return []
+        if "FROM transactions" in sql:
+            return rows
+        if sql.startswith("INSERT INTO energy_rollup"):
+            writes[sql.split()[2]] = args
+        elif sql.startswith("INSERT INTO rollup_state"):
+            writes["state"] = args
+        return []
+
+    assert asyncio.run(rollup.refresh_rollups(asyncio.run(fake_pool(handler)()))) == 1
+    assert writes["energy_rollup_hourly"] == [
+        ("CP_1", datetime(2024, 3, 1, 8), 15.0, 1, 1800),
+        ("CP_1", datetime(2024, 3, 1, 9), 0.0, 0, 3600),
+    ]
+    assert writes["energy_rollup_daily"] == [("CP_1", date(2024, 3, 1), 15.0, 1, 5400)]
+    assert writes["state"] == ("energy_v2", datetime(2024, 3, 1, 10, 0), 7)
+
+
+def test_old_watermark_triggers_rebuild(fake_pool):
+    executed = []
+
+    def handler(sql, args):
+        executed.append(sql)
+        if sql.startswith("SELECT GET_LOCK"):
+            return [(1,)]
+        if sql == "SELECT name FROM rollup_state":
+            return [("energy",)]
+        return []
+
+    asyncio.run(rollup.refresh_rollups(asyncio.run(fake_pool(handler)())))
+    assert "DELETE FROM energy_rollup_hourly" in executed and "DELETE FROM energy_rollup_daily" in executed
@@ -0,0 +1,30 @@
+from fastapi.testclient import TestClient
+
+import api
+
+
+def _snapshot(**params):
+    return TestClient(api.app).get("/dashboard/snapshot", params=params)
+
+
+def test_dashboard_view(fake_fleet):
+    data = _snapshot(view="dashboard").json()
+    assert data["stats"] == {"total_cps": 5, "active_sessions": 2, "total_energy": 42.5}
+    assert data["cps"] == [{"id": f"CP_{i}", "connected": i % 2, "total_kwh": 10.0} for i in (1, 2, 3)]
+    # hanya 3 CP teratas dan kWh-nya dari rollup, bukan seluruh fleet
+    assert ("SELECT id, connected FROM charge_points ORDER BY id LIMIT %s OFFSET %s", (3, 0)) in fake_fleet.queries
+    assert not any("FROM transactions" in sql for sql, _ in fake_fleet.queries)
+
+
+def test_transactions_view(fake_fleet):
+    data = _snapshot(view="transactions", page=2, limit=5).json()
+    assert [tx["id"] for tx in data["transactions"]] == [7, 6, 5, 4, 3]
+    assert data["has_more"] is True
+    assert {"kwh_by_cp", "daily_usage"} <= set(data) and "stats" not in data
+
+
+def test_views_without_fleet_data_skip_the_db(fake_fleet):
+    assert _snapshot(view="settings").json() == {}
+    assert _snapshot(view="ai_insights").json() == {}
+    assert fake_fleet.queries == []
+    assert _snapshot(view="nope").status_code == 422
@@ -1,113 +1,260 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Query, Request
+from fastapi.responses import Response
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
+import asyncio
+import hashlib
 import httpx
+import json
 import os
-import random
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from collections import defaultdict
 
 app = FastAPI()
 templates = Jinja2Templates(directory="templates")
 
 API_URL = os.getenv("API_URL", "http://api-service:8000")
+FRAGMENT_TTL = float(os.getenv("FRAGMENT_TTL", "5"))  # detik
+FRAGMENT_CACHE_SIZE = int(os.getenv("FRAGMENT_CACHE_SIZE", "256"))  # jumlah fragment (LRU)
+REFRESH_INTERVAL = float(os.getenv("DASHBOARD_REFRESH", "10"))  # detik, 0 = mati
+ML_BUDGET = float(os.getenv("ML_BUDGET", "1.5"))  # detik maksimal menunggu ML saat render
+SMART_TTL = float(os.getenv("SMART_TTL", "60"))  # detik sebelum prediksi di-refresh
+
+# Satu client bersama (connection pool + keep-alive) untuk semua request
+CLIENT = None
+
+@app.on_event("startup")
+async def open_client():
+    global CLIENT
+    CLIENT = httpx.AsyncClient(
+        base_url=API_URL,
+        timeout=httpx.Timeout(10.0, connect=3.0),
+        limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+    )
+
+@app.on_event("shutdown")
+async def close_client():
+    await CLIENT.aclose()
+
+async def fetch_json(path, default, **params):
+    try:
+        resp = await CLIENT.get(path, params=params or None)
+        return resp.json() if resp.status_code == 200 else default
+    except Exception as e:
+        print(f"Error fetching {path}: {e}")
+        return default
+
+async def fetch_page(path, default, **params):
+    """Like fetch_json, but also returns the response headers (X-Total-Count, X-Has-More)."""
+    try:
+        resp = await CLIENT.get(path, params=params or None)
+        if resp.status_code == 200:
+            return resp.json(), resp.headers
+    except Exception as e:
+        print(f"Error fetching {path}: {e}")
+    return default, {}
+
+# --- FRAGMENT CACHE ---
+# Fragment yang sudah dirender disimpan per (nama, parameter) selama
+# FRAGMENT_TTL detik. Banyak tab yang polling bersamaan cukup memicu satu
+# request ke API dan satu render; request yang datang saat render berjalan
+# menunggu hasil yang sama.
+# Key memuat page/limit dari klien, jadi cache dibatasi FRAGMENT_CACHE_SIZE
+# entry (LRU); lock ikut dibuang bersama entry-nya.
+_FRAGMENTS = OrderedDict()  # key -> (expires, etag, body, media_type)
+_FRAGMENT_LOCKS = {}
+
+async def cached_fragment(key, build):
+    entry = _FRAGMENTS.get(key)
+    if entry and entry[0] > time.monotonic():
+        _FRAGMENTS.move_to_end(key)
+        return entry
+    lock = _FRAGMENT_LOCKS.setdefault(key, asyncio.Lock())
+    try:
+        async with lock:
+            entry = _FRAGMENTS.get(key)
+            if entry and entry[0] > time.monotonic():
+                return entry
+            body, media_type = await build()
+            etag = '"' + hashlib.md5(body).hexdigest() + '"'
+            entry = (time.monotonic() + FRAGMENT_TTL, etag, body, media_type)
+            _FRAGMENTS[key] = entry
+            _FRAGMENTS.move_to_end(key)
+            while len(_FRAGMENTS) > FRAGMENT_CACHE_SIZE:
+                old, _ = _FRAGMENTS.popitem(last=False)
+                _FRAGMENT_LOCKS.pop(old, None)
+            return entry
+    finally:
+        # build gagal: jangan tinggalkan lock tanpa entry
+        if key not in _FRAGMENTS and not lock.locked():
+            _FRAGMENT_LOCKS.pop(key, None)
+
+async def fragment_response(request, key, build):
+    _, etag, body, media_type = await cached_fragment(key, build)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type=media_type, headers=headers)
+
+def render_fragment(name, **context):
+    html = templates.get_template(f"fragments/{name}.html").render(**context)
+    return html.encode(), "text/html"
+
+def chart_payload(labels, data):
+    payload = {"data": data} if labels is None else {"labels": labels, "data": data}
+    return json.dumps(payload).encode(), "application/json"
 
 # --- DATA AGGREGATION HELPER ---
-def process_analytics(cps, txs):
-    # 1. Total kWh per Station (Bar Chart)
-    kwh_by_cp = defaultdict(float)
-    for cp in cps:
-        kwh_by_cp[cp['id']] = float(cp.get('total_kwh', 0) or 0)
-
-    # 2. Daily Usage Line Chart (Simulasi data harian karena data txs terbatas)
-    # Di real case, ini harus query SQL: GROUP BY DATE(start_ts)
-    daily_usage = defaultdict(float)
-    for tx in txs:
-        if tx.get('start_ts') and tx.get('meter_stop'):
-            try:
-                dt = datetime.strptime(tx['start_ts'], "%Y-%m-%d %H:%M:%S")
-                date_str = dt.strftime("%Y-%m-%d")
-                kwh = (tx['meter_stop'] - tx['meter_start']) / 1000
-                daily_usage[date_str] += kwh
-            except:
-                pass
-    
+def process_analytics(top_cps, daily_rows, heatmap_rows):
+    # 1. Total kWh per Station (Bar Chart) - top N sudah diurutkan di API
+    kwh_by_cp = {cp['id']: float(cp.get('total_kwh', 0) or 0) for cp in top_cps}
+
+    # 2. Daily Usage Line Chart
+    # Sudah di-GROUP BY tanggal di API (rollup table), mencakup seluruh history
+    daily_usage = {}
+    for row in daily_rows:
+        daily_usage[str(row['bucket'])[:10]] = row['kwh']
+
     # 3. Scatter Plot Data (Hour vs Day)
-    # X: Jam (0-23), Y: Hari (0=Senin, 6=Minggu)
-    scatter_data = []
-    for tx in txs:
-        if tx.get('start_ts'):
-            try:
-                dt = datetime.strptime(tx['start_ts'], "%Y-%m-%d %H:%M:%S")
-                scatter_data.append({
-                    'x': dt.hour + (dt.minute/60), # Jam desimal
-                    'y': dt.weekday() # 0-6
-                })
-            except:
-                pass
+    # X: Jam (0-23), Y: Hari (0=Minggu, 6=Sabtu), r: jumlah sesi
+    scatter_data = [
+        {'x': row['hour'], 'y': row['weekday'], 'sessions': row['sessions']}
+        for row in heatmap_rows
+    ]
 
     return kwh_by_cp, daily_usage, scatter_data
 
-def get_smart_features_dummy():
-    # (Kode dummy sama seperti sebelumnya)
-    forecast_hours = [f"{i}:00" for i in range(24)]
-    forecast_values = []
-    for i in range(24):
-        base_load = 10
-        if 8 <= i <= 18:
-            load = base_load + random.uniform(20, 40)
-        else:
-            load = base_load + random.uniform(0, 10)
-        forecast_values.append(round(load, 2))
-
-    return {
-        "load_forecast": {"labels": forecast_hours, "data": forecast_values},
-        "health_status": {"score": random.randint(85, 100), "anomalies": []},
-        "availability": {"data": [random.randint(20, 90) for _ in range(7)]}
-    }
+# --- SMART FEATURES (ml-service via api-service) ---
+# Prediksi ML lambat (ARIMA, Isolation Forest, K-Means di atas seluruh data),
+# jadi hasilnya di-cache SMART_TTL detik. Kalau cache kadaluarsa, halaman
+# tetap memakai hasil lama dan refresh berjalan di background; hanya saat
+# belum ada hasil sama sekali render menunggu, paling lama ML_BUDGET detik.
+WEEKDAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+FORECAST_HOURS = 24 * 7
 
-@app.get("/")
-async def dashboard(request: Request, view: str = "dashboard", page: int = 1, limit: int = 10):
-    async with httpx.AsyncClient() as client:
+EMPTY_SMART = {
+    "load_forecast": {"labels": [f"{i}:00" for i in range(24)], "data": [0] * 24, "peak": None},
+    "health_status": {"score": 0, "anomalies": []},
+    "availability": {"data": [0] * 7},
+    "users": {"segments": {}, "drivers": 0},
+    "updated_at": None,
+}
+
+_SMART = {"data": None, "fetched_at": 0.0, "task": None}
+
+def _ok(payload):
+    return payload if payload and "error" not in payload else None
+
+ALERT_ISSUES = {
+    "faulted": "Connector fault",
+    "frequent_faults": "Repeated faults",
+    "power_deviation": "Abnormal charging power",
+}
+
+def build_smart_features(previous, forecast, kwh_per_hour, health, maintenance, users, now, alerts=None):
+    """Format raw ml-service responses for the charts; missing parts keep the previous value."""
+    smart = dict(previous)
+
+    if forecast:
+        start = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        steps = [(start + timedelta(hours=i), max(float(v), 0.0)) for i, v in enumerate(forecast["forecast"])]
+
+        # 1. Load forecast 24 jam: sesi/jam x kWh sesi 1 jam (~ kW rata-rata per sesi)
+        factor = kwh_per_hour or 1.0
+        next_day = steps[:24]
+        data = [round(v * factor, 2) for _, v in next_day]
+        peak = max(range(len(data)), key=data.__getitem__) if data else None
+        smart["load_forecast"] = {
+            "labels": [f"{ts.hour}:00" for ts, _ in next_day],
+            "data": data,
+            "peak": {"hour": f"{next_day[peak][0].hour:02d}:00", "kw": data[peak]} if peak is not None else None,
+        }
+
+        # 2. Availability per hari: bagian connector yang diperkirakan bebas
+        n_connectors = len(maintenance["scores"]) if maintenance else 0
+        by_day = {d: [] for d in range(7)}
+        for ts, v in steps:
+            by_day[ts.weekday()].append(v)
+        means = [sum(v) / len(v) if v else 0.0 for v in by_day.values()]
+        capacity = n_connectors or max(means) or 1.0
+        smart["availability"] = {"data": [round(100 * (1 - min(m / capacity, 1))) for m in means]}
+
+    if health:
+        smart["health_status"] = dict(smart["health_status"], score=round(health.get("score", 0)))
+    if maintenance or alerts:
+        # alert streaming (per connector, paling parah dulu) sebelum hasil Isolation Forest
+        anomalies = [
+            {"issue": ALERT_ISSUES.get(a["kinds"][0], a["kinds"][0]), "device": f"{a['cp_id']} #{a['connector_id']}"}
+            for a in (alerts["active"] if alerts else [])
+        ]
+        flagged = sum(1 for a in maintenance["anomalies"] if a) if maintenance else 0
+        if flagged:
+            anomalies.append({"issue": "Abnormal status/error pattern", "device": f"{flagged} connector(s)"})
+        smart["health_status"] = dict(smart["health_status"], anomalies=anomalies)
+
+    if users:
+        segments = {}
+        for c in users["clusters"]:
+            segments[c] = segments.get(c, 0) + 1
+        smart["users"] = {"segments": dict(sorted(segments.items())), "drivers": len(users["clusters"])}
+
+    smart["updated_at"] = now.strftime("%H:%M:%S")
+    return smart
+
+async def _refresh_smart():
+    # satu refresh gagal (payload aneh, ml-service error) cukup dicatat;
+    # data lama tetap dipakai dan request berikutnya mencoba lagi
+    try:
+        forecast, load, health, maintenance, users, alerts = await asyncio.gather(
+            fetch_json("/predict/availability", None, hours=FORECAST_HOURS),
+            fetch_json("/optimize/load", None, duration=1.0),
+            fetch_json("/health/score", None),
+            fetch_json("/predict/maintenance", None),
+            fetch_json("/analytics/users", None),
+            fetch_json("/predict/maintenance/alerts", None, limit=0),
+        )
+        load = _ok(load)
+        _SMART["data"] = build_smart_features(
+            _SMART["data"] or EMPTY_SMART,
+            _ok(forecast), load["predicted_kwh"] if load else None,
+            _ok(health), _ok(maintenance), _ok(users), datetime.now(), _ok(alerts),
+        )
+        _SMART["fetched_at"] = time.monotonic()
+    except Exception as e:
+        print(f"Error refreshing smart features: {e}")
+
+async def get_smart_features():
+    stale = time.monotonic() - _SMART["fetched_at"] > SMART_TTL
+    task = _SMART["task"]
+    if stale and (task is None or task.done()):
+        task = _SMART["task"] = asyncio.create_task(_refresh_smart())
+    if task is not None and not task.done():
+        # setiap refresh: tunggu paling lama ML_BUDGET, lewat itu render dengan
+        # data lama; refresh tetap lanjut di background
         try:
-            # 1. FETCH DATA REAL (Existing)
-            cps_resp = await client.get(f"{API_URL}/cps")
-            all_cps = cps_resp.json() if cps_resp.status_code == 200 else []
-
-            all_txs_resp = await client.get(f"{API_URL}/transactions", params={"page": 1, "limit": 100})
-            all_txs = all_txs_resp.json() if all_txs_resp.status_code == 200 else []
-            
-            # ... (Logika Pagination & Analytics lama TETAP DISINI, jangan dihapus) ...
-            # (Agar kode tidak terlalu panjang, saya asumsikan logika process_analytics 
-            #  dan pagination untuk 'dashboard', 'stations', 'transactions' masih ada di sini)
-            
-            # --- PAGINATION LOGIC EXISTING ---
-            start = (page - 1) * limit
-            end = start + limit
-            paginated_txs = all_txs[start:end]
-            paginated_cps = all_cps[start:end]
-            
-            kwh_by_cp, daily_usage, scatter_data = process_analytics(all_cps, all_txs)
-            
-            total_energy = sum(kwh_by_cp.values())
-            connectors_by_cp = {}
-            active_sessions = 0
-            
-            for cp in all_cps:
-                try:
-                    c_resp = await client.get(f"{API_URL}/connectors/{cp['id']}")
-                    conns = c_resp.json() if c_resp.status_code == 200 else []
-                    connectors_by_cp[cp['id']] = conns
-                    for c in conns:
-                        if c.get("status") == "Charging": active_sessions += 1
-                except:
-                    connectors_by_cp[cp['id']] = []
-
-        except Exception as e:
-            print(f"Error: {e}")
-            all_cps, paginated_cps, all_txs, paginated_txs = [], [], [], []
-            connectors_by_cp, kwh_by_cp, daily_usage, scatter_data = {}, {}, {}, []
-            total_energy, active_sessions = 0, 0
+            await asyncio.wait_for(asyncio.shield(task), ML_BUDGET)
+        except asyncio.TimeoutError:
+            pass
+    return _SMART["data"] or EMPTY_SMART
+
+@app.get("/")
+async def dashboard(request: Request, view: str = "dashboard", page: int = Query(1, ge=1), limit: int = Query(10, ge=1, le=100)):
+    # 1. FETCH DATA REAL: satu round trip ke /dashboard/snapshot, hanya data
+    # untuk view ini (halaman, count & agregat dihitung di API). Prediksi ML
+    # diambil bersamaan, hanya untuk view yang menampilkannya.
+    uses_smart = view in ("dashboard", "ai_insights")
+    snapshot, smart_data = await asyncio.gather(
+        fetch_json("/dashboard/snapshot", {}, view=view, page=page, limit=limit),
+        get_smart_features() if uses_smart else asyncio.sleep(0, EMPTY_SMART),
+    )
+    cps = snapshot.get("cps", [])
+    stats = snapshot.get("stats", {"total_cps": 0, "active_sessions": 0, "total_energy": 0})
+
+    kwh_by_cp, daily_usage, scatter_data = process_analytics(
+        snapshot.get("kwh_by_cp", []), snapshot.get("daily_usage", []), snapshot.get("heatmap", [])
+    )
+    connectors_by_cp = {cp['id']: cp.get('connectors', []) for cp in cps}
 
     # 2. DATA DUMMY UNTUK PAGE SETTINGS (BARU)
     # Karena API belum punya endpoint /users, kita buat dummy list
@@ -124,20 +271,15 @@ async def dashboard(request: Request, view: str = "dashboard", page: int = 1, li
         "maintenance_mode": False
     }
 
-    smart_data = get_smart_features_dummy()
-
-    return templates.TemplateResponse("dashboard.html", {
-        "request": request,
+    # signature (request, name, context): bentuk lama (name, {"request": ...}) sudah dihapus di Starlette 1.0
+    return templates.TemplateResponse(request, "dashboard.html", {
         "view": view, 
-        "cps": all_cps,
-        "table_cps": paginated_cps,
-        "txs": paginated_txs,
+        "cps": cps,
+        "table_cps": cps,
+        "txs": snapshot.get("transactions", []),
+        "has_more": snapshot.get("has_more", False),
         "connectors_by_cp": connectors_by_cp,
-        "stats": {
-            "total_cps": len(all_cps),
-            "active_sessions": active_sessions,
-            "total_energy": round(total_energy, 2)
-        },
+        "stats": stats,
         "analytics": {
             "kwh_by_cp": kwh_by_cp,
             "daily_usage": daily_usage,
@@ -149,5 +291,72 @@ async def dashboard(request: Request, view: str = "dashboard", page: int = 1, li
             "config": system_config
         },
         "page": page,
-        "limit": limit
-    })
\ No newline at end of file
+        "limit": limit,
+        "refresh_ms": int(REFRESH_INTERVAL * 1000),
+    })
+
+# --- FRAGMENTS (partial refresh) ---
+# Dipanggil oleh script di dashboard.html; masing-masing hanya mengambil data
+# yang ia render. HTML untuk kartu & tabel, JSON untuk data chart.
+
+@app.get("/fragments/stats")
+async def fragment_stats(request: Request):
+    async def build():
+        stats = await fetch_json("/stats", {"total_cps": 0, "active_sessions": 0, "total_energy": 0})
+        return render_fragment("stats", stats=stats)
+    return await fragment_response(request, ("stats",), build)
+
+@app.get("/fragments/stations")
+async def fragment_stations(request: Request, page: int = Query(1, ge=1), limit: int = Query(10, ge=1, le=100)):
+    async def build():
+        cps, headers = await fetch_page(
+            "/cps", [], page=page, limit=limit,
+            fields="id,vendor,model,firmware_version,last_heartbeat,connected,total_kwh",
+        )
+        stats = {"total_cps": int(headers.get("x-total-count", len(cps)))}
+        return render_fragment("stations_table", table_cps=cps, stats=stats, page=page, limit=limit)
+    return await fragment_response(request, ("stations", page, limit), build)
+
+@app.get("/fragments/transactions")
+async def fragment_transactions(request: Request, page: int = Query(1, ge=1), limit: int = Query(10, ge=1, le=100)):
+    async def build():
+        txs, headers = await fetch_page("/transactions", [], page=page, limit=limit)
+        has_more = headers.get("x-has-more") == "1"
+        return render_fragment("transactions_table", txs=txs, has_more=has_more, page=page, limit=limit)
+    return await fragment_response(request, ("transactions", page, limit), build)
+
+async def _chart_kwh_by_cp():
+    top = await fetch_json("/analytics/top_cps", [], n=20)
+    kwh_by_cp, _, _ = process_analytics(top, [], [])
+    return chart_payload(list(kwh_by_cp), list(kwh_by_cp.values()))
+
+async def _chart_daily_usage():
+    rows = await fetch_json("/analytics/energy", [], bucket="day", group_by="fleet")
+    _, daily_usage, _ = process_analytics([], rows, [])
+    return chart_payload(list(daily_usage), list(daily_usage.values()))
+
+async def _chart_scatter():
+    rows = await fetch_json("/analytics/heatmap", [])
+    _, _, scatter_data = process_analytics([], [], rows)
+    return chart_payload(None, scatter_data)
+
+async def _chart_load_forecast():
+    forecast = (await get_smart_features())["load_forecast"]
+    return chart_payload(forecast["labels"], forecast["data"])
+
+async def _chart_availability():
+    return chart_payload(None, (await get_smart_features())["availability"]["data"])
+
+CHARTS = {
+    "kwh_by_cp": _chart_kwh_by_cp,
+    "daily_usage": _chart_daily_usage,
+    "scatter": _chart_scatter,
+    "load_forecast": _chart_load_forecast,
+    "availability": _chart_availability,
+}
+
+@app.get("/fragments/charts/{name}")
+async def fragment_chart(request: Request, name: str):
+    if name not in CHARTS:
+        return Response(status_code=404)
+    return await fragment_response(request, ("chart", name), CHARTS[name])
\ No newline at end of file
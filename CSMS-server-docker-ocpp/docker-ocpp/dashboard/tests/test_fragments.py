@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+import app
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(app, "_FRAGMENTS", app.OrderedDict())
+    monkeypatch.setattr(app, "_FRAGMENT_LOCKS", {})
+
+
+def _build(calls, body=b"<div></div>"):
+    async def build():
+        calls.append(1)
+        await asyncio.sleep(0)
+        return body, "text/html"
+    return build
+
+
+def test_concurrent_requests_build_once():
+    calls = []
+
+    async def run():
+        return await asyncio.gather(*[app.cached_fragment(("stats",), _build(calls)) for _ in range(5)])
+
+    entries = asyncio.run(run())
+    assert len(calls) == 1
+    assert len({e[1] for e in entries}) == 1  # etag sama
+
+
+def test_cache_bounded_with_locks(monkeypatch):
+    monkeypatch.setattr(app, "FRAGMENT_CACHE_SIZE", 3)
+    calls = []
+
+    async def run():
+        for page in range(1, 11):
+            await app.cached_fragment(("stations", page, 10), _build(calls))
+        await app.cached_fragment(("stations", 9, 10), _build(calls))  # hit: jadi paling baru
+        await app.cached_fragment(("stations", 11, 10), _build(calls))
+
+    asyncio.run(run())
+    assert list(app._FRAGMENTS) == [("stations", 10, 10), ("stations", 9, 10), ("stations", 11, 10)]
+    assert set(app._FRAGMENT_LOCKS) <= set(app._FRAGMENTS)
+    assert len(calls) == 11
+
+
+def test_failed_build_leaves_no_lock():
+    async def broken():
+        raise RuntimeError("api down")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(app.cached_fragment(("stats",), broken))
+    assert not app._FRAGMENTS and not app._FRAGMENT_LOCKS
+
+
+def test_page_and_limit_validated():
+    from fastapi.testclient import TestClient
+
+    with TestClient(app.app) as client:
+        assert client.get("/fragments/stations", params={"page": 0}).status_code == 422
+        assert client.get("/fragments/transactions", params={"limit": 100000}).status_code == 422
@@ -0,0 +1,35 @@
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+
+
+@pytest.fixture
+def api(monkeypatch):
+    calls = []
+
+    def handler(request):
+        calls.append((request.url.path, dict(request.url.params)))
+        if request.url.path == "/cps":
+            cp = {"id": "CP_21", "vendor": "ABB", "model": "T", "firmware_version": "1", "last_heartbeat": None, "connected": 1, "total_kwh": 3.5}
+            return httpx.Response(200, json=[cp], headers={"X-Total-Count": "45"})
+        return httpx.Response(200, json=[{"id": 9}], headers={"X-Has-More": "0"})
+
+    monkeypatch.setattr(app, "_FRAGMENTS", app.OrderedDict())
+    monkeypatch.setattr(app, "_FRAGMENT_LOCKS", {})
+    monkeypatch.setattr(app, "CLIENT", httpx.AsyncClient(base_url="http://api", transport=httpx.MockTransport(handler)))
+    return calls
+
+
+def test_stations_fragment_pages_on_the_server(api):
+    html = TestClient(app.app).get("/fragments/stations", params={"page": 3, "limit": 10}).text
+    path, params = api[0]
+    assert path == "/cps" and params["page"] == "3" and params["limit"] == "10"
+    assert "Page 3 of 5" in html and "page=4" in html  # 45 CP dari X-Total-Count
+
+
+def test_transactions_fragment_last_page(api):
+    html = TestClient(app.app).get("/fragments/transactions", params={"page": 2, "limit": 10}).text
+    assert api == [("/transactions", {"page": "2", "limit": "10"})]
+    assert "page=1" in html and "page=3" not in html  # X-Has-More: 0 -> tanpa Next
@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+import app
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(app, "_SMART", {"data": None, "fetched_at": 0.0, "task": None})
+    monkeypatch.setattr(app, "SMART_TTL", 0)
+
+
+def _fake_fetch(monkeypatch, health=None, delay=0.0, broken=False):
+    async def fetch_json(path, default, **params):
+        await asyncio.sleep(delay)
+        if path == "/health/score":
+            return health
+        if broken and path == "/analytics/users":
+            return {"unexpected": True}  # tanpa "clusters": build_smart_features gagal
+        return None
+    monkeypatch.setattr(app, "fetch_json", fetch_json)
+
+
+def test_failed_refresh_is_retried(monkeypatch):
+    async def run():
+        _fake_fetch(monkeypatch, broken=True)
+        first = await app.get_smart_features()
+        _fake_fetch(monkeypatch, health={"score": 87.4})
+        second = await app.get_smart_features()
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first is app.EMPTY_SMART
+    assert second["health_status"]["score"] == 87
+
+
+def test_budget_applies_to_every_refresh(monkeypatch):
+    monkeypatch.setattr(app, "ML_BUDGET", 0.05)
+
+    async def run():
+        _fake_fetch(monkeypatch, health={"score": 50})
+        await app.get_smart_features()
+        # refresh kedua cepat: render menunggu dan dapat data baru
+        _fake_fetch(monkeypatch, health={"score": 70}, delay=0.01)
+        fresh = await app.get_smart_features()
+        # refresh ketiga lambat: render tidak menunggu lebih dari budget
+        _fake_fetch(monkeypatch, health={"score": 90}, delay=0.5)
+        t0 = asyncio.get_running_loop().time()
+        stale = await app.get_smart_features()
+        waited = asyncio.get_running_loop().time() - t0
+        await app._SMART["task"]
+        return fresh, stale, waited, app._SMART["data"]
+
+    fresh, stale, waited, final = asyncio.run(run())
+    assert fresh["health_status"]["score"] == 70
+    assert stale["health_status"]["score"] == 70 and waited < 0.3
+    assert final["health_status"]["score"] == 90
@@ -0,0 +1,32 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+
+
+@pytest.fixture
+def api_calls(monkeypatch):
+    """Fake api-service: records every request the dashboard makes."""
+    calls = []
+
+    def handler(request):
+        calls.append((request.url.path, dict(request.url.params)))
+        stats = {"total_cps": 5, "active_sessions": 2, "total_energy": 42.5}
+        return httpx.Response(200, json={"stats": stats, "cps": [{"id": "CP_1", "connected": 1, "total_kwh": 10.0}]})
+
+    async def smart():
+        return app.EMPTY_SMART
+
+    monkeypatch.setattr(app, "CLIENT", httpx.AsyncClient(base_url="http://api", transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(app, "get_smart_features", smart)
+    return calls
+
+
+@pytest.mark.parametrize("view", ["dashboard", "stations", "transactions", "settings"])
+def test_page_is_one_api_round_trip(api_calls, view):
+    r = TestClient(app.app).get("/", params={"view": view, "page": 2, "limit": 20})  # tanpa startup
+    assert r.status_code == 200
+    assert api_calls == [("/dashboard/snapshot", {"view": view, "page": "2", "limit": "20"})]
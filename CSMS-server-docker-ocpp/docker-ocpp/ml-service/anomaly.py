@@ -0,0 +1,231 @@
+import logging
+import math
+import os
+import time
+from collections import deque
+
+logger = logging.getLogger("ml-service.anomaly")
+
+# ---------------------
+# Streaming anomaly detection
+# ---------------------
+# Isolation Forest di train_maintenance_model hanya melihat snapshot tabel
+# connectors (3 fitur) dan jarang punya >= 10 baris. Detector ini membaca
+# event StatusNotification dan MeterValues dari ocpp-server (POST /events)
+# dan menyimpan statistik berjalan per connector, ukuran tetap (O(1)):
+# - frekuensi fault : jumlah fault baru yang meluruh eksponensial
+#                     (half-life ANOMALY_FAULT_HALF_LIFE_HOURS)
+# - daya            : EWMA mean/variance dari daya selama satu sesi
+#                     (direset tiap StartTransaction, karena tiap mobil
+#                     menarik daya berbeda); sampel yang menyimpang
+#                     > ANOMALY_POWER_Z sigma = anomali.
+#                     Kalau charger tidak mengirim Power.Active.Import,
+#                     daya diturunkan dari selisih Energy.Active.Import.Register
+# Alert langsung dibuat saat event yang memicunya diproses (tanpa retrain
+# berkala) dan disimpan di ring buffer.
+
+FAULT_HALF_LIFE = float(os.getenv("ANOMALY_FAULT_HALF_LIFE_HOURS", "6")) * 3600
+FAULT_ALERT = float(os.getenv("ANOMALY_FAULT_ALERT", "2.5"))  # fault yang sudah meluruh; ~3 fault dalam beberapa jam
+POWER_ALPHA = float(os.getenv("ANOMALY_POWER_ALPHA", "0.05"))
+POWER_Z = float(os.getenv("ANOMALY_POWER_Z", "4"))
+POWER_MIN_SAMPLES = int(os.getenv("ANOMALY_POWER_MIN_SAMPLES", "20"))
+POWER_MIN_STD_W = 100.0  # batas bawah sigma: daya yang sangat stabil tidak memicu alert karena noise
+ALERT_HISTORY = int(os.getenv("ANOMALY_ALERT_HISTORY", "500"))
+
+FAULTED, FREQUENT_FAULTS, POWER_DEVIATION = "faulted", "frequent_faults", "power_deviation"
+
+
+def is_fault(status, error_code):
+    return status == "Faulted" or error_code not in (None, "NoError")
+
+
+class ConnectorStats:
+    """Running statistics of one connector; fixed size regardless of history."""
+
+    __slots__ = (
+        "status", "error_code", "faulted", "fault_rate", "fault_ts",
+        "power_n", "power_mean", "power_var", "power_last", "power_z",
+        "energy_wh", "energy_ts", "transaction_id", "active", "updated",
+    )
+
+    def __init__(self):
+        self.status = None
+        self.error_code = None
+        self.faulted = False
+        self.fault_rate = 0.0
+        self.fault_ts = 0.0
+        self.power_n = 0
+        self.power_mean = 0.0
+        self.power_var = 0.0
+        self.power_last = None
+        self.power_z = 0.0
+        self.energy_wh = None
+        self.energy_ts = None
+        self.transaction_id = None
+        self.active = set()  # jenis alert yang sedang aktif
+        self.updated = 0.0
+
+    def fault_rate_at(self, now):
+        return self.fault_rate * 2 ** (-(now - self.fault_ts) / FAULT_HALF_LIFE)
+
+    def add_fault(self, now):
+        self.fault_rate = self.fault_rate_at(now) + 1
+        self.fault_ts = now
+
+    def reset_power(self):
+        self.power_n = 0
+        self.power_mean = self.power_var = self.power_z = 0.0
+        self.active.discard(POWER_DEVIATION)
+
+    def add_power(self, watts):
+        """Update the EWMA and return the z-score of ``watts`` against the state before it."""
+        if self.power_n:
+            std = max(math.sqrt(self.power_var), POWER_MIN_STD_W)
+            z = (watts - self.power_mean) / std
+            diff = watts - self.power_mean
+            incr = POWER_ALPHA * diff
+            self.power_mean += incr
+            self.power_var = (1 - POWER_ALPHA) * (self.power_var + diff * incr)
+        else:
+            z = 0.0
+            self.power_mean = watts
+        self.power_n += 1
+        self.power_last = watts
+        self.power_z = z
+        return z
+
+    def score(self, now):
+        # >= 1 berarti ada kondisi alert
+        power = abs(self.power_z) / POWER_Z if self.power_n > POWER_MIN_SAMPLES else 0.0
+        return max(self.fault_rate_at(now) / FAULT_ALERT, power, 1.0 if self.faulted else 0.0)
+
+
+class AnomalyDetector:
+    def __init__(self):
+        self.connectors = {}  # (cp_id, connector_id) -> ConnectorStats
+        self.alerts = deque(maxlen=ALERT_HISTORY)
+        self.events = 0
+
+    def _stats(self, event):
+        key = (event["cp_id"], int(event["connector_id"]))
+        stats = self.connectors.get(key)
+        if stats is None:
+            stats = self.connectors[key] = ConnectorStats()
+        return key, stats
+
+    def _raise(self, key, stats, kind, now, **details):
+        if kind in stats.active:
+            return
+        stats.active.add(kind)
+        alert = {"ts": now, "cp_id": key[0], "connector_id": key[1], "kind": kind, **details}
+        self.alerts.append(alert)
+        logger.warning("maintenance alert %s on %s #%s: %s", kind, key[0], key[1], details)
+
+    def handle(self, event):
+        """Apply one event from ocpp-server (see POST /events)."""
+        kind = event.get("type")
+        if kind == "status":
+            self.on_status(event)
+        elif kind == "meter":
+            self.on_meter(event)
+        elif kind == "start":
+            # selisih energi tidak dihitung lintas transaksi
+            _, stats = self._stats(event)
+            stats.reset_power()
+            stats.transaction_id = event.get("transaction_id")
+            stats.energy_wh, stats.energy_ts = event.get("meter_start"), event.get("ts", time.time())
+        elif kind == "stop":
+            _, stats = self._stats(event)
+            stats.reset_power()
+            stats.transaction_id = stats.energy_wh = stats.energy_ts = None
+        else:
+            return
+        self.events += 1
+
+    def on_status(self, event):
+        now = event.get("ts", time.time())
+        key, stats = self._stats(event)
+        faulted = is_fault(event["status"], event.get("error_code"))
+        if faulted and not stats.faulted:
+            stats.add_fault(now)
+            self._raise(key, stats, FAULTED, now, status=event["status"], error_code=event.get("error_code"))
+            rate = stats.fault_rate_at(now)
+            if rate >= FAULT_ALERT:
+                self._raise(key, stats, FREQUENT_FAULTS, now, fault_rate=round(rate, 2), half_life_hours=FAULT_HALF_LIFE / 3600)
+        elif not faulted:
+            stats.active.discard(FAULTED)
+        stats.status, stats.error_code, stats.faulted = event["status"], event.get("error_code"), faulted
+        if stats.status != "Charging":
+            stats.energy_wh = stats.energy_ts = None
+        stats.updated = now
+
+    def on_meter(self, event):
+        now = event.get("ts", time.time())
+        key, stats = self._stats(event)
+        watts = event.get("power_w")
+        energy = event.get("energy_wh")
+        if energy is not None:
+            if watts is None and stats.energy_wh is not None and now > stats.energy_ts and energy >= stats.energy_wh:
+                watts = (energy - stats.energy_wh) * 3600 / (now - stats.energy_ts)
+            stats.energy_wh, stats.energy_ts = float(energy), now
+        stats.updated = now
+        if watts is None:
+            return
+        expected = stats.power_mean
+        z = stats.add_power(float(watts))
+        if stats.power_n <= POWER_MIN_SAMPLES:
+            return
+        if abs(z) > POWER_Z:
+            self._raise(key, stats, POWER_DEVIATION, now, power_w=round(float(watts), 1), expected_w=round(expected, 1), z=round(z, 2))
+        else:
+            stats.active.discard(POWER_DEVIATION)
+
+    # --- read ---
+    def active(self, now=None):
+        now = time.time() if now is None else now
+        result = []
+        for (cp_id, connector_id), stats in self.connectors.items():
+            # frekuensi fault meluruh tanpa event: cek ulang saat dibaca
+            if FREQUENT_FAULTS in stats.active and stats.fault_rate_at(now) < FAULT_ALERT / 2:
+                stats.active.discard(FREQUENT_FAULTS)
+            if stats.active:
+                result.append({"cp_id": cp_id, "connector_id": connector_id, "kinds": sorted(stats.active), "score": round(stats.score(now), 3)})
+        return sorted(result, key=lambda a: -a["score"])
+
+    def recent(self, limit=100, since=None):
+        alerts = [a for a in self.alerts if since is None or a["ts"] > since]
+        return alerts[-limit:] if limit > 0 else []
+
+    def connector(self, cp_id, connector_id, now=None):
+        stats = self.connectors.get((cp_id, connector_id))
+        if stats is None:
+            return None
+        now = time.time() if now is None else now
+        return {
+            "cp_id": cp_id,
+            "connector_id": connector_id,
+            "status": stats.status,
+            "error_code": stats.error_code,
+            "fault_rate": round(stats.fault_rate_at(now), 3),
+            "power_samples": stats.power_n,
+            "power_w": stats.power_last,
+            "power_mean_w": round(stats.power_mean, 1),
+            "power_std_w": round(math.sqrt(stats.power_var), 1),
+            "power_z": round(stats.power_z, 2),
+            "score": round(stats.score(now), 3),
+            "alerts": sorted(stats.active),
+            "updated": stats.updated,
+        }
+
+    def all_connectors(self, cp_id=None):
+        now = time.time()
+        return [self.connector(k[0], k[1], now) for k in sorted(self.connectors) if cp_id is None or k[0] == cp_id]
+
+    def info(self):
+        return {
+            "connectors": len(self.connectors),
+            "events": self.events,
+            "active_alerts": sum(1 for s in self.connectors.values() if s.active),
+            "recent_alerts": len(self.alerts),
+            "thresholds": {"fault_alert": FAULT_ALERT, "fault_half_life_hours": FAULT_HALF_LIFE / 3600, "power_z": POWER_Z},
+        }
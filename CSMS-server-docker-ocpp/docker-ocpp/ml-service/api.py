@@ -1,75 +1,305 @@
-from fastapi import FastAPI
-import pickle
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse
+import asyncio
+import logging
 import os
 import pandas as pd
-from datetime import datetime, timedelta
-from preprocess import load_transactions, load_connectors, load_users, prepare_anomaly_data, prepare_user_clusters
-from sklearn.metrics import mean_absolute_error
+import preprocess
+from preprocess import USER_FEATURES, anomaly_features, prepare_anomaly_data, prepare_user_clusters
 import numpy as np
+from metrics import MetricsSampler
+from registry import ModelRegistry
+from store import FeatureStore
+from forecast import FleetForecastCache, ForecastCache
+from retrain import RetrainScheduler
+from workers import Overloaded, WorkerPool
+from batch import read_columns, respond
+from health import HealthEngine
+from anomaly import AnomalyDetector
+from segments import UserSegments, nearest
 
 app = FastAPI(title="ML Service for OCPP")
+logger = logging.getLogger("ml-service.api")
 
-MODEL_DIR = 'models'
+# pool dibuat lazy oleh preprocess.get_pool(); None sampai query pertama
+SAMPLER = MetricsSampler("ml-service", pool_getter=lambda: {"primary": preprocess._POOL} if preprocess._POOL else None)
+MODELS = ModelRegistry()
+STORE = FeatureStore()
+FORECASTS = ForecastCache(MODELS)
+FLEET = FleetForecastCache(MODELS)
+RETRAINER = RetrainScheduler(MODELS)
+HEALTH = HealthEngine()
+DETECTOR = AnomalyDetector()
+SEGMENTS = UserSegments(MODELS)
+# endpoint berat (groupby semua transaksi) dapat jatah thread paling sedikit
+WORKERS = WorkerPool(limits={"analytics_users": 1, "maintenance": 2})
+# penerima event OCPP dari ocpp-server (POST /events), dipanggil berurutan;
+# satu consumer yang gagal tidak menghentikan consumer berikutnya
+EVENT_CONSUMERS = [HEALTH.handle, DETECTOR.handle, SEGMENTS.handle]
+
+@app.on_event("startup")
+async def start_background():
+    SAMPLER.start()
+    await MODELS.start()
+    await FORECASTS.start()
+    await FLEET.start()
+    RETRAINER.start()
+    HEALTH.start()
+    SEGMENTS.start()
+
+@app.on_event("shutdown")
+async def stop_background():
+    await SAMPLER.stop()
+    await MODELS.stop()
+    await FORECASTS.stop()
+    await FLEET.stop()
+    await RETRAINER.stop()
+    await HEALTH.stop()
+    await SEGMENTS.stop()
+    WORKERS.shutdown()
+
+@app.exception_handler(Overloaded)
+async def overloaded(request: Request, exc: Overloaded):
+    return JSONResponse({"error": "Inference queue full", "endpoint": str(exc)}, status_code=503, headers={"Retry-After": "1"})
 
 def load_model(name):
-    path = os.path.join(MODEL_DIR, f'{name}.pkl')
-    if os.path.exists(path):
-        with open(path, 'rb') as f:
-            return pickle.load(f)
-    return None
+    # dari registry (sudah di memori), bukan unpickle per request
+    return MODELS.get(name)
 
 @app.get("/predict/availability")
-async def predict_availability(hours: int = 24):
-    """Predict future availability/demand."""
-    model = load_model('availability_arima')
-    if not model:
+async def predict_availability(hours: int = 24, cp_id: str = None):
+    """Predict future availability/demand for the fleet, or for one charge point."""
+    # dari cache (dihitung ulang saat model baru / jam berganti)
+    if cp_id is not None:
+        cached = FLEET.get(hours, cp_id)
+        if cached is None:
+            return {"error": "Model not trained"}
+        start, forecast = cached
+        if forecast is None:
+            return {"error": f"No forecast for charge point {cp_id}"}
+        return {"forecast": forecast, "hours": hours, "start": start.isoformat(), "cp_id": cp_id}
+    cached = FORECASTS.get(hours)
+    if cached is None:
         return {"error": "Model not trained"}
-    # Forecast next hours
-    forecast = model.forecast(steps=hours)
-    return {"forecast": forecast.tolist(), "hours": hours}
+    start, forecast = cached
+    return {"forecast": forecast, "hours": hours, "start": start.isoformat()}
+
+@app.get("/predict/availability/fleet")
+async def predict_availability_fleet(hours: int = 24):
+    """Per-charge-point forecast for every station."""
+    cached = FLEET.get(hours)
+    if cached is None:
+        return {"error": "Model not trained"}
+    start, forecast = cached
+    return {"forecast": forecast, "hours": hours, "start": start.isoformat()}
+
+@app.get("/predict/availability/cache")
+async def predict_availability_cache():
+    """Model version, start hour and compute time of the cached forecasts."""
+    return {**FORECASTS.info(), "per_cp": FLEET.info()}
+
+# --- komputasi sinkron (pandas/sklearn), dijalankan di WORKERS ---
+
+ANOMALY_THRESHOLD = -0.5
+
+def _maintenance(model, df_conn):
+    X = prepare_anomaly_data(df_conn)
+    if X.empty:
+        return None
+    scores = model.decision_function(X)
+    anomalies = (scores < ANOMALY_THRESHOLD).tolist()  # Threshold for anomalies
+    return {"anomalies": anomalies, "scores": scores.tolist()}
+
+def _user_clusters(model, df_tx, df_users):
+    X = prepare_user_clusters(df_tx, df_users)
+    if X.empty:
+        return None
+    return {"clusters": model.predict(X).tolist(), "features": X.columns.tolist()}
+
+# batch: satu panggilan model untuk semua baris, hasil dalam urutan input
+
+def _load_batch(model, cols):
+    return {"predicted_kwh": np.asarray(model.predict(pd.DataFrame({"duration": cols["duration"]})), dtype=float)}
+
+def _maintenance_batch(model, cols):
+    scores = np.asarray(model.decision_function(anomaly_features(cols["status"], cols["error_code"], cols["hours_since_update"])))
+    return {"score": scores, "anomaly": scores < ANOMALY_THRESHOLD}
+
+def _user_clusters_batch(model, cols):
+    return {"cluster": np.asarray(model.predict(pd.DataFrame(cols, columns=USER_FEATURES)))}
+
+def _segments_batch(centers, cols):
+    return {"cluster": nearest(centers, np.column_stack([cols[name] for name in USER_FEATURES]))}
 
 @app.get("/predict/maintenance")
 async def predict_maintenance():
     """Anomaly scores for connectors."""
-    df_conn = await load_connectors()
-    X = prepare_anomaly_data(df_conn)
+    await STORE.sync()
     model = load_model('maintenance_iforest')
-    if not model or X.empty:
+    result = await WORKERS.run("maintenance", _maintenance, model, STORE.connectors) if model else None
+    if result is None:
         return {"error": "Model not trained or no data"}
-    scores = model.decision_function(X)
-    anomalies = (scores < -0.5).tolist()  # Threshold for anomalies
-    return {"anomalies": anomalies, "scores": scores.tolist()}
+    return result
+
+@app.get("/predict/maintenance/alerts")
+async def predict_maintenance_alerts(limit: int = 100, since: float = None):
+    """Connectors with an active streaming alert (highest score first) and the latest alerts."""
+    return {"active": DETECTOR.active(), "recent": DETECTOR.recent(limit=limit, since=since), **DETECTOR.info()}
+
+@app.get("/predict/maintenance/connectors")
+async def predict_maintenance_connectors(cp_id: str = None):
+    """Running telemetry statistics per connector (fault rate, power EWMA, score)."""
+    return DETECTOR.all_connectors(cp_id=cp_id)
+
+@app.post("/predict/maintenance/batch")
+async def predict_maintenance_batch(request: Request):
+    """Anomaly scores for many connector scenarios (status, error_code, hours_since_update arrays)."""
+    cols = await read_columns(request, {"status": str, "error_code": str, "hours_since_update": float})
+    model = load_model('maintenance_iforest')
+    if not model:
+        return {"error": "Model not trained"}
+    return respond(request, await WORKERS.run("maintenance_batch", _maintenance_batch, model, cols))
 
 @app.get("/analytics/users")
 async def analytics_users():
     """User clusters."""
-    df_tx = await load_transactions()
-    df_users = await load_users()
-    X = prepare_user_clusters(df_tx, df_users)
+    if SEGMENTS.ready:
+        # dari agregat per user yang di-update per sesi, tanpa groupby semua transaksi
+        return {"clusters": SEGMENTS.assign_all().tolist(), "features": USER_FEATURES, "source": "segments"}
+    await STORE.sync()
     model = load_model('user_kmeans')
-    if not model or X.empty:
+    result = await WORKERS.run("analytics_users", _user_clusters, model, STORE.transactions, STORE.users) if model else None
+    if result is None:
         return {"error": "Model not trained or no data"}
-    clusters = model.predict(X).tolist()
-    return {"clusters": clusters, "features": X.columns.tolist()}
+    return {**result, "source": "model"}
+
+@app.get("/analytics/users/{id_tag}/segment")
+async def analytics_user_segment(id_tag: str):
+    """Segment of one user from their running aggregates (no history scan)."""
+    if not SEGMENTS.ready:
+        return {"error": "Segments not ready"}
+    result = SEGMENTS.segment(id_tag)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Unknown id_tag or no finished sessions")
+    return result
+
+@app.get("/analytics/segments")
+async def analytics_segments():
+    """Online segmentation state: centers, users per center, last mini-batch update."""
+    return SEGMENTS.info()
+
+@app.post("/analytics/users/batch")
+async def analytics_users_batch(request: Request):
+    """Cluster for many user feature rows (one array per feature column)."""
+    cols = await read_columns(request, {name: float for name in USER_FEATURES})
+    # center yang sama dengan /analytics/users; salinan, karena update() mengubahnya di tempat
+    if SEGMENTS.ready:
+        clusters = await WORKERS.run("users_batch", _segments_batch, SEGMENTS.centers.copy(), cols)
+        return respond(request, clusters, headers={"X-Segment-Source": "segments"})
+    model = load_model('user_kmeans')
+    if not model:
+        return {"error": "Model not trained"}
+    return respond(request, await WORKERS.run("users_batch", _user_clusters_batch, model, cols), headers={"X-Segment-Source": "model"})
 
 @app.get("/optimize/load")
 async def optimize_load(duration: float = 1.0):
     """Predict load based on duration."""
+    # satu baris LinearRegression: lebih murah inline daripada lewat thread pool
     model = load_model('load_lr')
     if not model:
         return {"error": "Model not trained"}
     pred = model.predict([[duration]])[0]
     return {"predicted_kwh": pred, "duration": duration}
 
+@app.post("/optimize/load/batch")
+async def optimize_load_batch(request: Request):
+    """Predicted kWh for many durations ({"duration": [...]}, JSON or Arrow IPC)."""
+    cols = await read_columns(request, {"duration": float})
+    model = load_model('load_lr')
+    if not model:
+        return {"error": "Model not trained"}
+    return respond(request, await WORKERS.run("load_batch", _load_batch, model, cols))
+
 @app.get("/health/score")
-async def health_score():
-    """Custom health score."""
-    df_conn = await load_connectors()
-    df_tx = await load_transactions()
-    if df_conn.empty:
+async def health_score(cp_id: str = None, site_id: str = None):
+    """Rolling-window health score, fleet-wide or for one charge point / site."""
+    if not HEALTH.primed:
+        return {"score": 0, "details": "Health engine not synced yet"}
+    result = HEALTH.score(cp_id=cp_id, site_id=site_id)
+    if result is None:
+        if cp_id is not None or site_id is not None:
+            raise HTTPException(status_code=404, detail="Unknown charge point or site")
         return {"score": 0, "details": "No connector data"}
-    avail_pct = (df_conn['status'] == 'Available').mean()
-    error_pct = (df_conn['error_code'] != 'NoError').mean()
-    recent_tx = df_tx[df_tx['start_ts'] > datetime.now() - timedelta(days=1)].shape[0]
-    score = (avail_pct * 0.5 + (1 - error_pct) * 0.3 + min(recent_tx / 10, 1) * 0.2) * 100
-    return {"score": round(score, 2), "availability": avail_pct, "errors": error_pct, "recent_transactions": recent_tx}
+    return {**result, "window_hours": HEALTH.window_hours}
+
+@app.get("/health/score/sites")
+async def health_score_sites(per_cp: bool = False):
+    """Score of every site (and every charge point with per_cp=true)."""
+    result = {**HEALTH.info(), "sites": HEALTH.all_sites()}
+    if per_cp:
+        result["per_cp"] = HEALTH.all_cps()
+    return result
+
+@app.get("/health/score/history")
+async def health_score_history(limit: int = 96):
+    """Fleet and per-site score at the end of each bucket, oldest first."""
+    return list(HEALTH.history)[-limit:] if limit > 0 else []
+
+@app.post("/events")
+async def events(batch: list[dict]):
+    """OCPP events forwarded by ocpp-server (status, start, stop, meter)."""
+    rejected = 0
+    for event in batch:
+        failed = False
+        for consume in EVENT_CONSUMERS:
+            try:
+                consume(event)
+            except Exception as e:
+                failed = True  # event rusak tidak boleh menggagalkan satu batch
+                logger.warning("event consumer %s gagal: %r", getattr(consume, "__qualname__", consume), e)
+        rejected += failed
+    return {"accepted": len(batch) - rejected, "rejected": rejected}
+
+@app.get("/models")
+async def models_info():
+    """Loaded models with version, file size and load time."""
+    return MODELS.info()
+
+@app.post("/models/reload")
+async def models_reload():
+    """Rescan models/ now instead of waiting for the watcher."""
+    changed = await asyncio.to_thread(MODELS.refresh)
+    return {"reloaded": changed, "models": MODELS.info()}
+
+@app.get("/training")
+async def training_info():
+    """Retraining schedule and history (duration, peak RSS, per-model result)."""
+    return RETRAINER.info()
+
+@app.post("/training/run")
+async def training_run():
+    """Retrain now in a separate process; returns the run's history record."""
+    record = await RETRAINER.run_now()
+    if record is None:
+        raise HTTPException(status_code=409, detail="Training already running")
+    return record
+
+@app.get("/workers")
+async def workers_info():
+    """Inference pool size, queue depth and per-endpoint counters."""
+    return WORKERS.info()
+
+@app.get("/store")
+async def store_info():
+    """Feature store size, watermarks and cost of the last incremental sync."""
+    return STORE.info()
+
+@app.get("/system/usage")
+async def system_usage():
+    """Latest resource sample of the ML service (non-blocking)."""
+    return SAMPLER.latest()
+
+@app.get("/system/usage/history")
+async def system_usage_history(limit: int = Query(120, ge=1, le=5000), since: float = Query(None, ge=0)):
+    """Recent resource samples for charts."""
+    return SAMPLER.history(limit=limit, since=since)
@@ -0,0 +1,325 @@
+"""Rolling-origin backtest of the ml-service models.
+
+Every fold trains a model on the data before an origin hour and evaluates it
+on what happened after. The origins are ``--folds`` points spaced ``--step``
+hours apart, ending ``--horizon`` hours before the last transaction. Models,
+candidates and folds run as independent tasks on a process pool
+(``--jobs``). Each result row carries the accuracy metrics next to the
+training time and the inference time for the fold.
+
+- availability: hourly session starts, ``--horizon``-hour forecast. MAE of
+  each ARIMA order in ``--arima-orders``, against seasonal-naive baselines
+  (same hour yesterday / last week).
+- fleet: per-CP forecast (fleet.py) over the same horizon, MAE per CP-hour,
+  against a per-CP seasonal-naive baseline.
+- load: linear kWh ~ duration on finished sessions before the origin. MAE on
+  sessions started within the horizon, against a constant kW baseline.
+- users: K-Means for each k in ``--clusters`` on per-user totals at the
+  origin. Inertia per user of the totals one horizon later, as a ratio to a
+  refit, and the share of users that keep their segment.
+- maintenance: there is no fault history, so folds are a K-fold split of the
+  connectors table and only the share flagged at each threshold in
+  ``--thresholds`` is reported. A "Faulted or error code" label would be
+  computed from the model's own inputs, so precision/recall against it would
+  measure nothing.
+
+    python backtest.py --folds 8 --jobs 4 --out results/backtest.json
+    python backtest.py --synthetic 120 --jobs 4    # without a database
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from fleet import HISTORY_WEEKS, FleetForecaster, hourly_matrix
+from preprocess import prepare_anomaly_data, prepare_time_series
+from segments import DURATION, KWH, SESSIONS, START_HOURS, user_features
+
+DATA = {}  # diisi sekali per proses worker (initializer), bukan di-pickle per task
+
+
+def _init(data):
+    global DATA
+    DATA = data
+    warnings.simplefilter("ignore")  # ConvergenceWarning statsmodels per fold
+
+
+def _mae(actual, predicted):
+    return float(np.mean(np.abs(np.asarray(actual, dtype=float) - np.asarray(predicted, dtype=float))))
+
+
+def _timed(fn, *args):
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - t0
+
+
+# ---------------------
+# Data
+# ---------------------
+def prepare(df_tx, df_conn, folds, step, horizon):
+    """Everything the tasks need as compact arrays, plus the fold origins (hour index into the series)."""
+    series = prepare_time_series(df_tx)["transactions"]
+    end = len(series) - horizon
+    origins = [end - (folds - 1 - i) * step for i in range(folds)]
+    origins = [o for o in origins if o >= 24 * 7]  # minimal satu minggu history
+    if not origins:
+        raise SystemExit(f"Not enough history for {folds} folds of {horizon} h (have {len(series)} h)")
+    cp_ids, start, X = hourly_matrix(df_tx, weeks=len(series) // 168 + 2)
+    offset = int((series.index[0] - pd.Timestamp(start)) / pd.Timedelta(hours=1))
+    done = df_tx["stop_ts"].notna() & df_tx["kwh"].notna()
+    hour0 = series.index[0]
+    tx = df_tx[done]
+    codes, _ = pd.factorize(tx["id_tag"])
+    return origins, {
+        "series": series.to_numpy(dtype=float),
+        "series_start": series.index[0],
+        "fleet": X[:, offset:] if offset >= 0 else X,
+        "fleet_cps": cp_ids,
+        # jam relatif terhadap awal series
+        "tx_start": ((tx["start_ts"] - hour0) / pd.Timedelta(hours=1)).to_numpy(dtype=float),
+        "tx_stop": ((tx["stop_ts"] - hour0) / pd.Timedelta(hours=1)).to_numpy(dtype=float),
+        "tx_duration": tx["duration"].to_numpy(dtype=float),
+        "tx_kwh": tx["kwh"].to_numpy(dtype=float),
+        "tx_hour": tx["start_ts"].dt.hour.to_numpy(dtype=float),
+        "tx_user": codes,
+        "conn_X": prepare_anomaly_data(df_conn).to_numpy(dtype=float) if not df_conn.empty else np.zeros((0, 3)),
+    }
+
+
+async def load_db():
+    from preprocess import close_pool, load_connectors, load_transactions
+    df_tx = await load_transactions()
+    df_conn = await load_connectors()
+    await close_pool()
+    return df_tx, df_conn
+
+
+# ---------------------
+# Tasks (jalan di worker; hanya memakai DATA)
+# ---------------------
+def _seasonal_naive(history, horizon, period):
+    return np.resize(history[-period:], horizon) if len(history) >= period else np.full(horizon, history.mean())
+
+
+def task_availability(candidate, origin, horizon):
+    y = DATA["series"]
+    train, test = y[:origin], y[origin:origin + horizon]
+    if candidate.startswith("seasonal_naive"):
+        period = int(candidate.rsplit("_", 1)[1])
+        forecast, infer = _timed(_seasonal_naive, train, horizon, period)
+        fit_seconds = 0.0
+    else:
+        from statsmodels.tsa.arima.model import ARIMA
+        order = tuple(int(v) for v in candidate[len("arima("):-1].split(","))
+        model, fit_seconds = _timed(lambda: ARIMA(train, order=order).fit())
+        forecast, infer = _timed(model.forecast, horizon)
+    return {"metrics": {"mae": _mae(test, forecast)}, "train_seconds": fit_seconds, "infer_ms": infer * 1000, "n_test": len(test)}
+
+
+def task_fleet(candidate, origin, horizon):
+    X = DATA["fleet"]
+    train = X[:, max(origin - HISTORY_WEEKS * 168, 0):origin]
+    test = X[:, origin:origin + horizon]
+    if candidate == "seasonal_naive_168":
+        pred, infer = _timed(lambda: np.stack([_seasonal_naive(row, horizon, 168) for row in train]) if len(train) else train)
+        fit_seconds = 0.0
+    else:
+        start = DATA["series_start"] + pd.Timedelta(hours=max(origin - HISTORY_WEEKS * 168, 0))
+        model, fit_seconds = _timed(FleetForecaster.fit, DATA["fleet_cps"], train, start.to_pydatetime())
+        pred, infer = _timed(model.forecast, model.end + pd.Timedelta(hours=1), horizon)
+    return {"metrics": {"mae": _mae(test, pred)}, "train_seconds": fit_seconds, "infer_ms": infer * 1000, "n_test": int(test.size)}
+
+
+def task_load(candidate, origin, horizon):
+    duration, kwh = DATA["tx_duration"], DATA["tx_kwh"]
+    train = DATA["tx_stop"] < origin  # sesi yang sudah selesai saat origin
+    test = (DATA["tx_start"] >= origin) & (DATA["tx_start"] < origin + horizon)
+    if not train.any() or not test.any():
+        return None
+    if candidate == "constant_kw":
+        (kw, fit_seconds) = _timed(lambda: kwh[train].sum() / max(duration[train].sum(), 1e-9))
+        pred, infer = _timed(lambda: duration[test] * kw)
+    else:
+        from sklearn.linear_model import LinearRegression
+        model, fit_seconds = _timed(lambda: LinearRegression().fit(duration[train, None], kwh[train]))
+        pred, infer = _timed(model.predict, duration[test, None])
+    return {"metrics": {"mae": _mae(kwh[test], pred)}, "train_seconds": fit_seconds, "infer_ms": infer * 1000, "n_test": int(test.sum())}
+
+
+def _user_totals(mask):
+    users, n = DATA["tx_user"][mask], DATA["tx_user"].max() + 1
+    stats = np.zeros((n, 4))
+    stats[:, SESSIONS] = np.bincount(users, minlength=n)
+    stats[:, DURATION] = np.bincount(users, DATA["tx_duration"][mask], minlength=n)
+    stats[:, KWH] = np.bincount(users, DATA["tx_kwh"][mask], minlength=n)
+    stats[:, START_HOURS] = np.bincount(users, DATA["tx_hour"][mask], minlength=n)
+    return stats
+
+
+def _kmeans(X, k):
+    from sklearn.cluster import KMeans
+    return KMeans(n_clusters=min(k, len(X)), random_state=42, n_init=10).fit(X)
+
+
+def task_users(candidate, origin, horizon):
+    k = int(candidate.split("=")[1])
+    before = _user_totals(DATA["tx_stop"] < origin)
+    after = _user_totals(DATA["tx_stop"] < origin + horizon)
+    seen = before[:, SESSIONS] > 0  # user yang sudah ada saat origin
+    if seen.sum() < k:
+        return None
+    X_train, X_test = user_features(before[seen]), user_features(after[seen])
+    model, fit_seconds = _timed(_kmeans, X_train, k)
+    labels, infer = _timed(model.predict, X_test)
+    inertia = ((X_test - model.cluster_centers_[labels]) ** 2).sum()
+    refit = _kmeans(X_test, k).inertia_
+    return {
+        "metrics": {
+            "inertia_per_user": float(inertia / len(X_test)),
+            "inertia_vs_refit": float(inertia / refit) if refit > 0 else 1.0,
+            "kept_segment": float((labels == model.labels_).mean()),
+        },
+        "train_seconds": fit_seconds,
+        "infer_ms": infer * 1000,
+        "n_test": int(len(X_test)),
+    }
+
+
+def task_maintenance(candidate, fold, folds, thresholds):
+    from sklearn.ensemble import IsolationForest
+    X = DATA["conn_X"]
+    test = np.arange(len(X)) % folds == fold
+    if (~test).sum() < 10 or not test.any():
+        return None  # sama dengan train_maintenance_model: minimal 10 baris
+    model, fit_seconds = _timed(lambda: IsolationForest(contamination=0.1, random_state=42).fit(X[~test]))
+    scores, infer = _timed(model.decision_function, X[test])
+    rows = []
+    for threshold in thresholds:
+        rows.append({
+            "candidate": f"iforest@{threshold:g}",
+            "metrics": {"flagged": float((scores < threshold).mean())},
+            "train_seconds": fit_seconds,
+            "infer_ms": infer * 1000,
+            "n_test": int(test.sum()),
+        })
+    return rows
+
+
+def _run(task):
+    model, candidate, fold, fn, args = task
+    t0 = time.perf_counter()
+    result = fn(candidate, *args)
+    seconds = time.perf_counter() - t0
+    rows = result if isinstance(result, list) else [result] if result else []
+    for row in rows:
+        row.setdefault("candidate", candidate)
+        row.update(model=model, fold=fold)
+    return rows, seconds
+
+
+# ---------------------
+# Driver
+# ---------------------
+def build_tasks(args, origins):
+    tasks = []
+    for fold, origin in enumerate(origins):
+        for order in args.arima_orders:
+            tasks.append(("availability", f"arima({order})", fold, task_availability, (origin, args.horizon)))
+        for period in (24, 168):
+            tasks.append(("availability", f"seasonal_naive_{period}", fold, task_availability, (origin, args.horizon)))
+        for candidate in ("fleet", "seasonal_naive_168"):
+            tasks.append(("fleet", candidate, fold, task_fleet, (origin, args.horizon)))
+        for candidate in ("linear", "constant_kw"):
+            tasks.append(("load", candidate, fold, task_load, (origin, args.horizon)))
+        for k in args.clusters:
+            tasks.append(("users", f"kmeans k={k}", fold, task_users, (origin, args.horizon)))
+    for fold in range(args.folds):
+        tasks.append(("maintenance", "iforest", fold, task_maintenance, (fold, args.folds, args.thresholds)))
+    # task paling lambat (ARIMA) duluan supaya worker tidak menunggu di akhir
+    return sorted(tasks, key=lambda t: not t[1].startswith("arima"))
+
+
+def summarize(rows):
+    groups = {}
+    for row in rows:
+        groups.setdefault((row["model"], row["candidate"]), []).append(row)
+    summary = []
+    for (model, candidate), group in groups.items():
+        metrics = {}
+        for name in group[0]["metrics"]:
+            values = [r["metrics"][name] for r in group if r["metrics"][name] is not None]
+            metrics[name] = round(float(np.mean(values)), 4) if values else None
+        summary.append({
+            "model": model,
+            "candidate": candidate,
+            "folds": len(group),
+            "metrics": metrics,
+            "train_seconds": round(float(np.mean([r["train_seconds"] for r in group])), 4),
+            "infer_ms": round(float(np.mean([r["infer_ms"] for r in group])), 3),
+        })
+    return sorted(summary, key=lambda s: (s["model"], s["candidate"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rolling-origin backtest of the ml-service models")
+    parser.add_argument("--folds", type=int, default=8)
+    parser.add_argument("--horizon", type=int, default=24, help="hours evaluated after each origin")
+    parser.add_argument("--step", type=int, default=24, help="hours between origins")
+    parser.add_argument("--arima-orders", nargs="+", default=["1,1,1", "1,0,0", "2,1,2"], metavar="P,D,Q")
+    parser.add_argument("--clusters", nargs="+", type=int, default=[3])
+    parser.add_argument("--thresholds", nargs="+", type=float, default=[-0.5, -0.2, -0.1, 0.0])
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="worker processes, 1 = inline")
+    parser.add_argument("--synthetic", type=int, metavar="DAYS", help="use a synthetic dataset instead of the database")
+    parser.add_argument("--out", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    if args.synthetic:
+        from bench.synthetic import make_data
+        df_tx, _, df_conn = make_data(args.synthetic, n_tx=args.synthetic * 400, n_cps=100, n_users=3000)
+    else:
+        df_tx, df_conn = asyncio.run(load_db())
+    origins, data = prepare(df_tx, df_conn, args.folds, args.step, args.horizon)
+    del df_tx
+    prepare_seconds = time.perf_counter() - t0
+
+    tasks = build_tasks(args, origins)
+    t0 = time.perf_counter()
+    if args.jobs > 1:
+        with ProcessPoolExecutor(args.jobs, initializer=_init, initargs=(data,)) as pool:
+            results = list(pool.map(_run, tasks))
+    else:
+        _init(data)
+        results = [_run(task) for task in tasks]
+    wall = time.perf_counter() - t0
+    rows = [row for task_rows, _ in results for row in task_rows]
+    task_seconds = sum(seconds for _, seconds in results)
+    summary = summarize(rows)
+
+    print(f"{len(tasks)} tasks over {len(origins)} folds: {wall:.1f} s wall, {task_seconds:.1f} s of work on {args.jobs} worker(s), data {prepare_seconds:.1f} s")
+    print(f"{'model':13} {'candidate':20} {'train s':>8} {'infer ms':>9}  metrics")
+    for s in summary:
+        metrics = ", ".join(f"{k}={v}" for k, v in s["metrics"].items())
+        print(f"{s['model']:13} {s['candidate']:20} {s['train_seconds']:8.3f} {s['infer_ms']:9.3f}  {metrics}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({
+                "args": vars(args),
+                "origins": [str(data["series_start"] + pd.Timedelta(hours=o)) for o in origins],
+                "wall_seconds": round(wall, 2),
+                "task_seconds": round(task_seconds, 2),
+                "summary": summary,
+                "rows": rows,
+            }, f, indent=2, default=str)
+        print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import importlib.util
+import json
+import os
+
+import numpy as np
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse, Response
+
+# ---------------------
+# Batch inference I/O
+# ---------------------
+# Endpoint /batch menerima kolom-kolom sebagai array, bukan satu nilai per
+# request: JSON {"kolom": [...], ...} atau, untuk batch besar, Arrow IPC
+# stream (Content-Type: application/vnd.apache.arrow.stream). Semua baris
+# di-skor dengan satu panggilan model yang tervektorisasi; hasil
+# dikembalikan dalam urutan yang sama, sebagai JSON atau Arrow kalau
+# Accept meminta Arrow. pyarrow opsional (501 kalau tidak terpasang).
+# NaN/inf (mis. dari input NaN) dikirim sebagai null di JSON: JSON standar
+# tidak punya NaN, dan Arrow sudah membawanya apa adanya.
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+MAX_ROWS = int(os.getenv("BATCH_MAX_ROWS", "200000"))
+
+
+def _arrow():
+    if importlib.util.find_spec("pyarrow") is None:
+        raise HTTPException(status_code=501, detail="Arrow batches need pyarrow installed")
+    import pyarrow as pa
+    return pa
+
+
+async def read_columns(request: Request, schema):
+    """Parse the request body into ``{name: ndarray}`` for the columns in ``schema`` ({name: dtype})."""
+    body = await request.body()
+    if request.headers.get("content-type", "").split(";")[0].strip() == ARROW_STREAM:
+        pa = _arrow()
+        try:
+            table = pa.ipc.open_stream(body).read_all()
+        except pa.ArrowInvalid as e:
+            raise HTTPException(status_code=400, detail=f"Invalid Arrow stream: {e}")
+        raw = {name: table.column(name).to_numpy(zero_copy_only=False) for name in table.column_names}
+    else:
+        try:
+            raw = json.loads(body)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be a JSON object of column arrays")
+        if not isinstance(raw, dict):
+            raise HTTPException(status_code=400, detail="Body must be a JSON object of column arrays")
+
+    missing = [name for name in schema if name not in raw]
+    if missing:
+        raise HTTPException(status_code=422, detail=f"Missing columns: {', '.join(missing)}")
+    columns = {}
+    for name, dtype in schema.items():
+        try:
+            columns[name] = np.asarray(raw[name], dtype=dtype)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=422, detail=f"Column {name} must be an array of {np.dtype(dtype).name}")
+        if columns[name].ndim != 1:
+            raise HTTPException(status_code=422, detail=f"Column {name} must be a flat array")
+    lengths = {len(v) for v in columns.values()}
+    if len(lengths) > 1:
+        raise HTTPException(status_code=422, detail="All columns must have the same length")
+    rows = lengths.pop()
+    if rows == 0:
+        raise HTTPException(status_code=422, detail="Empty batch")
+    if rows > MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_ROWS} rows per batch")
+    return columns
+
+
+def _json_values(values):
+    if values.dtype.kind == "f":
+        finite = np.isfinite(values)
+        if not finite.all():
+            return np.where(finite, values.astype(object), None).tolist()
+    return values.tolist()
+
+
+def respond(request: Request, columns, headers=None):
+    """Return result columns as Arrow IPC if the client accepts it, JSON arrays otherwise."""
+    if ARROW_STREAM in request.headers.get("accept", ""):
+        pa = _arrow()
+        table = pa.table(columns)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return Response(sink.getvalue().to_pybytes(), media_type=ARROW_STREAM, headers=headers)
+    return JSONResponse({name: _json_values(values) for name, values in columns.items()}, headers=headers)
@@ -0,0 +1,78 @@
+"""Compare two bench.suite result files.
+
+    python -m bench.compare results/before.json results/after.json --threshold 20
+
+Prints wall time, peak RSS and model size change per scale and path. It
+exits with status 1 when the wall time or peak RSS of a path got worse by
+more than ``--threshold`` percent. Paths faster than ``--min-ms`` and RSS
+growth below ``--min-mb`` are ignored, since those are mostly noise.
+"""
+import argparse
+import json
+import sys
+
+
+def pct(old, new):
+    if not old or new is None:
+        return None
+    return (new - old) / old * 100
+
+
+def fmt(v):
+    return "      -" if v is None else f"{v:+6.1f}%"
+
+
+def compare(before, after, threshold, min_ms, min_mb):
+    regressions = []
+    print(f"before: {before.get('label')} ({before.get('git_rev')}, {before.get('timestamp')})")
+    print(f"after : {after.get('label')} ({after.get('git_rev')}, {after.get('timestamp')})")
+    for scale, new_scale in after["scales"].items():
+        old_scale = before["scales"].get(scale)
+        if old_scale is None:
+            print(f"{scale}: (new)")
+            continue
+        print(f"{scale}:")
+        print(f"  {'path':28} {'wall':>8} {'rss':>8} {'model':>8}")
+        for name, new in new_scale["paths"].items():
+            old = old_scale["paths"].get(name)
+            if old is None or "error" in old:
+                print(f"  {name:28} (new)")
+                continue
+            if "error" in new:
+                regressions.append(f"{scale}/{name}")
+                print(f"  {name:28} {new['error']}  <-- regression")
+                continue
+            d_wall = pct(old["wall_ms"], new["wall_ms"])
+            d_rss = pct(old["peak_rss_delta_mb"], new["peak_rss_delta_mb"])
+            d_size = pct(old.get("model_bytes"), new.get("model_bytes"))
+            flag = ""
+            if (d_wall is not None and d_wall > threshold and new["wall_ms"] >= min_ms) or (
+                d_rss is not None and d_rss > threshold and new["peak_rss_delta_mb"] - old["peak_rss_delta_mb"] >= min_mb
+            ):
+                regressions.append(f"{scale}/{name}")
+                flag = "  <-- regression"
+            print(f"  {name:28} {fmt(d_wall)} {fmt(d_rss)} {fmt(d_size)}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two ml-service benchmark suite runs")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=20, help="allowed wall time / peak RSS increase in percent")
+    parser.add_argument("--min-ms", type=float, default=1.0, help="ignore wall time changes of paths faster than this")
+    parser.add_argument("--min-mb", type=float, default=5.0, help="ignore peak RSS increases smaller than this")
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    regressions = compare(before, after, args.threshold, args.min_ms, args.min_mb)
+    if regressions:
+        print(f"regression > {args.threshold}% in: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
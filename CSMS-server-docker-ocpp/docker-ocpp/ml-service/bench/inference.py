@@ -0,0 +1,126 @@
+"""Latency of cheap ml-service endpoints while a heavy endpoint is under load.
+
+Runs two phases against a running ml-service: first the cheap endpoints
+alone (baseline), then the same cheap endpoints while ``--heavy-concurrency``
+workers keep hammering the heavy endpoint. With inference offloaded to the
+worker pool the cheap p99 should barely move; with ``INFERENCE_THREADS=0``
+(inline) it grows to the duration of one heavy request.
+
+    python -m bench.inference --url http://localhost:8001 --heavy /analytics/users \\
+        --heavy-concurrency 8 --duration 15 --out results/inference.json
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+CHEAP = ["/predict/availability?hours=24", "/optimize/load?duration=1.5", "/models"]
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * p / 100
+    lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    ms = lambda v: round(v * 1000, 2) if v is not None else None
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1] if latencies else None),
+    }
+
+
+async def _worker(client, path, stop, latencies, errors):
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        try:
+            resp = await client.get(path)
+            await resp.aread()
+        except httpx.HTTPError as e:
+            errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+            continue
+        if resp.status_code >= 400:
+            errors[str(resp.status_code)] = errors.get(str(resp.status_code), 0) + 1
+            continue
+        latencies.append(time.perf_counter() - t0)
+
+
+async def phase(client, cheap, heavy, heavy_concurrency, duration):
+    stop = asyncio.Event()
+    cheap_stats = {path: ([], {}) for path in cheap}
+    heavy_stats = ([], {})
+    tasks = [asyncio.create_task(_worker(client, path, stop, *cheap_stats[path])) for path in cheap]
+    if heavy:
+        tasks += [asyncio.create_task(_worker(client, heavy, stop, *heavy_stats)) for _ in range(heavy_concurrency)]
+    t0 = time.perf_counter()
+    await asyncio.sleep(duration)
+    stop.set()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - t0
+    result = {"cheap": {path: summarize(*cheap_stats[path], elapsed) for path in cheap}}
+    if heavy:
+        result["heavy"] = {heavy: summarize(*heavy_stats, elapsed)}
+    return result
+
+
+def _print(name, result):
+    print(f"== {name}")
+    for group in ("cheap", "heavy"):
+        for path, r in result.get(group, {}).items():
+            print(
+                f"  {group:5} {path:34} {r['requests']:6d} req  p50 {r['p50_ms']} ms  p99 {r['p99_ms']} ms"
+                f"  max {r['max_ms']} ms  errors {r['errors'] or '-'}"
+            )
+
+
+async def run(url, cheap, heavy, heavy_concurrency, duration):
+    limits = httpx.Limits(max_connections=len(cheap) + heavy_concurrency + 4)
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limits) as client:
+        await client.get(heavy)  # warmup: feature store & model sudah di-load
+        baseline = await phase(client, cheap, None, 0, duration)
+        _print("baseline (cheap only)", baseline)
+        loaded = await phase(client, cheap, heavy, heavy_concurrency, duration)
+        _print(f"with {heavy_concurrency} x {heavy}", loaded)
+        workers = (await client.get("/workers")).json()
+    return {"baseline": baseline, "under_load": loaded, "workers": workers}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cheap-endpoint latency while a heavy ml-service endpoint is busy")
+    parser.add_argument("--url", default="http://localhost:8001")
+    parser.add_argument("--heavy", default="/analytics/users")
+    parser.add_argument("--heavy-concurrency", type=int, default=8)
+    parser.add_argument("--cheap", default=",".join(CHEAP), help="comma-separated paths")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per phase")
+    parser.add_argument("--label", default="")
+    parser.add_argument("--out", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    cheap = [p.strip() for p in args.cheap.split(",") if p.strip()]
+    data = asyncio.run(run(args.url, cheap, args.heavy, args.heavy_concurrency, args.duration))
+    result = {
+        "label": args.label,
+        "url": args.url,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "duration_s": args.duration,
+        "heavy_concurrency": args.heavy_concurrency,
+        **data,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""File size and load time of pickled vs compact (.npz) models.
+
+Trains every model once on a synthetic dataset, saves it as pickle and in
+the compact format of compact.py, then times ``--repeat`` loads of each file
+and checks that both versions predict the same thing. ARIMA pickles grow with the training history, so try a few
+``--days`` values.
+
+    python -m bench.models --days 365 --transactions 200000 --out results/models.json
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import train
+from bench.synthetic import make_data
+from preprocess import prepare_anomaly_data, prepare_user_clusters
+from registry import load_file, model_file
+
+MODELS = ["availability_arima", "availability_fleet", "load_lr", "user_kmeans", "maintenance_iforest"]
+
+
+async def train_pickles(model_dir, df_tx, df_users, df_conn):
+    train.MODEL_FORMAT = "pickle"
+    with contextlib.redirect_stdout(io.StringIO()):
+        await train.train_availability_model(model_dir, df_tx)
+        await train.train_fleet_model(model_dir, df_tx, cp_ids=df_conn["cp_id"].unique().tolist())
+        await train.train_load_model(model_dir, df_tx)
+        await train.train_user_model(model_dir, df_tx, df_users)
+        await train.train_maintenance_model(model_dir, df_conn)
+
+
+def make_inputs(df_tx, df_users, df_conn):
+    # dihitung sekali: prepare_anomaly_data bergantung pada jam sekarang
+    return {
+        "load_lr": pd.DataFrame({"duration": np.linspace(0, 12, 100)}),
+        "user_kmeans": prepare_user_clusters(df_tx, df_users),
+        "maintenance_iforest": prepare_anomaly_data(df_conn),
+    }
+
+
+def predictions(name, model, inputs):
+    if name == "availability_arima":
+        return np.asarray(model.forecast(steps=168))
+    if name == "availability_fleet":
+        return model.forecast(model.end + pd.Timedelta(hours=1), 168)
+    if name in ("load_lr", "user_kmeans"):
+        return model.predict(inputs[name])
+    return model.decision_function(inputs[name])
+
+
+def load_times(path, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        load_file(path)
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pickle vs compact model files")
+    parser.add_argument("--days", type=int, default=180, help="history length")
+    parser.add_argument("--transactions", type=int, default=100_000)
+    parser.add_argument("--cps", type=int, default=200)
+    parser.add_argument("--users", type=int, default=5_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--label", default="")
+    parser.add_argument("--out", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    data = make_data(args.days, args.transactions, args.cps, args.users)
+    inputs = make_inputs(*data)
+    results = {}
+    with tempfile.TemporaryDirectory() as pkl_dir, tempfile.TemporaryDirectory() as npz_dir:
+        asyncio.run(train_pickles(pkl_dir, *data))
+        for name in MODELS:
+            if model_file(pkl_dir, name):
+                train.save_model(load_file(model_file(pkl_dir, name)), name, npz_dir, fmt="npz")
+        print(f"{'model':22} {'pickle KB':>10} {'npz KB':>9} {'pickle load ms':>15} {'npz load ms':>12} {'max diff':>10}")
+        for name in MODELS:
+            pkl, npz = model_file(pkl_dir, name), model_file(npz_dir, name)
+            if pkl is None or npz is None:
+                continue
+            diff = np.max(np.abs(
+                np.asarray(predictions(name, load_file(pkl), inputs), dtype=float)
+                - np.asarray(predictions(name, load_file(npz), inputs), dtype=float)
+            ))
+            r = results[name] = {
+                "pickle_bytes": os.path.getsize(pkl),
+                "npz_bytes": os.path.getsize(npz),
+                "pickle_load_ms": round(load_times(pkl, args.repeat) * 1000, 3),
+                "npz_load_ms": round(load_times(npz, args.repeat) * 1000, 3),
+                "max_prediction_diff": float(diff),
+            }
+            print(
+                f"{name:22} {r['pickle_bytes'] / 1024:10.1f} {r['npz_bytes'] / 1024:9.1f} "
+                f"{r['pickle_load_ms']:15.3f} {r['npz_load_ms']:12.3f} {diff:10.2g}"
+            )
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"label": args.label, "args": vars(args), "models": results}, f, indent=2)
+        print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
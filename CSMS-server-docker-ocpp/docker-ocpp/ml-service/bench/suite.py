@@ -0,0 +1,275 @@
+"""Train and inference benchmark of ml-service on synthetic fleets.
+
+For each ``--scales`` preset (bench.synthetic.SCALES) it generates a
+dataset. Every train path of train.py and every inference path behind
+api.py is then run in a forked child process. For each path the suite
+records:
+- wall time: one run for training, the median of ``--repeat`` calls for
+  inference
+- peak RSS growth of the child above its RSS at fork time
+- the size of the model file written, for training paths
+
+Inference runs against the models trained in the same run, loaded through
+ModelRegistry as in production (compact .npz unless MODEL_FORMAT says
+otherwise). Results are JSON. Compare two versions with ``bench.compare``.
+
+    python -m bench.suite --scales small medium --label "$(git rev-parse --short HEAD)" --out results/suite.json
+    python -m bench.compare results/before.json results/suite.json --threshold 20
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import psutil
+
+import train
+from bench.synthetic import SCALES, make_scale
+from registry import ModelRegistry, model_file
+
+# path training -> (fungsi train.py, nama model yang ditulis)
+TRAIN_PATHS = {
+    "train_availability": (train.train_availability_model, "availability_arima"),
+    "train_fleet": (train.train_fleet_model, "availability_fleet"),
+    "train_load": (train.train_load_model, "load_lr"),
+    "train_users": (train.train_user_model, "user_kmeans"),
+    "train_maintenance": (train.train_maintenance_model, "maintenance_iforest"),
+}
+
+
+def rss_mb():
+    return psutil.Process().memory_info().rss / 2**20
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB di Linux
+
+
+def _git_rev():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+# ---------------------
+# Paths (dijalankan di child hasil fork; data diwarisi, tidak di-pickle)
+# ---------------------
+CTX = {}
+
+
+def _train(fn, name):
+    df_tx, df_users, df_conn = CTX["data"]
+    kwargs = {
+        "train_user_model": {"df_tx": df_tx, "df_users": df_users},
+        "train_maintenance_model": {"df_conn": df_conn},
+        "train_fleet_model": {"df_tx": df_tx, "cp_ids": df_conn["cp_id"].unique().tolist()},
+    }
+    with contextlib.redirect_stdout(io.StringIO()):
+        asyncio.run(fn(CTX["model_dir"], **kwargs.get(fn.__name__, {"df_tx": df_tx})))
+    path = model_file(CTX["model_dir"], name)
+    return {"model_bytes": os.path.getsize(path) if path else None}
+
+
+def inference_paths(batch_rows):
+    """name -> (setup(models) -> state, call(state)); setup is not timed."""
+    import api
+    from anomaly import AnomalyDetector
+    from forecast import FleetForecastCache, ForecastCache
+    from health import HealthEngine, _Window
+    from preprocess import USER_FEATURES
+    from segments import UserSegments
+
+    df_tx, df_users, df_conn = CTX["data"]
+    rng = np.random.default_rng(0)
+    durations = {"duration": rng.uniform(0.1, 12, batch_rows)}
+    scenarios = {
+        "status": rng.choice(["Available", "Charging", "Faulted"], batch_rows),
+        "error_code": rng.choice(["NoError", "GroundFailure"], batch_rows),
+        "hours_since_update": rng.uniform(0, 48, batch_rows),
+    }
+    users = {name: rng.uniform(0, 24, batch_rows) for name in USER_FEATURES}
+
+    def forecast_cache(models, cls):
+        cache = cls(models)
+        def call():
+            cache.entry = None  # paksa hitung ulang, seperti saat model/jam berganti
+            cache.refresh()
+        return call
+
+    def health(models):
+        now = time.time()
+        engine = HealthEngine()
+        engine.fleet = _Window(engine.n_buckets, engine.bucket_seconds, now)
+        for row in df_conn.itertuples():
+            engine.set_connector(row.cp_id, row.connector_id, row.status, row.error_code, now)
+        recent = df_tx[df_tx["start_ts"] > pd.Timestamp.now() - pd.Timedelta(days=1)]
+        for i, (cp, ts) in enumerate(zip(recent["cp_id"].astype(str), recent["start_ts"].astype("int64") / 1e9)):
+            engine.add_transaction(i, cp, ts, now)
+        engine.primed = True
+        return engine.score
+
+    def detector(models):
+        det, n = AnomalyDetector(), len(df_conn)
+        events = [
+            {"type": "meter", "cp_id": cp, "connector_id": int(c), "power_w": float(p), "ts": 1e9 + i}
+            for i, (cp, c, p) in enumerate(zip(df_conn["cp_id"], df_conn["connector_id"], rng.normal(7000, 200, n)))
+        ]
+        return lambda: [det.handle(e) for e in events]
+
+    def segments(models):
+        seg = UserSegments(models)
+        for i, (tag, d, k, ts) in enumerate(zip(df_tx["id_tag"].astype(str), df_tx["duration"], df_tx["kwh"], df_tx["start_ts"].dt.hour)):
+            seg.add_session(i, tag, float(d), float(k), int(ts))
+        seg.primed = True
+        seg.update()
+        return seg
+
+    return {
+        "model_load": (lambda models: CTX["model_dir"], lambda d: ModelRegistry(d).refresh()),
+        "predict_availability": (lambda m: forecast_cache(m, ForecastCache), lambda call: call()),
+        "predict_availability_fleet": (lambda m: forecast_cache(m, FleetForecastCache), lambda call: call()),
+        "predict_maintenance": (lambda m: m.get("maintenance_iforest"), lambda model: api._maintenance(model, df_conn)),
+        "analytics_users": (lambda m: m.get("user_kmeans"), lambda model: api._user_clusters(model, df_tx, df_users)),
+        "optimize_load": (lambda m: m.get("load_lr"), lambda model: model.predict([[1.5]])),
+        "optimize_load_batch": (lambda m: m.get("load_lr"), lambda model: api._load_batch(model, durations)),
+        "predict_maintenance_batch": (lambda m: m.get("maintenance_iforest"), lambda model: api._maintenance_batch(model, scenarios)),
+        "analytics_users_batch": (lambda m: m.get("user_kmeans"), lambda model: api._user_clusters_batch(model, users)),
+        "health_score": (health, lambda score: score()),
+        "maintenance_events": (detector, lambda handle_all: handle_all()),
+        "user_segment": (segments, lambda seg: seg.segment(seg.tags[0])),
+        "analytics_users_online": (segments, lambda seg: seg.assign_all()),
+    }
+
+
+def _child(kind, name, repeat, batch_rows, conn):
+    try:
+        rss0 = rss_mb()
+        if kind == "train":
+            t0 = time.perf_counter()
+            extra = _train(*TRAIN_PATHS[name])
+            times = [time.perf_counter() - t0]
+        else:
+            models = ModelRegistry(CTX["model_dir"])
+            models.refresh()
+            setup, call = inference_paths(batch_rows)[name]
+            state = setup(models)
+            if state is None:
+                conn.send({"error": "model not trained"})
+                return
+            rss0 = rss_mb()  # setup (model load, state) tidak dihitung
+            call(state)  # warmup
+            times = []
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                call(state)
+                times.append(time.perf_counter() - t0)
+            extra = {}
+        conn.send({
+            "wall_ms": round(statistics.median(times) * 1000, 3),
+            "max_ms": round(max(times) * 1000, 3),
+            "calls": len(times),
+            "peak_rss_delta_mb": round(max(peak_rss_mb() - rss0, 0), 1),
+            **extra,
+        })
+    except Exception as e:
+        conn.send({"error": f"{type(e).__name__}: {e}"})
+    finally:
+        conn.close()
+
+
+def measure(kind, name, repeat, batch_rows):
+    ctx = multiprocessing.get_context("fork")
+    parent, child = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=_child, args=(kind, name, repeat, batch_rows, child))
+    proc.start()
+    child.close()
+    result = parent.recv() if parent.poll(3600) else {"error": "timeout"}
+    proc.join()
+    return {"kind": kind, **result}
+
+
+def run_scale(scale, repeat, batch_rows, paths):
+    t0 = time.perf_counter()
+    data = make_scale(scale)
+    gen_seconds = time.perf_counter() - t0
+    df_tx = data[0]
+    with tempfile.TemporaryDirectory() as model_dir:
+        CTX.update(data=data, model_dir=model_dir)
+        results = {}
+        # training dulu: model yang ditulis dipakai path inference
+        for name in TRAIN_PATHS:
+            if paths is None or name in paths:
+                results[name] = measure("train", name, 1, batch_rows)
+                _print(name, results[name])
+        for name in inference_paths(batch_rows):
+            if paths is None or name in paths:
+                results[name] = measure("infer", name, repeat, batch_rows)
+                _print(name, results[name])
+    CTX.clear()
+    return {
+        "data": {
+            "days": SCALES[scale][0],
+            "transactions": len(df_tx),
+            "charge_points": SCALES[scale][2],
+            "users": SCALES[scale][3],
+            "frame_mb": round(df_tx.memory_usage(deep=True).sum() / 2**20, 1),
+            "generate_seconds": round(gen_seconds, 2),
+        },
+        "paths": results,
+    }
+
+
+def _print(name, r):
+    if "error" in r:
+        print(f"  {name:28} {r['error']}")
+        return
+    size = f"{r['model_bytes'] / 1024:10.1f} KB" if r.get("model_bytes") else ""
+    print(f"  {name:28} {r['wall_ms']:12.3f} ms {r['peak_rss_delta_mb']:8.1f} MB{size}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ml-service train/inference benchmark on synthetic fleets")
+    parser.add_argument("--scales", nargs="+", default=["small", "medium"], choices=list(SCALES))
+    parser.add_argument("--paths", nargs="+", help="subset of paths (default: all)")
+    parser.add_argument("--repeat", type=int, default=20, help="timed calls per inference path")
+    parser.add_argument("--batch-rows", type=int, default=10_000, help="rows per batch-endpoint call")
+    parser.add_argument("--label", default="")
+    parser.add_argument("--out", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    result = {
+        "label": args.label,
+        "git_rev": _git_rev(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "model_format": train.MODEL_FORMAT,
+        "repeat": args.repeat,
+        "batch_rows": args.batch_rows,
+        "scales": {},
+    }
+    for scale in args.scales:
+        print(f"{scale}: {SCALES[scale][1]} transactions, {SCALES[scale][2]} charge points, {SCALES[scale][3]} users")
+        print(f"  {'path':28} {'wall (median)':>15} {'peak RSS +':>11}{'model':>13}")
+        result["scales"][scale] = run_scale(scale, args.repeat, args.batch_rows, set(args.paths) if args.paths else None)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
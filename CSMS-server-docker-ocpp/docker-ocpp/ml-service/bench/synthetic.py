@@ -0,0 +1,63 @@
+"""Synthetic fleets shaped like what preprocess.load_*() returns.
+
+Session starts follow a daily profile (morning and evening peaks) with
+fewer sessions on weekends. Durations are log-normal and kWh is duration
+times a per-session power of 5-11 kW. Connector rows cover two connectors
+per charge point.
+
+``SCALES`` holds the dataset sizes used by the benchmark suite.
+"""
+import numpy as np
+import pandas as pd
+
+# nama -> (hari history, transaksi, charge point, user)
+SCALES = {
+    "small": (30, 20_000, 50, 1_000),
+    "medium": (180, 200_000, 300, 10_000),
+    "large": (365, 2_000_000, 1_000, 100_000),
+}
+
+# bobot relatif per jam (00..23): puncak pagi & sore
+HOURLY_PROFILE = np.array([
+    0.2, 0.1, 0.1, 0.1, 0.2, 0.4, 0.8, 1.4, 1.8, 1.5, 1.1, 1.0,
+    1.1, 1.0, 0.9, 1.0, 1.3, 1.8, 2.0, 1.7, 1.2, 0.8, 0.5, 0.3,
+])
+WEEKEND_FACTOR = 0.7
+
+
+def start_times(rng, days, n, end):
+    """``n`` timestamps in the ``days`` days before ``end`` following the daily/weekly profile."""
+    first = end - pd.Timedelta(days=days)
+    day_weight = np.where(pd.date_range(first, periods=days, freq="D").dayofweek >= 5, WEEKEND_FACTOR, 1.0)
+    weights = (day_weight[:, None] * HOURLY_PROFILE[None, :]).ravel()
+    hours = rng.choice(days * 24, size=n, p=weights / weights.sum())
+    return first + pd.to_timedelta(hours * 3600 + rng.uniform(0, 3600, n), unit="s")
+
+
+def make_data(days, n_tx, n_cps, n_users, seed=0):
+    """Transactions/users/connectors frames shaped like preprocess.load_*()."""
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp.now().floor("D")
+    start_ts = start_times(rng, days, n_tx, end)
+    duration = np.minimum(rng.lognormal(np.log(1.2), 0.6, n_tx), 12).astype("float32")
+    df_tx = pd.DataFrame({
+        "cp_id": pd.Categorical.from_codes(rng.integers(0, n_cps, n_tx), [f"CP_{i:05d}" for i in range(n_cps)]),
+        "id_tag": pd.Categorical.from_codes(rng.integers(0, n_users, n_tx), [f"TAG-{i:06d}" for i in range(n_users)]),
+        "start_ts": start_ts,
+        "stop_ts": start_ts + pd.to_timedelta(duration, unit="h"),
+        "duration": duration,
+        "kwh": (duration * rng.uniform(5, 11, n_tx)).astype("float32"),
+    }).sort_values("start_ts", ignore_index=True)
+    df_users = pd.DataFrame({"id": np.arange(1, n_users + 1), "id_tag": [f"TAG-{i:06d}" for i in range(n_users)]})
+    df_conn = pd.DataFrame({
+        "cp_id": [f"CP_{i:05d}" for i in range(n_cps) for _ in (1, 2)],
+        "connector_id": [c for _ in range(n_cps) for c in (1, 2)],
+        "status": rng.choice(["Available", "Charging", "Faulted"], 2 * n_cps, p=[0.7, 0.25, 0.05]),
+        "error_code": rng.choice(["NoError", "GroundFailure"], 2 * n_cps, p=[0.95, 0.05]),
+        "last_update": end - pd.to_timedelta(rng.integers(0, 7200, 2 * n_cps), unit="s"),
+    })
+    return df_tx, df_users, df_conn
+
+
+def make_scale(name, seed=0):
+    return make_data(*SCALES[name], seed=seed)
@@ -0,0 +1,72 @@
+"""Peak RSS and duration of a full training run against the configured database.
+
+Trains every model into a scratch directory (``models/`` is not touched) and
+reports load/train time and the process's peak RSS, checked against
+``--budget`` (default ``TRAIN_MEMORY_BUDGET_MB``). Seed a large dataset first
+with api-service's ``bench.seed --scale large``.
+
+    DB_HOST=127.0.0.1 python -m bench.training --budget 1024 --out results/training.json
+"""
+import argparse
+import asyncio
+import json
+import resource
+import tempfile
+import time
+
+import preprocess
+from train import train_all
+
+
+def peak_rss_mb():
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)  # KB di Linux
+
+
+async def run(model_dir):
+    t0 = time.perf_counter()
+    df_tx = await preprocess.load_transactions()
+    load_seconds = time.perf_counter() - t0
+    frame_mb = df_tx.memory_usage(deep=True).sum() / 2**20
+    after_load = peak_rss_mb()
+    t0 = time.perf_counter()
+    await train_all(model_dir, df_tx)
+    train_seconds = time.perf_counter() - t0
+    await preprocess.close_pool()
+    return {
+        "transactions": len(df_tx),
+        "frame_mb": round(frame_mb, 1),
+        "load_seconds": round(load_seconds, 2),
+        "train_seconds": round(train_seconds, 2),
+        "peak_rss_after_load_mb": after_load,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak RSS of ml-service training")
+    parser.add_argument("--budget", type=float, default=preprocess.MEMORY_BUDGET_MB, help="MB, 0 = no check")
+    parser.add_argument("--chunk", type=int, default=preprocess.LOAD_CHUNK, help="rows per server-side fetch")
+    parser.add_argument("--label", default="")
+    parser.add_argument("--out", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    preprocess.LOAD_CHUNK = args.chunk
+    with tempfile.TemporaryDirectory() as model_dir:
+        result = asyncio.run(run(model_dir))
+    result.update(label=args.label, chunk_rows=args.chunk, budget_mb=args.budget or None)
+    result["within_budget"] = args.budget <= 0 or result["peak_rss_mb"] <= args.budget
+    print(
+        f"{result['transactions']} transactions: frame {result['frame_mb']} MB, load {result['load_seconds']} s, "
+        f"train {result['train_seconds']} s, peak RSS {result['peak_rss_mb']} MB"
+        + (f" (budget {args.budget:.0f} MB: {'ok' if result['within_budget'] else 'EXCEEDED'})" if args.budget > 0 else "")
+    )
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Results written to {args.out}")
+    if not result["within_budget"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+
+from fleet import FleetForecaster
+
+# ---------------------
+# Compact model format
+# ---------------------
+# Pickle ARIMAResults menyimpan seluruh data training, covariance, dsb,
+# sehingga ukuran dan waktu load ikut tumbuh dengan history. Format .npz
+# ini hanya menyimpan array yang dibutuhkan untuk inference, plus manifest
+# JSON (kind, versi format, metadata) di dalam file yang sama, jadi satu
+# os.replace() tetap cukup untuk publish atomik. Load tidak memakai pickle
+# dan tidak meng-import sklearn/statsmodels.
+#
+# - arima    : matriks state-space (Z, T, c, d) + state prediksi terakhir;
+#              forecast = rekursi a <- c + T a, y = d + Z a (sama persis
+#              dengan statsmodels). params/order disimpan untuk apply().
+# - linear   : coef + intercept
+# - kmeans   : cluster centers
+# - iforest  : semua pohon digabung jadi array node datar; skor dihitung
+#              dengan menelusuri semua pohon sekaligus secara vektor
+# - fleet    : FleetForecaster (sudah berupa array)
+
+FORMAT_VERSION = 1
+
+
+def _average_path_length(n):
+    # sama dengan sklearn.ensemble._iforest._average_path_length
+    n = np.asarray(n, dtype=np.float64)
+    out = np.zeros_like(n)
+    out[n == 2] = 1.0
+    big = n > 2
+    out[big] = 2.0 * (np.log(n[big] - 1.0) + np.euler_gamma) - 2.0 * (n[big] - 1.0) / n[big]
+    return out
+
+
+class _Compact:
+    kind = None
+
+    @classmethod
+    def from_arrays(cls, arrays, meta):
+        return cls(**arrays, meta=meta)
+
+
+class CompactARIMA(_Compact):
+    kind = "arima"
+
+    def __init__(self, design, transition, state_intercept, obs_intercept, state, params, meta):
+        self.design = design
+        self.transition = transition
+        self.state_intercept = state_intercept
+        self.obs_intercept = obs_intercept
+        self.state = state
+        self.params = params
+        self.meta = meta
+        self.train_end = datetime.fromisoformat(meta["train_end"]) if meta.get("train_end") else None
+
+    @classmethod
+    def from_model(cls, res):
+        ssm = res.filter_results
+        index = getattr(res.model, "_index", None)
+        meta = {
+            "order": list(res.model.order),
+            "seasonal_order": list(res.model.seasonal_order),
+            "trend": res.model.trend,
+            "freq": getattr(index, "freqstr", None),
+            "train_end": index[-1].isoformat() if index is not None and hasattr(index[-1], "isoformat") else None,
+            "nobs": int(res.nobs),
+        }
+        return cls(
+            design=ssm.design[..., -1].copy(),
+            transition=ssm.transition[..., -1].copy(),
+            state_intercept=ssm.state_intercept[..., -1].copy(),
+            obs_intercept=ssm.obs_intercept[..., -1].copy(),
+            state=ssm.predicted_state[:, -1].copy(),
+            params=np.asarray(res.params, dtype=np.float64),
+            meta=meta,
+        )
+
+    def arrays(self):
+        return {
+            "design": self.design,
+            "transition": self.transition,
+            "state_intercept": self.state_intercept,
+            "obs_intercept": self.obs_intercept,
+            "state": self.state,
+            "params": self.params,
+        }
+
+    def forecast(self, steps=1):
+        a = self.state
+        out = np.empty(steps)
+        for h in range(steps):
+            out[h] = (self.obs_intercept + self.design @ a)[0]
+            a = self.state_intercept + self.transition @ a
+        return out
+
+    def apply(self, endog):
+        """Filter a new series with the stored parameters (needs statsmodels, used for validation)."""
+        from statsmodels.tsa.arima.model import ARIMA
+        model = ARIMA(
+            endog,
+            order=tuple(self.meta["order"]),
+            seasonal_order=tuple(self.meta["seasonal_order"]),
+            trend=self.meta["trend"],
+        )
+        return model.filter(self.params)
+
+
+class CompactLinear(_Compact):
+    kind = "linear"
+
+    def __init__(self, coef, intercept, meta=None):
+        self.coef = coef
+        self.intercept = intercept
+        self.meta = meta or {}
+
+    @classmethod
+    def from_model(cls, model):
+        return cls(np.asarray(model.coef_, dtype=np.float64), np.atleast_1d(np.asarray(model.intercept_, dtype=np.float64)))
+
+    def arrays(self):
+        return {"coef": self.coef, "intercept": self.intercept}
+
+    def predict(self, X):
+        return np.asarray(X, dtype=np.float64) @ self.coef + self.intercept[0]
+
+
+class CompactKMeans(_Compact):
+    kind = "kmeans"
+
+    def __init__(self, centers, meta=None):
+        self.centers = centers
+        self.meta = meta or {}
+
+    @classmethod
+    def from_model(cls, model):
+        return cls(np.asarray(model.cluster_centers_, dtype=np.float64), {"features": list(getattr(model, "feature_names_in_", []))})
+
+    def arrays(self):
+        return {"centers": self.centers}
+
+    def _distances(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        return ((X[:, None, :] - self.centers[None, :, :]) ** 2).sum(axis=2)
+
+    def predict(self, X):
+        return self._distances(X).argmin(axis=1)
+
+    def score(self, X):
+        # sama dengan KMeans.score: minus inertia
+        return -float(self._distances(X).min(axis=1).sum())
+
+
+class CompactIsolationForest(_Compact):
+    kind = "iforest"
+
+    def __init__(self, roots, left, right, feature, threshold, leaf_value, offset, meta=None):
+        self.roots = roots
+        self.left = left
+        self.right = right
+        self.feature = feature
+        self.threshold = threshold
+        self.leaf_value = leaf_value
+        self.offset = offset
+        self.meta = meta or {}
+
+    @classmethod
+    def from_model(cls, model):
+        roots, left, right, feature, threshold, leaf_value = [], [], [], [], [], []
+        # tanpa subsampling fitur, sklearn memakai X apa adanya (bukan X[:, features])
+        subsample = model._max_features != model.n_features_in_
+        base = 0
+        for tree, features in zip(model.estimators_, model.estimators_features_):
+            t = tree.tree_
+            n = t.node_count
+            depth = np.zeros(n, dtype=np.int64)
+            for node in range(n):  # anak selalu bernomor lebih besar dari parent
+                for child in (t.children_left[node], t.children_right[node]):
+                    if child >= 0:
+                        depth[child] = depth[node] + 1
+            is_leaf = t.children_left < 0
+            roots.append(base)
+            left.append(np.where(is_leaf, -1, t.children_left + base))
+            right.append(np.where(is_leaf, -1, t.children_right + base))
+            feat = np.maximum(t.feature, 0)
+            if subsample:
+                feat = np.asarray(features)[feat]  # indeks fitur global
+            feature.append(np.where(is_leaf, 0, feat))
+            threshold.append(t.threshold)
+            leaf_value.append(np.where(is_leaf, depth + _average_path_length(t.n_node_samples), 0.0))
+            base += n
+        return cls(
+            roots=np.asarray(roots, dtype=np.int32),
+            left=np.concatenate(left).astype(np.int32),
+            right=np.concatenate(right).astype(np.int32),
+            feature=np.concatenate(feature).astype(np.int32),
+            threshold=np.concatenate(threshold).astype(np.float64),
+            leaf_value=np.concatenate(leaf_value).astype(np.float64),
+            offset=np.array([model.offset_, _average_path_length([model._max_samples])[0]], dtype=np.float64),  # [offset_, c(max_samples)]
+            meta={"n_estimators": len(model.estimators_)},
+        )
+
+    def arrays(self):
+        return {
+            "roots": self.roots,
+            "left": self.left,
+            "right": self.right,
+            "feature": self.feature,
+            "threshold": self.threshold,
+            "leaf_value": self.leaf_value,
+            "offset": self.offset,
+        }
+
+    def score_samples(self, X):
+        X = np.asarray(X, dtype=np.float32)  # pohon sklearn membandingkan dalam float32
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots))).copy()
+        while True:
+            left = self.left[node]
+            inner = left >= 0
+            if not inner.any():
+                break
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(inner, np.where(go_left, left, self.right[node]), node)
+        depths = self.leaf_value[node].sum(axis=1)
+        return -(2 ** (-depths / (len(self.roots) * self.offset[1])))
+
+    def decision_function(self, X):
+        return self.score_samples(X) - self.offset[0]
+
+
+KINDS = {cls.kind: cls for cls in (CompactARIMA, CompactLinear, CompactKMeans, CompactIsolationForest, FleetForecaster)}
+
+
+def to_compact(model):
+    """Compact counterpart of a trained model, or None if the type is not supported."""
+    if type(model) in KINDS.values():
+        return model
+    # import lazy: hanya sisi training yang butuh sklearn/statsmodels
+    from sklearn.cluster import KMeans
+    from sklearn.ensemble import IsolationForest
+    from sklearn.linear_model import LinearRegression
+    from statsmodels.tsa.arima.model import ARIMAResults
+
+    if isinstance(getattr(model, "_results", model), ARIMAResults):
+        return CompactARIMA.from_model(model)
+    if isinstance(model, LinearRegression) and np.ndim(model.coef_) == 1:
+        return CompactLinear.from_model(model)
+    if isinstance(model, KMeans):
+        return CompactKMeans.from_model(model)
+    if isinstance(model, IsolationForest):
+        return CompactIsolationForest.from_model(model)
+    return None
+
+
+def save(model, path):
+    """Write ``model`` (trained or already compact) to ``path`` as .npz. Returns False if unsupported."""
+    compact = to_compact(model)
+    if compact is None:
+        return False
+    arrays = compact.arrays()
+    manifest = {"format": FORMAT_VERSION, "kind": compact.kind, "meta": compact.meta, "arrays": sorted(arrays)}
+    with open(path, "wb") as f:  # file object: np.savez tidak menambah .npz ke nama file .tmp
+        np.savez(f, manifest=np.array(json.dumps(manifest)), **arrays)
+    return True
+
+
+def load(path):
+    """Rebuild a model saved with save(); no pickle involved."""
+    with np.load(path, allow_pickle=False) as data:
+        manifest = json.loads(str(data["manifest"]))
+        if manifest["format"] > FORMAT_VERSION:
+            raise ValueError(f"{os.path.basename(path)}: format {manifest['format']} is newer than {FORMAT_VERSION}")
+        arrays = {name: data[name] for name in manifest["arrays"]}
+    return KINDS[manifest["kind"]].from_arrays(arrays, manifest["meta"])
@@ -0,0 +1,140 @@
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+# ---------------------
+# Per-CP demand forecasting
+# ---------------------
+# Satu model ringan per charge point, di-fit sekaligus untuk seluruh fleet
+# dengan operasi matriks NumPy (tanpa loop Python per CP):
+# - X: matriks jam, satu baris per CP, satu kolom per jam (jumlah sesi
+#   yang dimulai), FLEET_HISTORY_WEEKS minggu terakhir
+# - profil mingguan: rata-rata per jam-dalam-minggu (168 slot), minggu
+#   terbaru diberi bobot lebih besar (FLEET_DECAY per minggu)
+# - AR(1) pada residual (X - profil), phi dihitung per baris
+# forecast(t) = profil[jam_minggu(t)] + phi^k * residual_terakhir, k = jam
+# sejak akhir data training.
+
+WEEK = 168
+HOUR = np.timedelta64(1, "h")
+HISTORY_WEEKS = int(os.getenv("FLEET_HISTORY_WEEKS", "8"))
+DECAY = float(os.getenv("FLEET_DECAY", "0.8"))
+
+
+def _hour_of_week(hour):
+    # senin 00:00 = 0
+    hour = pd.Timestamp(hour)
+    return hour.dayofweek * 24 + hour.hour
+
+
+def hourly_matrix(df_tx, weeks=HISTORY_WEEKS, cp_ids=None):
+    """Session starts per CP per hour over the last ``weeks`` weeks.
+
+    Returns ``(cp_ids, start, X)`` where ``X[i, j]`` is the number of sessions
+    started at ``cp_ids[i]`` in hour ``start + j``. With ``cp_ids`` given the
+    rows follow that order (CPs without transactions stay zero).
+    """
+    if df_tx.empty:
+        return list(cp_ids or []), None, np.zeros((len(cp_ids or []), 0), dtype=np.float32)
+    hours = df_tx["start_ts"].to_numpy().astype("datetime64[h]")
+    end = hours.max()
+    start = max(hours.min(), end - (weeks * WEEK - 1) * HOUR)
+    n_hours = int((end - start) / HOUR) + 1
+    mask = hours >= start
+    cps = df_tx["cp_id"][mask]  # boleh object atau category (load_transactions)
+    if cp_ids is None:
+        codes, uniques = pd.factorize(cps, sort=True)
+        cp_ids = [str(cp) for cp in uniques]
+    else:
+        codes = pd.Categorical(cps, categories=list(cp_ids)).codes
+    cols = ((hours[mask] - start) / HOUR).astype(np.int64)
+    known = codes >= 0
+    flat = codes[known].astype(np.int64) * n_hours + cols[known]
+    X = np.bincount(flat, minlength=len(cp_ids) * n_hours).reshape(len(cp_ids), n_hours)
+    return list(cp_ids), pd.Timestamp(start).to_pydatetime(), X.astype(np.float32)
+
+
+class FleetForecaster:
+    """Weekly profile + AR(1) residual model for every charge point."""
+
+    kind = "fleet"  # untuk compact.py
+
+    def __init__(self, cp_ids, profile, phi, last_residual, end):
+        self.cp_ids = list(cp_ids)
+        self.index = {cp: i for i, cp in enumerate(self.cp_ids)}
+        self.profile = profile  # (n_cp, 168)
+        self.phi = phi  # (n_cp,)
+        self.last_residual = last_residual  # (n_cp,)
+        self.end = end  # jam terakhir data training
+
+    @property
+    def meta(self):
+        return {"end": self.end.isoformat()}
+
+    def arrays(self):
+        return {
+            "cp_ids": np.asarray(self.cp_ids, dtype=str),
+            "profile": self.profile,
+            "phi": self.phi,
+            "last_residual": self.last_residual,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, meta):
+        return cls(arrays["cp_ids"].tolist(), arrays["profile"], arrays["phi"], arrays["last_residual"],
+                   datetime.fromisoformat(meta["end"]))
+
+    @classmethod
+    def fit(cls, cp_ids, X, start, decay=DECAY):
+        n_cp, n_hours = X.shape
+        how = (_hour_of_week(start) + np.arange(n_hours)) % WEEK
+        onehot = np.zeros((n_hours, WEEK), dtype=np.float32)
+        onehot[np.arange(n_hours), how] = 1
+        weights = (decay ** ((n_hours - 1 - np.arange(n_hours)) // WEEK)).astype(np.float32)
+        # rata-rata berbobot per jam-dalam-minggu: dua perkalian matriks untuk semua CP
+        total = (X * weights) @ onehot
+        norm = weights @ onehot
+        seen = norm > 0
+        profile = np.empty((n_cp, WEEK), dtype=np.float32)
+        profile[:, seen] = total[:, seen] / norm[seen]
+        # slot yang belum pernah terlihat (history < 1 minggu): rata-rata baris
+        profile[:, ~seen] = X.mean(axis=1, keepdims=True)
+        resid = X - profile[:, how]
+        prev, cur = resid[:, :-1], resid[:, 1:]
+        denom = (prev * prev).sum(axis=1)
+        phi = np.divide((prev * cur).sum(axis=1), denom, out=np.zeros(n_cp, dtype=np.float32), where=denom > 0)
+        phi = np.clip(phi, 0, 0.99)
+        end = start + timedelta(hours=n_hours - 1)
+        return cls(cp_ids, profile=profile, phi=phi, last_residual=resid[:, -1], end=end)
+
+    def forecast(self, start, steps):
+        """(n_cp, steps) expected session starts from hour ``start`` onwards (never negative)."""
+        lag = max(int((start - self.end) / timedelta(hours=1)), 1)
+        k = np.arange(lag, lag + steps)
+        how = (_hour_of_week(self.end) + k) % WEEK
+        values = self.profile[:, how] + self.last_residual[:, None] * self.phi[:, None] ** k
+        return np.maximum(values, 0)
+
+    def one_step(self, X, start):
+        """In-sample one-hour-ahead predictions for a matrix with this model's rows."""
+        how = (_hour_of_week(start) + np.arange(X.shape[1])) % WEEK
+        seasonal = self.profile[:, how]
+        pred = seasonal.copy()
+        pred[:, 1:] += self.phi[:, None] * (X[:, :-1] - seasonal[:, :-1])
+        return np.maximum(pred, 0)
+
+
+def fit_fleet(df_tx, weeks=HISTORY_WEEKS, cp_ids=None):
+    """Build the hourly matrix from transactions and fit a FleetForecaster (None if no data).
+
+    ``cp_ids`` (all registered charge points) adds a row for stations without
+    sessions in the window, so every station gets a (zero) forecast.
+    """
+    if cp_ids is not None and not df_tx.empty:
+        cp_ids = sorted(set(cp_ids).union(str(cp) for cp in pd.unique(df_tx["cp_id"])))
+    cp_ids, start, X = hourly_matrix(df_tx, weeks, cp_ids=cp_ids)
+    if not cp_ids or start is None:
+        return None, X
+    return FleetForecaster.fit(cp_ids, X, start), X
@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+logger = logging.getLogger("ml-service.forecast")
+
+# ---------------------
+# Forecast cache
+# ---------------------
+# Forecast ARIMA hanya berubah kalau model berganti atau jam berganti, jadi
+# dihitung sekali untuk horizon terpanjang (FORECAST_HORIZON jam) dan
+# request cukup mengambil slice dari memori. Dihitung ulang:
+# - saat registry menukar model (callback dari thread registry)
+# - tiap pergantian jam (task background)
+# Forecast dimulai dari jam sekarang, bukan dari akhir data training: jam
+# yang sudah lewat sejak training di-skip.
+
+HORIZON = int(os.getenv("FORECAST_HORIZON", "168"))  # jam, mencakup 24/48/168
+MAX_LAG_HOURS = 24 * 366  # batas jam yang di-skip kalau model sudah lama
+
+
+def current_hour():
+    return datetime.now().replace(minute=0, second=0, microsecond=0)
+
+
+def _train_end(model):
+    if getattr(model, "train_end", None) is not None:  # compact.CompactARIMA
+        return model.train_end
+    index = getattr(getattr(model, "model", None), "_index", None)
+    if isinstance(index, pd.DatetimeIndex) and len(index):
+        return index[-1].to_pydatetime()
+    return None
+
+
+class ForecastCache:
+    def __init__(self, registry, model_name="availability_arima", horizon=HORIZON):
+        self.registry = registry
+        self.model_name = model_name
+        self.horizon = horizon
+        self.entry = None  # dict(model, version, hour, start, values, computed_at, compute_seconds)
+        self._lock = threading.Lock()
+        self._task = None
+        registry.listeners.append(self._on_model_loaded)
+
+    def _version(self):
+        info = self.registry.models.get(self.model_name)
+        return (info["version"], info["stamp"]) if info else None
+
+    def _compute(self, model, steps, hour):
+        # jam pertama forecast = jam berikutnya setelah "sekarang"
+        end = _train_end(model)
+        skip = 0
+        if end is not None:
+            skip = min(max(int((hour - end) / timedelta(hours=1)), 0), MAX_LAG_HOURS)
+        values = model.forecast(steps=skip + steps)
+        return [float(v) for v in list(values)[skip:]], hour + timedelta(hours=1)
+
+    def refresh(self):
+        model = self.registry.get(self.model_name)
+        if model is None:
+            self.entry = None
+            return None
+        with self._lock:
+            hour, version = current_hour(), self._version()
+            if self.entry and self.entry["version"] == version and self.entry["hour"] == hour:
+                return self.entry
+            t0 = time.perf_counter()
+            values, start = self._compute(model, self.horizon, hour)
+            self.entry = {
+                "model": model,
+                "version": version,
+                "hour": hour,
+                "start": start,
+                "values": values,
+                "computed_at": time.time(),
+                "compute_seconds": round(time.perf_counter() - t0, 4),
+            }
+            return self.entry
+
+    def _on_model_loaded(self, name):
+        if name == self.model_name:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning("forecast gagal dihitung ulang: %s", e)
+
+    def _current(self):
+        entry = self.entry
+        if not entry or entry["hour"] != current_hour() or entry["version"] != self._version():
+            entry = self.refresh()  # jarang: jam baru sebelum task background jalan
+        return entry
+
+    def get(self, hours):
+        """Return (start, values) for the next ``hours`` hours, or None if no model."""
+        entry = self._current()
+        if entry is None:
+            return None
+        if hours <= self.horizon:
+            return entry["start"], entry["values"][:hours]
+        # di luar horizon cache: hitung langsung, tidak disimpan
+        values, start = self._compute(entry["model"], hours, entry["hour"])
+        return start, values
+
+    def info(self):
+        entry = self.entry
+        if not entry:
+            return {"model": self.model_name, "cached": False}
+        return {
+            "model": self.model_name,
+            "cached": True,
+            "version": entry["version"][0],
+            "start": entry["start"].isoformat(),
+            "horizon": self.horizon,
+            "computed_at": entry["computed_at"],
+            "compute_seconds": entry["compute_seconds"],
+        }
+
+    async def start(self):
+        await asyncio.to_thread(self.refresh)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            next_hour = current_hour() + timedelta(hours=1)
+            await asyncio.sleep(max((next_hour - datetime.now()).total_seconds(), 0) + 1)
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                logger.warning("forecast gagal dihitung ulang: %s", e)
+
+
+class FleetForecastCache(ForecastCache):
+    """Per-CP forecasts of the fleet model; ``values`` is an (n_cp, horizon) matrix."""
+
+    def __init__(self, registry, model_name="availability_fleet", horizon=HORIZON):
+        super().__init__(registry, model_name, horizon)
+
+    def _compute(self, model, steps, hour):
+        start = hour + timedelta(hours=1)
+        return model.forecast(start, steps), start
+
+    def get(self, hours, cp_id=None):
+        """Return (start, {cp_id: values}) or, with ``cp_id``, (start, values).
+
+        None if no model; values is None for a CP the model has not seen.
+        """
+        entry = self._current()
+        if entry is None:
+            return None
+        model = entry["model"]
+        if cp_id is not None and cp_id not in model.index:
+            return entry["start"], None
+        if hours <= self.horizon:
+            matrix = entry["values"][:, :hours]
+        else:
+            matrix, _ = self._compute(model, hours, entry["hour"])
+        if cp_id is not None:
+            return entry["start"], matrix[model.index[cp_id]].round(3).tolist()
+        return entry["start"], dict(zip(model.cp_ids, matrix.round(3).tolist()))
+
+    def info(self):
+        info = super().info()
+        if self.entry:
+            info["charge_points"] = len(self.entry["model"].cp_ids)
+        return info
@@ -0,0 +1,292 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+
+import aiomysql
+import numpy as np
+
+from preprocess import get_pool
+
+logger = logging.getLogger("ml-service.health")
+
+# ---------------------
+# Rolling health score
+# ---------------------
+# Counter per scope (fleet, per site, per CP) di-update dari event, bukan
+# dari load tabel penuh per request:
+# - StatusNotification : jumlah connector Available / error per scope;
+#                        connector-detik di-integrasikan ke bucket waktu
+#                        setiap kali ada transisi (O(1) per event)
+# - StartTransaction   : +1 di bucket waktu mulai
+# Window = HEALTH_WINDOW_HOURS jam dalam bucket HEALTH_BUCKET_MINUTES
+# menit (ring buffer), jadi availability/error adalah rata-rata berbobot
+# waktu selama window, bukan snapshot sesaat. Skor tiap bucket fleet/site
+# disimpan sebagai history.
+# Event datang dari ocpp-server (POST /events). Supaya tetap benar kalau
+# event hilang (ml-service restart, ocpp-server tanpa ML_EVENTS_URL),
+# state connector dan transaksi baru dicocokkan ulang dengan DB tiap
+# HEALTH_RESYNC_INTERVAL detik; transaksi di-dedupe per id.
+# Resync punya watermark id sendiri yang hanya digeser oleh resync, bukan
+# oleh event: event yang hilang (batch gagal di forwarder, queue penuh)
+# dengan id lebih kecil dari event yang sampai tetap terbaca di resync
+# berikutnya. Resync membaca ulang _TX_OVERLAP id terakhir, karena
+# transaksi dengan id lebih kecil bisa commit belakangan.
+
+WINDOW_HOURS = float(os.getenv("HEALTH_WINDOW_HOURS", "24"))
+BUCKET_MINUTES = float(os.getenv("HEALTH_BUCKET_MINUTES", "15"))
+RESYNC_INTERVAL = float(os.getenv("HEALTH_RESYNC_INTERVAL", "60"))
+TX_TARGET = 10  # transaksi per window untuk skor penuh (sama dengan rumus lama)
+DEFAULT_SITE = "default"
+_TX_MEMORY = 10000  # jumlah id transaksi yang diingat untuk dedupe
+_TX_OVERLAP = 100  # id di bawah watermark yang dibaca ulang tiap resync (< _TX_MEMORY)
+
+AVAILABLE, ERROR, TOTAL, TX = range(4)  # baris array bucket
+
+
+def health_score(availability, errors, recent_tx):
+    return round(float(availability * 0.5 + (1 - errors) * 0.3 + min(recent_tx / TX_TARGET, 1) * 0.2) * 100, 2)
+
+
+class _Window:
+    """Time-bucketed counters of one scope."""
+
+    __slots__ = ("buckets", "bucket_seconds", "current", "since", "connectors", "available", "errors")
+
+    def __init__(self, n_buckets, bucket_seconds, now):
+        # +1: bucket yang sedang berjalan baru terisi sebagian, jadi window
+        # selalu mencakup n_buckets bucket penuh
+        self.buckets = np.zeros((4, n_buckets + 1))
+        self.bucket_seconds = bucket_seconds
+        self.current = int(now // bucket_seconds)
+        self.since = now
+        self.connectors = 0
+        self.available = 0
+        self.errors = 0
+
+    def _roll(self, bucket):
+        # bucket yang dilewati dikosongkan (paling banyak satu putaran ring)
+        n = self.buckets.shape[1]
+        for b in range(max(self.current + 1, bucket - n + 1), bucket + 1):
+            self.buckets[:, b % n] = 0
+        self.current = max(self.current, bucket)
+
+    def advance(self, now):
+        """Integrate the current connector counts up to ``now``."""
+        window = (self.buckets.shape[1] - 1) * self.bucket_seconds
+        if now - self.since > window:
+            self.since = now - window
+        while self.since < now:
+            bucket = int(self.since // self.bucket_seconds)
+            if bucket > self.current:
+                self._roll(bucket)
+            end = min(now, (bucket + 1) * self.bucket_seconds)
+            dt = end - self.since
+            column = self.buckets[:, bucket % self.buckets.shape[1]]
+            column[AVAILABLE] += self.available * dt
+            column[ERROR] += self.errors * dt
+            column[TOTAL] += self.connectors * dt
+            self.since = end
+        bucket = int(now // self.bucket_seconds)
+        if bucket > self.current:
+            self._roll(bucket)
+
+    def add_transaction(self, ts, now):
+        bucket = min(int(ts // self.bucket_seconds), self.current)  # jam ocpp-server bisa sedikit di depan
+        n = self.buckets.shape[1]
+        if self.current - n < bucket <= self.current:
+            self.buckets[TX, bucket % n] += 1
+
+    def summary(self):
+        available, errors, total, tx = self.buckets.sum(axis=1)
+        if total > 0:
+            availability, error_rate = available / total, errors / total
+        elif self.connectors:
+            # belum ada waktu yang terakumulasi: pakai keadaan sekarang
+            availability, error_rate = self.available / self.connectors, self.errors / self.connectors
+        else:
+            return None
+        return {
+            "score": health_score(availability, error_rate, tx),
+            "availability": round(float(availability), 4),
+            "errors": round(float(error_rate), 4),
+            "recent_transactions": int(tx),
+            "connectors": self.connectors,
+        }
+
+
+class HealthEngine:
+    def __init__(self, window_hours=WINDOW_HOURS, bucket_minutes=BUCKET_MINUTES, resync_interval=RESYNC_INTERVAL):
+        self.bucket_seconds = bucket_minutes * 60
+        self.n_buckets = max(int(round(window_hours * 60 / bucket_minutes)), 1)
+        self.window_hours = window_hours
+        self.resync_interval = resync_interval
+        self.fleet = None
+        self.sites = {}
+        self.cps = {}
+        self.site_of = {}  # cp_id -> site_id
+        self.states = {}  # (cp_id, connector_id) -> (available, error)
+        self.history = deque(maxlen=self.n_buckets)
+        self.events = 0
+        self.primed = False
+        self._tx_seen = OrderedDict()
+        self._tx_watermark = 0  # id transaksi terakhir yang dibaca resync dari DB
+        self._task = None
+
+    # --- scope ---
+    def _scopes(self, cp_id, now):
+        # site dipatok saat CP pertama kali terlihat, supaya counter yang
+        # sudah masuk ke site itu tetap konsisten
+        site = self.site_of.setdefault(cp_id, DEFAULT_SITE)
+        if site not in self.sites:
+            self.sites[site] = _Window(self.n_buckets, self.bucket_seconds, now)
+        if cp_id not in self.cps:
+            self.cps[cp_id] = _Window(self.n_buckets, self.bucket_seconds, now)
+        scopes = (self.fleet, self.sites[site], self.cps[cp_id])
+        for w in scopes:
+            w.advance(now)
+        return scopes
+
+    # --- update ---
+    def set_connector(self, cp_id, connector_id, status, error_code, now=None):
+        now = time.time() if now is None else now
+        key = (cp_id, connector_id)
+        new = (status == "Available", error_code not in (None, "NoError"))
+        old = self.states.get(key)
+        if old == new:
+            return
+        self.states[key] = new
+        for w in self._scopes(cp_id, now):
+            if old is None:
+                w.connectors += 1
+            else:
+                w.available -= old[0]
+                w.errors -= old[1]
+            w.available += new[0]
+            w.errors += new[1]
+
+    def add_transaction(self, tx_id, cp_id, ts, now=None):
+        now = time.time() if now is None else now
+        if tx_id is not None:
+            if tx_id in self._tx_seen:
+                return
+            self._tx_seen[tx_id] = True
+            while len(self._tx_seen) > _TX_MEMORY:
+                self._tx_seen.popitem(last=False)
+        for w in self._scopes(cp_id, now):
+            w.add_transaction(ts, now)
+
+    def handle(self, event):
+        """Apply one event from ocpp-server (see POST /events)."""
+        if not self.primed:
+            return  # bootstrap dari DB menyusul dan sudah mencakup event ini
+        kind = event.get("type")
+        if kind == "status":
+            self.set_connector(event["cp_id"], event["connector_id"], event["status"], event.get("error_code"))
+            self.events += 1
+        elif kind == "start":
+            self.add_transaction(event.get("transaction_id"), event["cp_id"], event.get("ts", time.time()))
+            self.events += 1
+
+    # --- read ---
+    def _read(self, window):
+        if window is None:
+            return None
+        window.advance(time.time())
+        return window.summary()
+
+    def score(self, cp_id=None, site_id=None):
+        if cp_id is not None:
+            return self._read(self.cps.get(cp_id))
+        if site_id is not None:
+            return self._read(self.sites.get(site_id))
+        return self._read(self.fleet)
+
+    def all_sites(self):
+        return {site: self._read(w) for site, w in sorted(self.sites.items())}
+
+    def all_cps(self):
+        return {cp: self._read(w) for cp, w in sorted(self.cps.items())}
+
+    def info(self):
+        return {
+            "primed": self.primed,
+            "window_hours": self.window_hours,
+            "bucket_minutes": self.bucket_seconds / 60,
+            "connectors": len(self.states),
+            "sites": len(self.sites),
+            "charge_points": len(self.cps),
+            "events": self.events,
+        }
+
+    def _record(self):
+        fleet = self._read(self.fleet)
+        self.history.append({
+            "ts": time.time(),
+            "fleet": fleet["score"] if fleet else None,
+            "sites": {site: s["score"] for site, s in self.all_sites().items() if s},
+        })
+
+    # --- DB ---
+    async def _load_sites(self, cur):
+        try:
+            await cur.execute("SELECT id, COALESCE(site_id, %s) AS site_id FROM charge_points", (DEFAULT_SITE,))
+        except aiomysql.Error:
+            return  # kolom site_id dibuat oleh api-service; belum ada = semua di 'default'
+        for row in await cur.fetchall():
+            self.site_of.setdefault(row["id"], row["site_id"])
+
+    async def resync(self):
+        """Reconcile connector states and count transactions the events missed."""
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cur:
+                await self._load_sites(cur)
+                if not self.primed:
+                    await cur.execute(
+                        "SELECT COALESCE(MAX(id), 0) AS id FROM transactions WHERE start_ts < NOW() - INTERVAL %s SECOND",
+                        (int(self.n_buckets * self.bucket_seconds),),
+                    )
+                    self._tx_watermark = (await cur.fetchone())["id"]
+                await cur.execute("SELECT cp_id, connector_id, status, error_code FROM connectors")
+                connectors = await cur.fetchall()
+                await cur.execute(
+                    "SELECT id, cp_id, UNIX_TIMESTAMP(start_ts) AS ts FROM transactions WHERE id > %s ORDER BY id",
+                    (self._tx_watermark if not self.primed else max(self._tx_watermark - _TX_OVERLAP, 0),),
+                )
+                transactions = await cur.fetchall()
+        now = time.time()
+        if self.fleet is None:
+            self.fleet = _Window(self.n_buckets, self.bucket_seconds, now)
+        for row in connectors:
+            self.set_connector(row["cp_id"], row["connector_id"], row["status"], row["error_code"], now)
+        for row in transactions:
+            self.add_transaction(row["id"], row["cp_id"], float(row["ts"]), now)
+            self._tx_watermark = max(self._tx_watermark, row["id"])
+        self.primed = True
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        last_bucket = int(time.time() // self.bucket_seconds)
+        while True:
+            try:
+                await self.resync()
+            except Exception as e:
+                logger.warning("resync health gagal: %s", e)
+            bucket = int(time.time() // self.bucket_seconds)
+            if self.primed and bucket != last_bucket:
+                self._record()
+                last_bucket = bucket
+            await asyncio.sleep(min(self.resync_interval, self.bucket_seconds))
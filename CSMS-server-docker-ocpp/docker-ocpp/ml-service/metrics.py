@@ -0,0 +1,111 @@
+import asyncio
+import os
+import time
+from collections import deque
+
+import httpx
+import psutil
+
+# ---------------------
+# System metrics sampler
+# ---------------------
+# Sampling jalan di background, endpoint cukup membaca sampel terakhir
+# dari ring buffer (tidak ada lagi psutil.cpu_percent(interval=1) per request).
+
+SAMPLE_INTERVAL = float(os.getenv("METRICS_INTERVAL", "5"))
+HISTORY_SIZE = int(os.getenv("METRICS_HISTORY", "720"))  # 720 x 5s = 1 jam
+
+
+class MetricsSampler:
+    def __init__(self, service, interval=SAMPLE_INTERVAL, history=HISTORY_SIZE, pool_getter=None, peers=None):
+        self.service = service
+        self.interval = interval
+        self.samples = deque(maxlen=history)
+        self.pool_getter = pool_getter  # callable -> {nama: aiomysql pool} atau None
+        self.peers = peers or {}        # {"nama-service": "http://.../system/usage"}
+        self.process = psutil.Process()
+        self._task = None
+
+    def start(self):
+        # panggilan pertama cpu_percent(None) selalu 0.0, jadi "pancing" dulu
+        psutil.cpu_percent(interval=None)
+        self.process.cpu_percent(interval=None)
+        self.samples.append(self._collect(loop_lag=0.0))
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        async with httpx.AsyncClient(timeout=1.0) as client:
+            while True:
+                t0 = loop.time()
+                await asyncio.sleep(self.interval)
+                # lag = berapa lama event loop telat membangunkan task ini
+                lag = max(loop.time() - t0 - self.interval, 0.0)
+                sample = self._collect(loop_lag=lag)
+                for name, url in self.peers.items():
+                    peer = await self._fetch_peer(client, url)
+                    if peer and peer.get("services"):
+                        sample["services"].update(peer["services"])
+                    else:
+                        sample["services"][name] = None
+                self.samples.append(sample)
+
+    async def _fetch_peer(self, client, url):
+        try:
+            resp = await client.get(url)
+            return resp.json() if resp.status_code == 200 else None
+        except Exception:
+            return None
+
+    def _pool_stats(self):
+        pools = self.pool_getter() if self.pool_getter else None
+        if not pools:
+            return None
+        return {
+            name: {
+                "size": pool.size,
+                "free": pool.freesize,
+                "used": pool.size - pool.freesize,
+                "max": pool.maxsize,
+            }
+            for name, pool in pools.items()
+        }
+
+    def self_stats(self, loop_lag):
+        return {
+            "rss_mb": round(self.process.memory_info().rss / (1024 ** 2), 2),
+            "cpu_percent": self.process.cpu_percent(interval=None),
+            "loop_lag_ms": round(loop_lag * 1000, 2),
+            "db_pool": self._pool_stats(),
+        }
+
+    def _collect(self, loop_lag):
+        memory = psutil.virtual_memory()
+        return {
+            "cpu_percent": psutil.cpu_percent(interval=None),
+            "ram_percent": memory.percent,
+            "ram_used_gb": round(memory.used / (1024 ** 3), 2),
+            "ram_total_gb": round(memory.total / (1024 ** 3), 2),
+            "timestamp": time.time(),
+            "services": {self.service: self.self_stats(loop_lag)},
+        }
+
+    def latest(self):
+        return self.samples[-1] if self.samples else None
+
+    def history(self, limit=None, since=None):
+        rows = list(self.samples)
+        if since is not None:
+            rows = [s for s in rows if s["timestamp"] > since]
+        if limit is not None:
+            rows = rows[-limit:]
+        return rows
@@ -1,6 +1,8 @@
 import pandas as pd
+import numpy as np
 import aiomysql
 import os
+import psutil
 from datetime import datetime, timedelta
 
 DB_CONFIG = dict(
@@ -10,24 +12,117 @@ DB_CONFIG = dict(
     db=os.getenv("DB_NAME", "ocpp"),
 )
 
+# Tabel besar dibaca dengan server-side cursor per LOAD_CHUNK_ROWS baris
+# (tuple, bukan dict per baris) dan tiap chunk langsung diubah ke kolom
+# bertipe: cp_id/id_tag category, integer di-downcast, duration/kwh float32.
+# Kolom mentah (meter_start/meter_stop) hanya hidup selama satu chunk.
+LOAD_CHUNK = int(os.getenv("LOAD_CHUNK_ROWS", "50000"))
+MEMORY_BUDGET_MB = float(os.getenv("TRAIN_MEMORY_BUDGET_MB", "0"))  # 0 = tanpa batas
+
+_POOL = None
+
 async def get_pool():
-    return await aiomysql.create_pool(**DB_CONFIG)
+    # satu pool per proses (dulu pool baru dibuat di setiap pemanggilan)
+    global _POOL
+    if _POOL is None:
+        _POOL = await aiomysql.create_pool(**DB_CONFIG, autocommit=True)
+    return _POOL
 
-async def load_transactions():
-    """Load transactions data for ML preprocessing."""
+async def close_pool():
+    global _POOL
+    if _POOL is not None:
+        _POOL.close()
+        await _POOL.wait_closed()
+        _POOL = None
+
+class MemoryBudgetExceeded(MemoryError):
+    pass
+
+def check_memory_budget(stage):
+    """Raise MemoryBudgetExceeded if this process's RSS is above TRAIN_MEMORY_BUDGET_MB."""
+    if MEMORY_BUDGET_MB <= 0:
+        return
+    rss_mb = psutil.Process().memory_info().rss / 2**20
+    if rss_mb > MEMORY_BUDGET_MB:
+        raise MemoryBudgetExceeded(f"{stage}: RSS {rss_mb:.0f} MB > budget {MEMORY_BUDGET_MB:.0f} MB")
+
+def _encode(values, mapping):
+    # kode category global (satu mapping untuk semua chunk): kategori tidak
+    # disimpan ulang per chunk, penting untuk id_tag yang unik-nya banyak
+    for v in pd.unique(values):
+        if v is not None and v == v and v not in mapping:
+            mapping[v] = len(mapping)
+    return values.map(mapping).fillna(-1).to_numpy(np.int32)
+
+async def _load_chunked(sql, convert, categorical=()):
+    """Stream ``sql`` through a server-side cursor into one typed DataFrame.
+
+    ``convert`` turns each list of row tuples into a DataFrame; columns in
+    ``categorical`` are dictionary-encoded as the chunks arrive.
+    """
     pool = await get_pool()
+    mappings = {col: {} for col in categorical}
+    frames = []
     async with pool.acquire() as conn:
-        async with conn.cursor(aiomysql.DictCursor) as cur:
-            await cur.execute("SELECT * FROM transactions ORDER BY start_ts")
-            rows = await cur.fetchall()
+        async with conn.cursor(aiomysql.SSCursor) as cur:
+            await cur.execute(sql)
+            while True:
+                rows = await cur.fetchmany(LOAD_CHUNK)
+                if not rows:
+                    break
+                frame = convert(rows)
+                del rows
+                for col, mapping in mappings.items():
+                    frame[col] = _encode(frame[col], mapping)
+                frames.append(frame)
+                check_memory_budget("load")
+    if not frames:
+        return pd.DataFrame()
+    data = {}
+    for col in frames[0].columns:
+        values = np.concatenate([f.pop(col).to_numpy() for f in frames])
+        if col in mappings:
+            values = pd.Categorical.from_codes(values, categories=list(mappings[col]))
+        data[col] = values
+    return pd.DataFrame(data)
+
+TX_COLUMNS = ['cp_id', 'connector_id', 'id_tag', 'meter_start', 'meter_stop', 'start_ts', 'stop_ts']
+
+def _transactions_chunk(rows):
+    df = pd.DataFrame.from_records(rows, columns=TX_COLUMNS)
+    start = pd.to_datetime(df['start_ts'])
+    stop = pd.to_datetime(df['stop_ts'])
+    return pd.DataFrame({
+        'cp_id': df['cp_id'],
+        'connector_id': pd.to_numeric(df['connector_id'], downcast='integer'),
+        'id_tag': df['id_tag'],
+        'start_ts': start,
+        'stop_ts': stop,
+        'duration': ((stop - start).dt.total_seconds() / 3600).astype('float32'),  # hours
+        'kwh': ((pd.to_numeric(df['meter_stop']) - pd.to_numeric(df['meter_start'])) / 1000).astype('float32'),
+    })
+
+def transactions_frame(rows):
+    """Build the transactions DataFrame with the derived duration/kwh columns."""
     df = pd.DataFrame(rows)
     if not df.empty:
         df['start_ts'] = pd.to_datetime(df['start_ts'])
         df['stop_ts'] = pd.to_datetime(df['stop_ts'])
+        # sesi terbuka: meter_stop None -> NaN (bukan kolom object)
+        df['meter_start'] = pd.to_numeric(df['meter_start'])
+        df['meter_stop'] = pd.to_numeric(df['meter_stop'])
         df['duration'] = (df['stop_ts'] - df['start_ts']).dt.total_seconds() / 3600  # hours
         df['kwh'] = (df['meter_stop'] - df['meter_start']) / 1000
     return df
 
+async def load_transactions():
+    """Load transactions for training: typed, chunked, without the raw meter columns."""
+    return await _load_chunked(
+        f"SELECT {', '.join(TX_COLUMNS)} FROM transactions ORDER BY start_ts",
+        _transactions_chunk,
+        categorical=('cp_id', 'id_tag'),
+    )
+
 async def load_connectors():
     """Load connectors data."""
     pool = await get_pool()
@@ -40,6 +135,15 @@ async def load_connectors():
         df['last_update'] = pd.to_datetime(df['last_update'])
     return df
 
+async def load_charge_point_ids():
+    """Ids of all registered charge points, including ones without transactions."""
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT id FROM charge_points ORDER BY id")
+            rows = await cur.fetchall()
+    return [str(row[0]) for row in rows]
+
 async def load_users():
     """Load users data."""
     pool = await get_pool()
@@ -53,31 +157,54 @@ def prepare_time_series(df_tx, freq='H'):
     """Prepare time series for forecasting (availability/demand)."""
     if df_tx.empty:
         return pd.DataFrame()
-    df_tx['hour'] = df_tx['start_ts'].dt.floor(freq)
-    ts = df_tx.groupby('hour').size().reset_index(name='transactions')
+    # tidak menambah kolom ke df_tx: DataFrame bisa milik feature store
+    hour = df_tx['start_ts'].dt.floor(freq).rename('hour')
+    ts = df_tx.groupby(hour).size().reset_index(name='transactions')
     ts.set_index('hour', inplace=True)
     ts = ts.reindex(pd.date_range(start=ts.index.min(), end=ts.index.max(), freq=freq), fill_value=0)
     return ts
 
+STATUS_CODES = {'Available': 0, 'Charging': 1, 'Faulted': 2}
+USER_FEATURES = ['avg_duration', 'total_duration', 'avg_kwh', 'total_kwh', 'total_sessions', 'avg_start_hour']
+
+def anomaly_features(status, error_code, hours_since_update):
+    """Maintenance model features from raw connector columns (also used for batch scoring)."""
+    return pd.DataFrame({
+        'status_code': pd.Series(status).map(STATUS_CODES).fillna(3),
+        'error_code_num': pd.Series(error_code).map({'NoError': 0}).fillna(1),
+        'hours_since_update': hours_since_update,
+    })
+
 def prepare_anomaly_data(df_conn):
     """Prepare data for anomaly detection (maintenance)."""
     if df_conn.empty:
         return pd.DataFrame()
     # Simple features: time since last update, status encoding
-    df_conn['status_code'] = df_conn['status'].map({'Available': 0, 'Charging': 1, 'Faulted': 2}).fillna(3)
-    df_conn['error_code_num'] = df_conn['error_code'].map({'NoError': 0}).fillna(1)
-    df_conn['hours_since_update'] = (pd.Timestamp.now() - df_conn['last_update']).dt.total_seconds() / 3600
-    return df_conn[['status_code', 'error_code_num', 'hours_since_update']]
+    return anomaly_features(
+        df_conn['status'],
+        df_conn['error_code'],
+        (pd.Timestamp.now() - df_conn['last_update']).dt.total_seconds() / 3600,
+    )
 
 def prepare_user_clusters(df_tx, df_users):
     """Prepare data for user clustering."""
     if df_tx.empty or df_users.empty:
         return pd.DataFrame()
-    user_stats = df_tx.groupby('id_tag').agg({
-        'duration': ['mean', 'sum'],
-        'kwh': ['mean', 'sum'],
-        'start_ts': ['count', lambda x: x.dt.hour.mean()]  # avg start hour
-    }).reset_index()
-    user_stats.columns = ['id_tag', 'avg_duration', 'total_duration', 'avg_kwh', 'total_kwh', 'total_sessions', 'avg_start_hour']
+    # jam mulai sebagai kolom int8: agregasi vektor, bukan lambda per user
+    tx = pd.DataFrame({
+        'id_tag': df_tx['id_tag'],
+        'duration': df_tx['duration'],
+        'kwh': df_tx['kwh'],
+        'start_hour': df_tx['start_ts'].dt.hour.astype('int8'),
+    })
+    user_stats = tx.groupby('id_tag', observed=True).agg(
+        avg_duration=('duration', 'mean'),
+        total_duration=('duration', 'sum'),
+        avg_kwh=('kwh', 'mean'),
+        total_kwh=('kwh', 'sum'),
+        total_sessions=('start_hour', 'count'),
+        avg_start_hour=('start_hour', 'mean'),
+    ).reset_index()
+    user_stats['id_tag'] = user_stats['id_tag'].astype(object)
     user_stats = user_stats.merge(df_users, on='id_tag', how='left')
-    return user_stats[['avg_duration', 'total_duration', 'avg_kwh', 'total_kwh', 'total_sessions', 'avg_start_hour']].fillna(0)
+    return user_stats[USER_FEATURES].fillna(0)
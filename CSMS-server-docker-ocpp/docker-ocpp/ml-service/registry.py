@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import os
+import pickle
+import time
+from datetime import datetime
+
+import compact
+
+logger = logging.getLogger("ml-service.registry")
+
+# ---------------------
+# Model registry
+# ---------------------
+# Model di-load sekali ke memori, bukan di-unpickle per request. Watcher di
+# background memeriksa models/ tiap MODEL_RELOAD_INTERVAL detik; file yang
+# mtime/ukurannya berubah di-load ulang di thread terpisah lalu ditukar
+# dengan satu assignment, jadi request yang sedang jalan tetap memakai
+# model lama sampai selesai. Kalau load gagal (file setengah ditulis dll),
+# model lama tetap dipakai.
+
+MODEL_DIR = os.getenv("MODEL_DIR", "models")
+RELOAD_INTERVAL = float(os.getenv("MODEL_RELOAD_INTERVAL", "10"))
+
+
+def _load_pickle(path):
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+# ekstensi file -> fungsi load; urutan = prioritas kalau satu model ada
+# dalam dua format (format compact .npz dari compact.py didahulukan)
+LOADERS = {".npz": compact.load, ".pkl": _load_pickle}
+
+
+def model_file(model_dir, name):
+    """Path of the file registry would load for ``name``, or None."""
+    for ext in LOADERS:
+        path = os.path.join(model_dir, name + ext)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def load_file(path):
+    return LOADERS[os.path.splitext(path)[1]](path)
+
+
+def drop_other_formats(path):
+    """Remove files of the same model in other formats, so a stale one is never picked up."""
+    base, ext = os.path.splitext(path)
+    for other in LOADERS:
+        if other != ext and os.path.exists(base + other):
+            os.remove(base + other)
+
+
+class ModelRegistry:
+    def __init__(self, model_dir=MODEL_DIR, interval=RELOAD_INTERVAL):
+        self.model_dir = model_dir
+        self.interval = interval
+        self.models = {}  # nama -> entry (dict), diganti utuh saat swap
+        self.listeners = []  # callable(nama), dipanggil setelah model ditukar
+        self._task = None
+
+    def get(self, name):
+        entry = self.models.get(name)
+        return entry["model"] if entry else None
+
+    def info(self):
+        return {name: {k: v for k, v in entry.items() if k != "model"} for name, entry in self.models.items()}
+
+    def _candidates(self):
+        if not os.path.isdir(self.model_dir):
+            return
+        files = set(os.listdir(self.model_dir))
+        names = sorted({os.path.splitext(f)[0] for f in files if os.path.splitext(f)[1] in LOADERS})
+        for name in names:
+            ext = next(ext for ext in LOADERS if name + ext in files)
+            yield name, os.path.join(self.model_dir, name + ext), ext
+
+    def _version(self, name, st):
+        # train.py boleh menulis <nama>.version; kalau tidak ada pakai mtime
+        path = os.path.join(self.model_dir, f"{name}.version")
+        if os.path.exists(path):
+            with open(path) as f:
+                return f.read().strip()
+        return datetime.fromtimestamp(st.st_mtime).strftime("%Y%m%d-%H%M%S")
+
+    def refresh(self):
+        """Load new or changed model files. Returns the names that were swapped."""
+        changed = []
+        for name, path, ext in self._candidates():
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            stamp = (st.st_mtime_ns, st.st_size)
+            current = self.models.get(name)
+            if current and current["stamp"] == stamp:
+                continue
+            t0 = time.perf_counter()
+            try:
+                model = LOADERS[ext](path)
+            except Exception as e:
+                logger.warning("gagal load model %s dari %s: %s", name, path, e)
+                continue
+            entry = {
+                "model": model,
+                "version": self._version(name, st),
+                "path": path,
+                "stamp": stamp,
+                "size_bytes": st.st_size,
+                "load_seconds": round(time.perf_counter() - t0, 4),
+                "loaded_at": time.time(),
+            }
+            self.models = {**self.models, name: entry}  # swap atomik
+            changed.append(name)
+            logger.info("model %s versi %s di-load (%.3fs)", name, entry["version"], entry["load_seconds"])
+            for listener in self.listeners:
+                listener(name)
+        return changed
+
+    async def start(self):
+        await asyncio.to_thread(self.refresh)
+        self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                logger.warning("scan %s gagal: %s", self.model_dir, e)
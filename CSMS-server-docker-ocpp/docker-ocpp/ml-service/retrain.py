@@ -0,0 +1,332 @@
+import asyncio
+import json
+import logging
+import math
+import multiprocessing
+import os
+import shutil
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from preprocess import MEMORY_BUDGET_MB
+from registry import drop_other_formats, load_file, model_file
+
+logger = logging.getLogger("ml-service.retrain")
+
+# ---------------------
+# Scheduled retraining
+# ---------------------
+# train_all() jalan di proses terpisah (spawn, prioritas rendah) supaya
+# tidak pernah memblokir event loop inference. Kandidat dilatih ke
+# models/.staging/ tanpa RETRAIN_HOLDOUT_HOURS jam transaksi terakhir, lalu
+# kandidat dan model yang sedang dipakai dinilai hanya pada jam holdout
+# itu (out-of-sample untuk kandidat). Model yang lebih buruk dari
+# RETRAIN_TOLERANCE dibuang; yang lolos dilatih ulang dengan semua data
+# (supaya forecast tidak tertinggal holdout) dan dipublikasikan dengan
+# os.replace() (atomik di filesystem yang sama). ModelRegistry mengambilnya
+# dari situ seperti file biasa.
+# Model yang sedang dipakai mungkin sudah melihat sebagian holdout (kalau
+# dilatih < RETRAIN_HOLDOUT_HOURS jam lalu): bias itu menguntungkan model
+# lama, jadi gate lebih konservatif, bukan lebih longgar.
+# Isolation Forest tidak punya label: ia selalu dipublikasikan selama
+# skornya valid (finite); fraksi connector yang ditandai dicatat di history.
+
+RETRAIN_INTERVAL = float(os.getenv("RETRAIN_INTERVAL", "24"))  # jam, 0 = mati
+RETRAIN_AT = os.getenv("RETRAIN_AT", "03:00")  # jam mulai jadwal (HH:MM), kosong = mulai sekarang
+RETRAIN_TOLERANCE = float(os.getenv("RETRAIN_TOLERANCE", "0.1"))  # boleh 10% lebih buruk
+RETRAIN_NICE = int(os.getenv("RETRAIN_NICE", "10"))
+HISTORY_SIZE = 50
+STAGING_DIR = ".staging"
+HISTORY_FILE = "training_history.json"
+HOLDOUT_HOURS = int(os.getenv("RETRAIN_HOLDOUT_HOURS", "48"))
+MIN_TRAIN_HOURS = 10  # sama dengan batas train_availability_model
+
+
+# --- dijalankan di proses anak ---
+
+def _mae(actual, predicted):
+    return float(np.mean(np.abs(np.asarray(actual, dtype=float) - np.asarray(predicted, dtype=float))))
+
+
+def split_holdout(df_tx, hours=HOLDOUT_HOURS):
+    """Split off the last ``hours`` whole hours: ``(training rows, holdout start)``."""
+    if df_tx.empty:
+        return df_tx, None
+    last_hour = pd.Timestamp(df_tx["start_ts"].max().to_datetime64().astype("datetime64[h]"))
+    cutoff = last_hour - pd.Timedelta(hours=hours - 1)
+    return df_tx[df_tx["start_ts"] < cutoff], cutoff.to_pydatetime()
+
+
+def _holdout(data):
+    df = data["transactions"]
+    return df[df["start_ts"] >= data["holdout_start"]]
+
+
+def _score_availability(model, data):
+    from preprocess import prepare_time_series
+    ts = prepare_time_series(data["transactions"])
+    held = ts.index >= data["holdout_start"]
+    if not held.any() or (~held).sum() < MIN_TRAIN_HOURS:
+        return None
+    # parameter model diterapkan ke seluruh seri, error one-step hanya di jam holdout
+    fitted = model.apply(ts["transactions"]).fittedvalues
+    return _mae(ts["transactions"][held], fitted[held])
+
+
+def _score_fleet(model, data):
+    from fleet import hourly_matrix
+    # matriks dibangun dengan urutan CP milik model; CP baru tidak ikut dinilai
+    _, start, X = hourly_matrix(data["transactions"], cp_ids=model.cp_ids)
+    if start is None:
+        return None
+    first = int((pd.Timestamp(data["holdout_start"]) - pd.Timestamp(start)) / pd.Timedelta(hours=1))
+    if first < 1 or first >= X.shape[1]:
+        return None
+    return _mae(X[:, first:], model.one_step(X, start)[:, first:])
+
+
+def _score_load(model, data):
+    holdout = _holdout(data)
+    if holdout.empty:
+        return None
+    return _mae(holdout["kwh"].fillna(0), model.predict(holdout[["duration"]].fillna(0)))
+
+
+def _score_users(model, data):
+    from preprocess import prepare_user_clusters
+    # fitur user dari sesi di jam holdout saja
+    X = prepare_user_clusters(_holdout(data), data["users"])
+    if X.empty:
+        return None
+    return float(-model.score(X) / len(X))  # rata-rata inertia per user
+
+
+def _score_maintenance(model, data):
+    from preprocess import prepare_anomaly_data
+    X = prepare_anomaly_data(data["connectors"])
+    if X.empty:
+        return None
+    scores = model.decision_function(X)
+    if not np.isfinite(scores).all():
+        return math.inf
+    return None  # tanpa label: selalu dipublikasikan kalau skornya valid
+
+
+# nama model -> fungsi skor (lebih kecil = lebih baik, None = tidak dibandingkan)
+SCORERS = {
+    "availability_arima": _score_availability,
+    "availability_fleet": _score_fleet,
+    "load_lr": _score_load,
+    "user_kmeans": _score_users,
+    "maintenance_iforest": _score_maintenance,
+}
+
+
+def accept(new_score, old_score, tolerance=RETRAIN_TOLERANCE):
+    """Gate for a candidate model; scores are errors (lower is better), None = not comparable."""
+    if new_score == math.inf:
+        return False
+    if new_score is None or old_score is None:
+        return True
+    return new_score <= old_score * (1 + tolerance)
+
+
+def _flagged_fraction(model, data):
+    from preprocess import prepare_anomaly_data
+    X = prepare_anomaly_data(data["connectors"])
+    return round(float((model.predict(X) == -1).mean()), 4) if not X.empty else None
+
+
+def _safe_score(scorer, path, data, failed=math.inf):
+    """Load ``path`` and score it; ``failed`` when loading or scoring raises."""
+    try:
+        return scorer(load_file(path), data)
+    except Exception as e:
+        logger.warning("validasi %s gagal: %s", os.path.basename(path), e)
+        return failed
+
+
+def _publish(src, name, model_dir, version):
+    # version ditulis dulu: registry membaca versi saat mendeteksi file model baru
+    version_path = os.path.join(model_dir, f"{name}.version")
+    with open(version_path + ".tmp", "w") as f:
+        f.write(version)
+    os.replace(version_path + ".tmp", version_path)
+    dest = os.path.join(model_dir, os.path.basename(src))
+    os.replace(src, dest)
+    drop_other_formats(dest)
+    return dest
+
+
+async def _refit(name, model_dir, data):
+    """Train the accepted model again on all rows (holdout included)."""
+    import train
+    trainers = {
+        "availability_arima": lambda: train.train_availability_model(model_dir, data["transactions"]),
+        "availability_fleet": lambda: train.train_fleet_model(model_dir, data["transactions"], data["charge_points"]),
+        "load_lr": lambda: train.train_load_model(model_dir, data["transactions"]),
+        "user_kmeans": lambda: train.train_user_model(model_dir, data["transactions"], data["users"]),
+    }
+    if name not in trainers:
+        return None  # maintenance_iforest: dilatih dari snapshot connector, tidak ada holdout
+    await trainers[name]()
+    return model_file(model_dir, name)
+
+
+async def _retrain(model_dir):
+    from preprocess import close_pool, load_charge_point_ids, load_connectors, load_transactions, load_users
+    from train import train_all
+
+    staging = os.path.join(model_dir, STAGING_DIR)
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    t0 = time.perf_counter()
+    try:
+        # satu salinan transaksi dipakai untuk training dan validasi
+        data = {
+            "transactions": await load_transactions(),
+            "connectors": await load_connectors(),
+            "users": await load_users(),
+            "charge_points": await load_charge_point_ids(),
+        }
+        train_tx, data["holdout_start"] = split_holdout(data["transactions"])
+        await train_all(staging, train_tx)
+        train_seconds = time.perf_counter() - t0
+    finally:
+        await close_pool()
+
+    version = datetime.now().strftime("%Y%m%d-%H%M%S")
+    final = os.path.join(staging, "final")
+    models = {}
+    for name, scorer in SCORERS.items():
+        new_path = model_file(staging, name)
+        if new_path is None:
+            models[name] = {"status": "skipped"}  # data kurang, train_* tidak menyimpan model
+            continue
+        old_path = model_file(model_dir, name)
+        new_score = _safe_score(scorer, new_path, data) if data["holdout_start"] else None
+        # model lama yang rusak/tidak bisa dibaca tidak boleh menahan kandidat
+        old_score = _safe_score(scorer, old_path, data, failed=None) if old_path and data["holdout_start"] else None
+        accepted = accept(new_score, old_score)
+        record = {"status": "published" if accepted else "rejected", "score_new": new_score, "score_old": old_score}
+        if name == "maintenance_iforest" and new_score is None:
+            record["flagged_fraction"] = _safe_score(_flagged_fraction, new_path, data, failed=None)
+        if accepted:
+            refit = await _refit(name, final, data)
+            record["refit"] = refit is not None
+            new_path = _publish(refit or new_path, name, model_dir, version)
+        record["size_bytes"] = os.path.getsize(new_path) if accepted else None
+        models[name] = record
+    shutil.rmtree(staging, ignore_errors=True)
+    return {
+        "version": version,
+        "train_seconds": round(train_seconds, 2),
+        "holdout_start": data["holdout_start"].isoformat() if data["holdout_start"] else None,
+        "models": models,
+    }
+
+
+def run_retraining(model_dir):
+    """Entry point of the training process."""
+    try:
+        os.nice(RETRAIN_NICE)
+    except (AttributeError, OSError):
+        pass
+    report = asyncio.run(_retrain(model_dir))
+    import resource
+    report["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)  # KB di Linux
+    report["memory_budget_mb"] = MEMORY_BUDGET_MB or None
+    return report
+
+
+# --- dijalankan di proses ml-service ---
+
+class RetrainScheduler:
+    def __init__(self, registry, interval=RETRAIN_INTERVAL, at=RETRAIN_AT):
+        self.registry = registry
+        self.interval = interval
+        self.at = at
+        self.history_path = os.path.join(registry.model_dir, HISTORY_FILE)
+        self.history = deque(self._read_history(), maxlen=HISTORY_SIZE)
+        self.running = False
+        self.next_run = None
+        self._task = None
+
+    def _read_history(self):
+        try:
+            with open(self.history_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return []
+
+    def _write_history(self):
+        with open(self.history_path + ".tmp", "w") as f:
+            json.dump(list(self.history), f, indent=1)
+        os.replace(self.history_path + ".tmp", self.history_path)
+
+    def _first_run(self, now):
+        if not self.at:
+            return now
+        hour, minute = (int(x) for x in self.at.split(":"))
+        first = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        return first if first > now else first + timedelta(days=1)
+
+    async def run_now(self, reason="manual"):
+        """Train in a child process; returns the history record, or None if a run is in progress."""
+        if self.running:
+            return None
+        self.running = True
+        record = {"started_at": datetime.now().isoformat(timespec="seconds"), "reason": reason}
+        t0 = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        # executor per run: tidak ada proses training yang menganggur di memori
+        executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            record.update(await loop.run_in_executor(executor, run_retraining, self.registry.model_dir))
+            record["status"] = "ok"
+        except Exception as e:
+            logger.warning("retraining gagal: %s", e)
+            record.update(status="failed", error=str(e))
+        finally:
+            executor.shutdown(wait=False)
+            self.running = False
+        record["seconds"] = round(time.perf_counter() - t0, 2)
+        self.history.append(record)
+        await asyncio.to_thread(self._write_history)
+        await asyncio.to_thread(self.registry.refresh)  # langsung pakai model baru
+        return record
+
+    def info(self):
+        return {
+            "interval_hours": self.interval,
+            "running": self.running,
+            "next_run": self.next_run.isoformat(timespec="seconds") if self.next_run else None,
+            "history": list(self.history),
+        }
+
+    def start(self):
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        self.next_run = self._first_run(datetime.now())
+        while True:
+            await asyncio.sleep(max((self.next_run - datetime.now()).total_seconds(), 0))
+            await self.run_now(reason="schedule")
+            step = timedelta(hours=self.interval)
+            while self.next_run <= datetime.now():
+                self.next_run += step
@@ -0,0 +1,296 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import aiomysql
+import numpy as np
+
+from preprocess import USER_FEATURES, get_pool
+
+logger = logging.getLogger("ml-service.segments")
+
+# ---------------------
+# Incremental user segmentation
+# ---------------------
+# Agregat per user (jumlah sesi, total durasi, total kWh, jumlah jam mulai)
+# disimpan di array NumPy, satu baris per id_tag, dan ditambah setiap ada
+# StopTransaction (event dari ocpp-server, plus resync dari DB berdasarkan
+# stop_ts untuk event yang hilang, mundur SEGMENT_STOP_OVERLAP detik untuk
+# commit yang terlambat; dedupe lewat id transaksi). Bootstrap memakai GROUP BY di DB, bukan
+# load semua transaksi. Fitur = USER_FEATURES, sama dengan
+# prepare_user_clusters, jadi model user_kmeans hasil training tetap cocok.
+#
+# Center cluster diambil dari model user_kmeans (atau k-means++ di atas
+# agregat kalau belum ada model) lalu di-update tiap
+# SEGMENT_UPDATE_INTERVAL detik dengan satu langkah mini-batch k-means
+# (Sculley 2010, seperti MiniBatchKMeans) yang hanya memakai user yang
+# berubah sejak update terakhir. Segment satu user = center terdekat dari
+# fitur barisnya: O(k), tanpa scan history. Model baru dari retraining
+# menggantikan center online.
+
+UPDATE_INTERVAL = float(os.getenv("SEGMENT_UPDATE_INTERVAL", "30"))
+STOP_OVERLAP = int(os.getenv("SEGMENT_STOP_OVERLAP", "300"))  # detik, seperti store.STOP_OVERLAP
+N_CLUSTERS = 3  # sama dengan train_user_model
+MODEL_NAME = "user_kmeans"
+_TX_MEMORY = 10000  # jumlah id transaksi yang diingat untuk dedupe
+
+SESSIONS, DURATION, KWH, START_HOURS = range(4)  # kolom array agregat
+
+
+def user_features(stats):
+    """USER_FEATURES (in that order) from rows of running totals."""
+    n = np.maximum(stats[:, SESSIONS], 1)
+    return np.column_stack([
+        stats[:, DURATION] / n, stats[:, DURATION], stats[:, KWH] / n, stats[:, KWH], stats[:, SESSIONS], stats[:, START_HOURS] / n,
+    ])
+
+
+def nearest(centers, X):
+    """Index of the nearest center for each row of ``X``."""
+    return ((X[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2).argmin(axis=1)
+
+
+def kmeans_plus_plus(X, k, seed=0):
+    """Initial centers spread over X (k-means++ seeding)."""
+    rng = np.random.default_rng(seed)
+    centers = [X[rng.integers(len(X))]]
+    for _ in range(1, k):
+        d = ((X[:, None, :] - np.asarray(centers)[None]) ** 2).sum(axis=2).min(axis=1)
+        if d.sum() == 0:
+            break
+        centers.append(X[rng.choice(len(X), p=d / d.sum())])
+    return np.asarray(centers, dtype=np.float64)
+
+
+def lloyd(X, centers, iterations=20):
+    """Full-batch k-means refinement of ``centers`` (only used when no trained model exists)."""
+    for _ in range(iterations):
+        labels = ((X[:, None, :] - centers[None]) ** 2).sum(axis=2).argmin(axis=1)
+        new = np.array([X[labels == c].mean(axis=0) if (labels == c).any() else centers[c] for c in range(len(centers))])
+        if np.allclose(new, centers):
+            break
+        centers = new
+    return centers
+
+
+class UserSegments:
+    def __init__(self, registry, interval=UPDATE_INTERVAL):
+        self.registry = registry
+        self.interval = interval
+        self.index = {}  # id_tag -> baris di self.stats
+        self.tags = []
+        self.stats = np.zeros((1024, 4))
+        self.dirty = set()
+        self.centers = None
+        self.counts = None
+        self.source = None  # (version, stamp) model registry, atau "online"
+        self.primed = False
+        self.updates = 0
+        self.last_update = {}
+        self._tx_seen = OrderedDict()
+        self._watermark = None  # stop_ts terakhir yang sudah masuk (DB)
+        self._watermark_ts = 0.0  # idem, epoch; event stop sebelum ini sudah di-bootstrap
+        self._task = None
+
+    # --- agregat ---
+    def _row(self, id_tag):
+        row = self.index.get(id_tag)
+        if row is None:
+            row = self.index[id_tag] = len(self.tags)
+            self.tags.append(id_tag)
+            if row == len(self.stats):
+                self.stats = np.concatenate([self.stats, np.zeros_like(self.stats)])
+        return row
+
+    def add_session(self, tx_id, id_tag, duration, kwh, start_hour):
+        if tx_id is not None:
+            if tx_id in self._tx_seen:
+                return
+            self._tx_seen[tx_id] = True
+            while len(self._tx_seen) > _TX_MEMORY:
+                self._tx_seen.popitem(last=False)
+        row = self._row(id_tag)
+        self.stats[row] += (1, duration, kwh, start_hour)
+        self.dirty.add(row)
+
+    def features(self, rows=None):
+        return user_features(self.stats[:len(self.tags)] if rows is None else self.stats[rows])
+
+    def handle(self, event):
+        """Apply a StopTransaction event from ocpp-server (see POST /events)."""
+        if event.get("type") != "stop" or not self.primed or event["ts"] <= self._watermark_ts:
+            return  # sebelum watermark: sudah termasuk bootstrap / resync
+        if event.get("meter_start") is None or event.get("id_tag") is None or event.get("start_ts") is None:
+            return
+        self.add_session(
+            event["transaction_id"], event["id_tag"],
+            (event["ts"] - event["start_ts"]) / 3600,
+            (event["meter_stop"] - event["meter_start"]) / 1000,
+            datetime.fromtimestamp(event["start_ts"]).hour,
+        )
+
+    # --- clustering ---
+    def _distances(self, X):
+        return ((X[:, None, :] - self.centers[None, :, :]) ** 2).sum(axis=2)
+
+    def _model_version(self):
+        entry = self.registry.models.get(MODEL_NAME)
+        return (entry["version"], entry["stamp"]) if entry else None
+
+    def _seed(self):
+        """Take centers from a newly loaded user_kmeans, or seed them from the aggregates."""
+        version = self._model_version()
+        if version is not None and version != self.source:
+            model = self.registry.get(MODEL_NAME)
+            centers = getattr(model, "centers", None)  # compact.CompactKMeans
+            if centers is None:
+                centers = model.cluster_centers_
+            self.centers = np.array(centers, dtype=np.float64)
+            self.source = version
+        elif self.centers is None and len(self.tags) >= N_CLUSTERS:
+            X = self.features()
+            self.centers = lloyd(X, kmeans_plus_plus(X, N_CLUSTERS))
+            self.source = "online"
+        else:
+            return False
+        X = self.features()
+        self.counts = np.bincount(self._distances(X).argmin(axis=1), minlength=len(self.centers)).astype(np.float64) if len(X) else np.zeros(len(self.centers))
+        self.dirty.clear()  # sudah terwakili di counts
+        return True
+
+    def update(self):
+        """One mini-batch k-means step on the users changed since the last update."""
+        if self._seed() or self.centers is None or not self.dirty:
+            return
+        t0 = time.perf_counter()
+        rows = np.fromiter(self.dirty, dtype=np.int64, count=len(self.dirty))
+        self.dirty.clear()
+        X = self.features(rows)
+        labels = self._distances(X).argmin(axis=1)
+        k = len(self.centers)
+        added = np.bincount(labels, minlength=k)
+        sums = np.zeros_like(self.centers)
+        np.add.at(sums, labels, X)
+        moved = added > 0
+        total = self.counts + added
+        # learning rate per center = 1 / jumlah sampel yang sudah dilihat center itu
+        self.centers[moved] = (self.centers[moved] * self.counts[moved, None] + sums[moved]) / total[moved, None]
+        # fitur total_* terus tumbuh, jadi memori dibatasi satu populasi user:
+        # tanpa ini learning rate turun ke nol dan center tertinggal
+        self.counts = total * min(1.0, len(self.tags) / total.sum())
+        self.updates += 1
+        self.last_update = {"users": len(rows), "seconds": round(time.perf_counter() - t0, 6), "at": time.time()}
+
+    # --- read ---
+    @property
+    def ready(self):
+        return self.primed and self.centers is not None
+
+    def segment(self, id_tag):
+        row = self.index.get(id_tag)
+        if row is None or not self.ready:
+            return None
+        x = self.features([row])
+        d = self._distances(x)[0]
+        return {
+            "id_tag": id_tag,
+            "segment": int(d.argmin()),
+            "distance": round(float(np.sqrt(d.min())), 4),
+            "features": dict(zip(USER_FEATURES, (round(float(v), 4) for v in x[0]))),
+        }
+
+    def assign_all(self):
+        return nearest(self.centers, self.features())
+
+    def info(self):
+        return {
+            "ready": self.ready,
+            "users": len(self.tags),
+            "model": self.source[0] if isinstance(self.source, tuple) else self.source,  # versi user_kmeans / "online"
+            "centers": self.centers.round(4).tolist() if self.centers is not None else None,
+            "counts": self.counts.astype(int).tolist() if self.counts is not None else None,
+            "features": USER_FEATURES,
+            "updates": self.updates,
+            "pending_users": len(self.dirty),
+            "last_update": self.last_update,
+            "watermark": str(self._watermark) if self._watermark is not None else None,
+        }
+
+    # --- DB ---
+    async def _bootstrap(self, cur):
+        await cur.execute(
+            """
+            SELECT id_tag, COUNT(*) AS sessions,
+                   SUM(TIMESTAMPDIFF(SECOND, start_ts, stop_ts)) / 3600 AS duration,
+                   SUM(meter_stop - meter_start) / 1000 AS kwh,
+                   SUM(HOUR(start_ts)) AS start_hours,
+                   MAX(stop_ts) AS last_stop
+            FROM transactions
+            WHERE stop_ts IS NOT NULL AND meter_stop IS NOT NULL AND id_tag IS NOT NULL
+            GROUP BY id_tag
+            """
+        )
+        for r in await cur.fetchall():
+            row = self._row(r["id_tag"])
+            self.stats[row] = (r["sessions"], float(r["duration"] or 0), float(r["kwh"] or 0), float(r["start_hours"] or 0))
+            if self._watermark is None or r["last_stop"] > self._watermark:
+                self._watermark = r["last_stop"]
+        if self._watermark is None:
+            self._watermark = datetime(1970, 1, 1)  # belum ada sesi selesai: resync ambil semuanya
+
+    async def resync(self):
+        """Bootstrap once, then add sessions stopped since the watermark that no event delivered."""
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cur:
+                if not self.primed:
+                    await self._bootstrap(cur)
+                # mundur STOP_OVERLAP: sesi dengan stop_ts lama yang baru di-commit;
+                # yang sudah masuk di-skip lewat id
+                await cur.execute(
+                    """
+                    SELECT id, id_tag, TIMESTAMPDIFF(SECOND, start_ts, stop_ts) / 3600 AS duration,
+                           (meter_stop - meter_start) / 1000 AS kwh, HOUR(start_ts) AS start_hour,
+                           stop_ts, UNIX_TIMESTAMP(stop_ts) AS stop_epoch
+                    FROM transactions
+                    WHERE stop_ts >= %s - INTERVAL %s SECOND AND meter_stop IS NOT NULL AND id_tag IS NOT NULL
+                    ORDER BY stop_ts
+                    """,
+                    (self._watermark, STOP_OVERLAP),
+                )
+                rows = await cur.fetchall()
+        if not self.primed:
+            # sesi sampai watermark sudah ada di agregat bootstrap
+            for r in rows:
+                if r["stop_ts"] <= self._watermark:
+                    self._tx_seen[r["id"]] = True
+            self.primed = True
+        for r in rows:
+            self.add_session(r["id"], r["id_tag"], float(r["duration"]), float(r["kwh"]), r["start_hour"])
+            if r["stop_ts"] >= self._watermark:
+                self._watermark = r["stop_ts"]
+                self._watermark_ts = float(r["stop_epoch"])
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.resync()
+                self.update()
+            except Exception as e:
+                logger.warning("update segment user gagal: %s", e)
+            await asyncio.sleep(self.interval)
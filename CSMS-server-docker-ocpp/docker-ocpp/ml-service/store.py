@@ -0,0 +1,192 @@
+import asyncio
+import os
+import time
+
+import aiomysql
+import pandas as pd
+
+from preprocess import get_pool, transactions_frame
+
+# ---------------------
+# Feature store
+# ---------------------
+# DataFrame transactions/connectors/users disimpan di memori dan hanya
+# ditambah dengan baris baru sejak watermark terakhir:
+# - transactions: id > id terakhir, plus sesi yang di store masih terbuka
+#   dan di DB sudah di-stop sejak watermark stop_ts (dikurangi
+#   STORE_STOP_OVERLAP detik untuk commit yang terlambat)
+# - connectors  : last_update >= watermark (upsert per cp_id+connector_id)
+# - users       : id > id terakhir
+# Kolom turunan duration/kwh hanya dihitung untuk baris yang baru/berubah.
+# Baris baru disimpan sebagai potongan DataFrame terpisah dan baru
+# digabung (satu concat) saat frame dibaca atau potongannya sudah
+# STORE_MERGE_PARTS, jadi biaya satu sync sebanding dengan delta, bukan
+# dengan panjang history.
+# Sync paling sering sekali per STORE_REFRESH_INTERVAL detik; request
+# di antaranya langsung memakai DataFrame yang ada.
+
+REFRESH_INTERVAL = float(os.getenv("STORE_REFRESH_INTERVAL", "5"))
+STOP_OVERLAP = int(os.getenv("STORE_STOP_OVERLAP", "300"))  # detik
+MERGE_PARTS = int(os.getenv("STORE_MERGE_PARTS", "64"))
+
+
+class _Chunks:
+    """A DataFrame kept as a merged base plus appended delta frames."""
+
+    def __init__(self, ignore_index=False):
+        self.base = pd.DataFrame()
+        self.parts = []
+        self.ignore_index = ignore_index
+
+    def __len__(self):
+        return len(self.base) + sum(len(p) for p in self.parts)
+
+    def append(self, df):
+        self.parts.append(df)
+        if len(self.parts) >= MERGE_PARTS:
+            self.frame()
+
+    def frames(self):
+        return [f for f in (self.base, *self.parts) if not f.empty]
+
+    def frame(self):
+        if self.parts:
+            frames = self.frames()
+            self.base = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=self.ignore_index)
+            self.parts = []
+        return self.base
+
+
+class FeatureStore:
+    def __init__(self, interval=REFRESH_INTERVAL):
+        self.interval = interval
+        self._transactions = _Chunks()
+        self._users = _Chunks(ignore_index=True)
+        self.connectors = pd.DataFrame()
+        self._open = set()  # id sesi yang di store masih terbuka
+        self.last_tx_id = 0
+        self.last_stop_ts = None
+        self.last_user_id = 0
+        self.last_connector_update = None
+        self.synced_at = 0.0
+        self.last_sync = {}
+        self._lock = asyncio.Lock()
+
+    @property
+    def transactions(self):
+        return self._transactions.frame()
+
+    @property
+    def users(self):
+        return self._users.frame()
+
+    def info(self):
+        return {
+            "rows": {
+                "transactions": len(self._transactions),
+                "open_transactions": len(self._open),
+                "connectors": len(self.connectors),
+                "users": len(self._users),
+            },
+            "pending_parts": {"transactions": len(self._transactions.parts), "users": len(self._users.parts)},
+            "watermarks": {
+                "transaction_id": self.last_tx_id,
+                "stop_ts": str(self.last_stop_ts) if self.last_stop_ts is not None else None,
+                "user_id": self.last_user_id,
+                "connector_update": str(self.last_connector_update) if self.last_connector_update is not None else None,
+            },
+            "last_sync": self.last_sync,
+        }
+
+    async def sync(self, force=False):
+        """Pull rows newer than the watermarks; no-op if synced recently."""
+        if not force and time.monotonic() - self.synced_at < self.interval:
+            return
+        async with self._lock:
+            if not force and time.monotonic() - self.synced_at < self.interval:
+                return
+            t0 = time.perf_counter()
+            pool = await get_pool()
+            async with pool.acquire() as conn:
+                async with conn.cursor(aiomysql.DictCursor) as cur:
+                    new_tx, closed_tx = await self._sync_transactions(cur)
+                    changed_conn = await self._sync_connectors(cur)
+                    new_users = await self._sync_users(cur)
+            self.synced_at = time.monotonic()
+            self.last_sync = {
+                "new_transactions": new_tx,
+                "closed_transactions": closed_tx,
+                "changed_connectors": changed_conn,
+                "new_users": new_users,
+                "seconds": round(time.perf_counter() - t0, 4),
+                "at": time.time(),
+            }
+
+    def _advance_stop(self, stop_ts):
+        latest = stop_ts.max()
+        if pd.notna(latest) and (self.last_stop_ts is None or latest > self.last_stop_ts):
+            self.last_stop_ts = latest.to_pydatetime()
+
+    def _close(self, df):
+        # update in place (dtype sama, tanpa realokasi): job inference di
+        # thread lain yang memegang frame ini hanya melihat nilai lama/baru
+        for frame in self._transactions.frames():
+            pos = frame.index.get_indexer(df.index)
+            found = pos >= 0
+            if found.any():
+                frame.loc[df.index[found], df.columns] = df[found]
+        self._open.difference_update(df.index)
+        self._advance_stop(df["stop_ts"])
+
+    async def _sync_transactions(self, cur):
+        # sesi terbuka di store yang di-stop sejak watermark (index stop_ts, id)
+        closed = []
+        if self._open:
+            await cur.execute(
+                """
+                SELECT * FROM transactions
+                WHERE stop_ts >= COALESCE(%s, '1970-01-02') - INTERVAL %s SECOND AND id <= %s
+                """,
+                (self.last_stop_ts, STOP_OVERLAP, self.last_tx_id),
+            )
+            closed = [r for r in await cur.fetchall() if r["id"] in self._open]
+        if closed:
+            self._close(transactions_frame(closed).set_index("id", drop=False))
+
+        await cur.execute("SELECT * FROM transactions WHERE id > %s ORDER BY id", (self.last_tx_id,))
+        rows = await cur.fetchall()
+        if rows:
+            df = transactions_frame(rows).set_index("id", drop=False)
+            self._transactions.append(df)
+            self._open.update(df.index[df["stop_ts"].isna()].tolist())
+            self._advance_stop(df["stop_ts"])
+            self.last_tx_id = int(df["id"].iloc[-1])
+        return len(rows), len(closed)
+
+    async def _sync_connectors(self, cur):
+        if self.last_connector_update is None:
+            await cur.execute("SELECT * FROM connectors")
+        else:
+            # >= supaya update di detik yang sama dengan watermark tidak hilang
+            await cur.execute("SELECT * FROM connectors WHERE last_update >= %s", (self.last_connector_update,))
+        rows = await cur.fetchall()
+        if not rows:
+            return 0
+        df = pd.DataFrame(rows)
+        df["last_update"] = pd.to_datetime(df["last_update"])
+        df = df.set_index(["cp_id", "connector_id"], drop=False)
+        if self.connectors.empty:
+            self.connectors = df
+        else:
+            self.connectors = pd.concat([self.connectors.drop(df.index, errors="ignore"), df])
+        self.last_connector_update = df["last_update"].max().to_pydatetime()
+        return len(rows)
+
+    async def _sync_users(self, cur):
+        await cur.execute("SELECT * FROM users WHERE id > %s ORDER BY id", (self.last_user_id,))
+        rows = await cur.fetchall()
+        if rows:
+            df = pd.DataFrame(rows)
+            self._users.append(df)
+            self.last_user_id = int(df["id"].iloc[-1])
+        return len(rows)
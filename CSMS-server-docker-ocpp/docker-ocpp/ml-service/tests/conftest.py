@@ -0,0 +1,75 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeCursor:
+    """aiomysql DictCursor stand-in: ``handler(sql, args)`` returns the rows of each query."""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.rows = []
+
+    async def execute(self, sql, args=None):
+        await asyncio.sleep(0)  # seperti I/O sungguhan: task lain bisa jalan di sini
+        self.rows = list(self.handler(" ".join(sql.split()), args))
+
+    async def executemany(self, sql, args):
+        self.rows = list(self.handler(" ".join(sql.split()), list(args)))
+
+    async def fetchall(self):
+        return self.rows
+
+    async def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    async def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakePool:
+    def __init__(self, handler):
+        self.handler = handler
+
+    def acquire(self):
+        return self
+
+    def cursor(self, *args):
+        return FakeCursor(self.handler)
+
+    async def begin(self):
+        pass
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+@pytest.fixture
+def fake_pool():
+    def make(handler):
+        pool = FakePool(handler)
+
+        async def get_pool():
+            return pool
+        return get_pool
+    return make
@@ -0,0 +1,48 @@
+import numpy as np
+import pyarrow as pa
+import pytest
+from fastapi.testclient import TestClient
+
+import api
+from batch import ARROW_STREAM
+from compact import CompactKMeans, CompactLinear
+from preprocess import USER_FEATURES
+
+
+@pytest.fixture
+def client():
+    return TestClient(api.app)  # tanpa "with": startup (DB, registry) tidak dijalankan
+
+
+def _users(rows):
+    return {name: [row[i] for row in rows] for i, name in enumerate(USER_FEATURES)}
+
+
+def test_nan_and_inf_become_null(client, monkeypatch):
+    model = CompactLinear(np.array([2.0]), np.array([0.0]))
+    monkeypatch.setattr(api, "load_model", lambda name: model)
+    r = client.post("/optimize/load/batch", content=b'{"duration": [1.5, NaN, Infinity]}')
+    assert r.status_code == 200
+    assert r.json() == {"predicted_kwh": [3.0, None, None]}
+
+    # Arrow membawa NaN apa adanya
+    r = client.post("/optimize/load/batch", content=b'{"duration": [1.0, NaN]}', headers={"Accept": ARROW_STREAM})
+    values = pa.ipc.open_stream(r.content).read_all().column("predicted_kwh").to_pylist()
+    assert values[0] == 2.0 and np.isnan(values[1])
+
+
+def test_users_batch_uses_online_segments(client, monkeypatch):
+    # model lama: center di 0 dan 10; segmen online sudah bergeser ke 10 dan 0
+    model = CompactKMeans(np.array([[0.0] * 6, [10.0] * 6]))
+    monkeypatch.setattr(api, "load_model", lambda name: model)
+    monkeypatch.setattr(api.SEGMENTS, "primed", False)
+    monkeypatch.setattr(api.SEGMENTS, "centers", None)
+    body = _users([[1.0] * 6, [9.0] * 6])
+
+    r = client.post("/analytics/users/batch", json=body)
+    assert r.json() == {"cluster": [0, 1]} and r.headers["X-Segment-Source"] == "model"
+
+    monkeypatch.setattr(api.SEGMENTS, "primed", True)
+    monkeypatch.setattr(api.SEGMENTS, "centers", np.array([[10.0] * 6, [0.0] * 6]))
+    r = client.post("/analytics/users/batch", json=body)
+    assert r.json() == {"cluster": [1, 0]} and r.headers["X-Segment-Source"] == "segments"
@@ -0,0 +1,79 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.cluster import KMeans
+from sklearn.ensemble import IsolationForest
+from sklearn.linear_model import LinearRegression
+from statsmodels.tsa.arima.model import ARIMA
+
+import compact
+from fleet import FleetForecaster
+from registry import load_file
+from train import save_model
+
+RNG = np.random.default_rng(0)
+
+
+def _round_trip(model, tmp_path, name):
+    path = save_model(model, name, str(tmp_path), fmt="npz")
+    assert path.endswith(".npz")
+    return load_file(path)
+
+
+def test_arima(tmp_path):
+    index = pd.date_range("2024-03-01", periods=200, freq="h")
+    series = pd.Series(5 + np.sin(np.arange(200) / 4) + RNG.normal(0, 0.3, 200), index=index)
+    res = ARIMA(series, order=(1, 1, 1)).fit()
+    loaded = _round_trip(res, tmp_path, "availability_arima")
+    assert isinstance(loaded, compact.CompactARIMA)
+    np.testing.assert_allclose(loaded.forecast(24), np.asarray(res.forecast(24)), rtol=1e-9)
+    np.testing.assert_allclose(loaded.apply(series).fittedvalues, res.fittedvalues, rtol=1e-9)
+
+
+def test_fleet(tmp_path):
+    X = RNG.poisson(2, size=(3, 24 * 21)).astype(float)
+    start = datetime(2024, 3, 4)
+    model = FleetForecaster.fit(["CP_1", "CP_2", "CP_3"], X, start)
+    loaded = _round_trip(model, tmp_path, "availability_fleet")
+    assert loaded.cp_ids == model.cp_ids
+    end = start + pd.Timedelta(hours=X.shape[1])
+    np.testing.assert_array_equal(loaded.forecast(end, 24), model.forecast(end, 24))
+    np.testing.assert_array_equal(loaded.one_step(X, start), model.one_step(X, start))
+
+
+def test_linear(tmp_path):
+    X = pd.DataFrame({"duration": RNG.uniform(0, 8, 50)})
+    model = LinearRegression().fit(X, 7 * X["duration"] + 1)
+    loaded = _round_trip(model, tmp_path, "load_lr")
+    np.testing.assert_allclose(loaded.predict(X), model.predict(X))
+
+
+def test_kmeans(tmp_path):
+    X = pd.DataFrame(RNG.normal(size=(60, 6)))
+    model = KMeans(n_clusters=3, random_state=42, n_init=10).fit(X)
+    loaded = _round_trip(model, tmp_path, "user_kmeans")
+    np.testing.assert_array_equal(loaded.predict(X), model.predict(X))
+    assert loaded.score(X) == pytest.approx(model.score(X))
+
+
+def test_isolation_forest(tmp_path):
+    X = pd.DataFrame(RNG.normal(size=(200, 3)))
+    model = IsolationForest(contamination=0.1, random_state=42).fit(X)
+    loaded = _round_trip(model, tmp_path, "maintenance_iforest")
+    np.testing.assert_allclose(loaded.decision_function(X), model.decision_function(X))
+
+
+def test_unsupported_model_falls_back_to_pickle(tmp_path):
+    model = LinearRegression().fit(RNG.normal(size=(20, 1)), RNG.normal(size=(20, 2)))  # coef 2-D
+    path = save_model(model, "load_lr", str(tmp_path), fmt="npz")
+    assert path.endswith(".pkl")
+    np.testing.assert_allclose(load_file(path).coef_, model.coef_)
+
+
+def test_newer_format_rejected(tmp_path, monkeypatch):
+    path = save_model(LinearRegression().fit([[0.0], [1.0]], [0.0, 1.0]), "load_lr", str(tmp_path))
+    monkeypatch.setattr(compact, "FORMAT_VERSION", 0)
+    with pytest.raises(ValueError, match="newer"):
+        load_file(path)
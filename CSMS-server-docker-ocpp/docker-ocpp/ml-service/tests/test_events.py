@@ -0,0 +1,17 @@
+from fastapi.testclient import TestClient
+
+import api
+
+
+def test_failing_consumer_does_not_skip_the_others(monkeypatch, caplog):
+    seen = []
+
+    def broken(event):
+        if event["type"] == "stop":
+            raise RuntimeError("boom")
+
+    monkeypatch.setattr(api, "EVENT_CONSUMERS", [broken, seen.append])
+    r = TestClient(api.app).post("/events", json=[{"type": "stop"}, {"type": "status"}])
+    assert r.json() == {"accepted": 1, "rejected": 1}
+    assert seen == [{"type": "stop"}, {"type": "status"}]  # consumer berikutnya tetap dapat event
+    assert "broken" in caplog.text and "boom" in caplog.text
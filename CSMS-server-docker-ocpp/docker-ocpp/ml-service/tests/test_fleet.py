@@ -0,0 +1,31 @@
+import asyncio
+
+import numpy as np
+import pandas as pd
+
+import train
+from fleet import fit_fleet
+from forecast import FleetForecastCache
+from registry import ModelRegistry
+
+
+def _sessions(hours=24 * 14):
+    start = pd.Timestamp("2024-03-04") + pd.to_timedelta(np.arange(hours), unit="h")
+    return pd.DataFrame({"cp_id": pd.Categorical(["CP_B"] * hours), "start_ts": start})
+
+
+def test_idle_charge_point_gets_zero_row():
+    model, X = fit_fleet(_sessions(), cp_ids=["CP_C", "CP_A"])
+    assert model.cp_ids == ["CP_A", "CP_B", "CP_C"]  # CP dengan sesi tetap ikut
+    assert X[0].sum() == 0 and X[1].sum() == X.shape[1]
+    forecast = model.forecast(model.end, 24)
+    assert (forecast[0] == 0).all() and (forecast[1] > 0.5).all()
+
+
+def test_idle_charge_point_is_forecast(tmp_path):
+    asyncio.run(train.train_fleet_model(str(tmp_path), _sessions(), cp_ids=["CP_A", "CP_B"]))
+    registry = ModelRegistry(str(tmp_path))
+    registry.refresh()
+    start, values = FleetForecastCache(registry).get(24, "CP_A")
+    assert values == [0.0] * 24
+    assert FleetForecastCache(registry).get(24, "CP_UNKNOWN")[1] is None
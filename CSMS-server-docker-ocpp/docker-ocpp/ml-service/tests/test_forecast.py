@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import forecast
+from forecast import ForecastCache
+
+T0 = datetime(2024, 3, 1, 8)
+
+
+class _Model:
+    """Forecast k = level + k (k = 1.. after the training end)."""
+
+    def __init__(self, level, train_end=T0):
+        self.level = level
+        self.train_end = train_end
+        self.calls = 0
+
+    def forecast(self, steps=1):
+        self.calls += 1
+        return self.level + np.arange(1, steps + 1, dtype=float)
+
+
+class _Registry:
+    def __init__(self):
+        self.models = {}
+        self.listeners = []
+
+    def get(self, name):
+        entry = self.models.get(name)
+        return entry["model"] if entry else None
+
+    def swap(self, name, model, version):
+        self.models = {**self.models, name: {"model": model, "version": version, "stamp": (version, 0)}}
+        for listener in self.listeners:
+            listener(name)
+
+
+def _at(monkeypatch, hour):
+    monkeypatch.setattr(forecast, "current_hour", lambda: hour)
+
+
+def test_cached_within_hour_and_recomputed_on_swap(monkeypatch):
+    _at(monkeypatch, T0)
+    registry = _Registry()
+    cache = ForecastCache(registry, horizon=48)
+    assert cache.get(24) is None  # belum ada model
+
+    first = _Model(0)
+    registry.swap("availability_arima", first, "v1")
+    start, values = cache.get(24)
+    cache.get(48)
+    assert first.calls == 1 and start == T0 + timedelta(hours=1) and values[:2] == [1.0, 2.0]
+
+    registry.swap("availability_arima", _Model(100), "v2")  # listener: hitung ulang langsung
+    assert cache.entry["version"][0] == "v2"
+    assert cache.get(24)[1][0] == 101.0
+
+
+def test_new_hour_skips_elapsed_hours(monkeypatch):
+    _at(monkeypatch, T0)
+    registry = _Registry()
+    model = _Model(0)
+    registry.swap("availability_arima", model, "v1")
+    cache = ForecastCache(registry, horizon=48)
+    cache.refresh()
+
+    _at(monkeypatch, T0 + timedelta(hours=3))
+    start, values = cache.get(24)
+    assert model.calls == 2
+    assert start == T0 + timedelta(hours=4) and values[0] == 4.0  # jam 1..3 sudah lewat
+
+
+def test_beyond_horizon_not_stored(monkeypatch):
+    _at(monkeypatch, T0)
+    registry = _Registry()
+    registry.swap("availability_arima", _Model(0), "v1")
+    cache = ForecastCache(registry, horizon=24)
+    _, values = cache.get(72)
+    assert len(values) == 72 and len(cache.entry["values"]) == 24
@@ -0,0 +1,64 @@
+import asyncio
+import time
+
+import health
+
+
+def _db(transactions, connectors):
+    def handler(sql, args):
+        if "FROM charge_points" in sql:
+            return [{"id": "CP_1", "site_id": "north"}]
+        if "MAX(id)" in sql:
+            return [{"id": 0}]
+        if "FROM connectors" in sql:
+            return connectors
+        if "FROM transactions" in sql:
+            return [t for t in transactions if t["id"] > args[0]]
+        raise AssertionError(sql)
+    return handler
+
+
+def test_resync_recovers_dropped_event(monkeypatch, fake_pool):
+    now = time.time()
+    transactions = [{"id": 1, "cp_id": "CP_1", "ts": now - 600}]
+    connectors = [{"cp_id": "CP_1", "connector_id": 1, "status": "Available", "error_code": "NoError"}]
+    monkeypatch.setattr(health, "get_pool", fake_pool(_db(transactions, connectors)))
+    engine = health.HealthEngine(window_hours=1, bucket_minutes=15)
+    asyncio.run(engine.resync())
+    assert engine.score(cp_id="CP_1")["recent_transactions"] == 1
+
+    # transaksi 2 dan 3 masuk DB; event 2 hilang di forwarder, event 3 sampai
+    transactions += [{"id": 2, "cp_id": "CP_1", "ts": now - 300}, {"id": 3, "cp_id": "CP_1", "ts": now - 200}]
+    engine.handle({"type": "start", "transaction_id": 3, "cp_id": "CP_1", "ts": now - 200})
+    assert engine.score(cp_id="CP_1")["recent_transactions"] == 2
+
+    asyncio.run(engine.resync())
+    assert engine.score(cp_id="CP_1")["recent_transactions"] == 3
+    assert engine.score(site_id="north")["recent_transactions"] == 3
+    # resync berikutnya tidak menghitung ulang
+    asyncio.run(engine.resync())
+    assert engine.score()["recent_transactions"] == 3
+
+
+def test_late_commit_below_watermark_is_counted(monkeypatch, fake_pool):
+    now = time.time()
+    transactions = [{"id": 5, "cp_id": "CP_1", "ts": now - 60}]
+    connectors = [{"cp_id": "CP_1", "connector_id": 1, "status": "Charging", "error_code": "NoError"}]
+    monkeypatch.setattr(health, "get_pool", fake_pool(_db(transactions, connectors)))
+    engine = health.HealthEngine(window_hours=1, bucket_minutes=15)
+    asyncio.run(engine.resync())
+    transactions.append({"id": 4, "cp_id": "CP_1", "ts": now - 30})  # id lebih kecil, commit belakangan
+    asyncio.run(engine.resync())
+    assert engine.score(cp_id="CP_1")["recent_transactions"] == 2
+
+
+def test_window_counts_connector_time():
+    engine = health.HealthEngine(window_hours=1, bucket_minutes=15)
+    t0 = 1_000_000 * 900.0
+    engine.fleet = health._Window(engine.n_buckets, engine.bucket_seconds, t0)
+    engine.set_connector("CP_1", 1, "Available", "NoError", t0)
+    engine.set_connector("CP_1", 1, "Faulted", "GroundFailure", t0 + 1800)
+    engine.fleet.advance(t0 + 3600)
+    summary = engine.fleet.summary()
+    assert summary["availability"] == 0.5
+    assert summary["errors"] == 0.5
@@ -0,0 +1,46 @@
+import os
+
+import metrics
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_copies_in_sync():
+    # satu implementasi, disalin karena tiap image dibangun dari folder service-nya sendiri
+    with open(os.path.join(SERVICE_DIR, "metrics.py")) as a, open(os.path.join(SERVICE_DIR, "..", "api-service", "metrics.py")) as b:
+        assert a.read() == b.read()
+
+
+class _Pool:
+    size, freesize, maxsize = 4, 1, 10
+
+
+def test_pool_stats():
+    sampler = metrics.MetricsSampler("ml-service", pool_getter=lambda: {"primary": _Pool()})
+    stats = sampler.self_stats(loop_lag=0.002)
+    assert stats["db_pool"] == {"primary": {"size": 4, "free": 1, "used": 3, "max": 10}}
+    assert stats["loop_lag_ms"] == 2.0
+    assert metrics.MetricsSampler("x", pool_getter=lambda: None).self_stats(0)["db_pool"] is None
+
+
+def test_history_filters():
+    sampler = metrics.MetricsSampler("ml-service", history=3)
+    for ts in (1, 2, 3, 4):
+        sampler.samples.append({"timestamp": ts})
+    assert [s["timestamp"] for s in sampler.history()] == [2, 3, 4]
+    assert [s["timestamp"] for s in sampler.history(limit=1)] == [4]
+    assert [s["timestamp"] for s in sampler.history(since=2)] == [3, 4]
+
+
+def test_history_endpoint_bounds(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import api
+
+    sampler = metrics.MetricsSampler("ml-service", history=3)
+    sampler.samples.extend({"timestamp": t} for t in (1, 2, 3))
+    monkeypatch.setattr(api, "SAMPLER", sampler)
+    client = TestClient(api.app)
+    assert [s["timestamp"] for s in client.get("/system/usage/history", params={"limit": 2, "since": 1}).json()] == [2, 3]
+    for params in ({"limit": 0}, {"limit": 5001}, {"since": -1}):
+        assert client.get("/system/usage/history", params=params).status_code == 422
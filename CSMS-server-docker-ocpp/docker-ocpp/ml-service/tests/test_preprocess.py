@@ -0,0 +1,55 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+import preprocess
+
+T0 = datetime(2024, 3, 1, 8)
+
+
+def _rows(n):
+    # (cp_id, connector_id, id_tag, meter_start, meter_stop, start_ts, stop_ts); tag baru muncul di chunk berikutnya
+    for i in range(n):
+        start = T0 + timedelta(hours=i)
+        stop = start + timedelta(minutes=30) if i % 4 else None
+        yield (f"CP_{i % 3}", 1, f"TAG-{i // 2}", 1000, 3500 if stop else None, start, stop)
+
+
+def _load(monkeypatch, fake_pool, rows):
+    executed = []
+
+    def handler(sql, args):
+        executed.append(sql)
+        return list(rows)
+
+    monkeypatch.setattr(preprocess, "get_pool", fake_pool(handler))
+    monkeypatch.setattr(preprocess, "LOAD_CHUNK", 3)
+    return asyncio.run(preprocess.load_transactions()), executed
+
+
+def test_chunks_share_category_codes(monkeypatch, fake_pool):
+    df, executed = _load(monkeypatch, fake_pool, _rows(10))
+    assert executed == ["SELECT cp_id, connector_id, id_tag, meter_start, meter_stop, start_ts, stop_ts FROM transactions ORDER BY start_ts"]
+    assert len(df) == 10
+    assert isinstance(df["id_tag"].dtype, pd.CategoricalDtype)
+    assert list(df["id_tag"].cat.categories) == [f"TAG-{i}" for i in range(5)]  # satu mapping untuk semua chunk
+    assert list(df["id_tag"].astype(str)) == [f"TAG-{i // 2}" for i in range(10)]
+    assert list(df["cp_id"].astype(str)) == [f"CP_{i % 3}" for i in range(10)]
+    assert df["duration"].dtype == "float32" and df["kwh"].dtype == "float32"
+    assert df["kwh"].iloc[1] == pytest.approx(2.5) and pd.isna(df["kwh"].iloc[0])
+    assert df["duration"].iloc[1] == pytest.approx(0.5)
+
+
+def test_empty_table(monkeypatch, fake_pool):
+    df, _ = _load(monkeypatch, fake_pool, [])
+    assert df.empty
+
+
+def test_memory_budget(monkeypatch, fake_pool):
+    monkeypatch.setattr(preprocess, "MEMORY_BUDGET_MB", 1)
+    with pytest.raises(preprocess.MemoryBudgetExceeded, match="load: RSS"):
+        _load(monkeypatch, fake_pool, _rows(10))
+    monkeypatch.setattr(preprocess, "MEMORY_BUDGET_MB", 0)  # 0 = tanpa batas
+    preprocess.check_memory_budget("train")
@@ -0,0 +1,63 @@
+import os
+import pickle
+
+import numpy as np
+import pytest
+from sklearn.linear_model import LinearRegression
+
+from compact import CompactLinear
+from registry import ModelRegistry, model_file
+from train import save_model
+
+
+def _lr(coef):
+    return LinearRegression().fit([[0.0], [1.0]], [0.0, coef])
+
+
+def _bump(path, by):
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + by))  # mtime baru tanpa menunggu
+
+
+def test_hot_reload_swaps_entry(tmp_path):
+    path = save_model(_lr(2.0), "load_lr", str(tmp_path))
+    registry = ModelRegistry(str(tmp_path))
+    swapped = []
+    registry.listeners.append(swapped.append)
+    assert registry.refresh() == ["load_lr"]
+    before = registry.models
+    old = registry.get("load_lr")
+
+    assert registry.refresh() == []  # file tidak berubah: tidak di-load ulang
+    save_model(_lr(3.0), "load_lr", str(tmp_path))
+    _bump(path, 10**9)
+    assert registry.refresh() == ["load_lr"] and swapped == ["load_lr", "load_lr"]
+    assert registry.models is not before and before["load_lr"]["model"] is old  # request lama tetap pegang model lama
+    assert registry.get("load_lr").predict(np.array([[1.0]]))[0] == pytest.approx(3.0)
+
+
+def test_npz_preferred_over_pkl(tmp_path):
+    with open(tmp_path / "load_lr.pkl", "wb") as f:
+        pickle.dump(_lr(1.0), f)
+    save_model(_lr(5.0), "load_lr", str(tmp_path), fmt="npz")
+    assert not (tmp_path / "load_lr.pkl").exists()  # save_model membuang format lain
+
+    with open(tmp_path / "load_lr.pkl", "wb") as f:  # pickle lama yang tertinggal
+        pickle.dump(_lr(1.0), f)
+    registry = ModelRegistry(str(tmp_path))
+    registry.refresh()
+    assert model_file(str(tmp_path), "load_lr").endswith(".npz")
+    assert isinstance(registry.get("load_lr"), CompactLinear)
+    assert registry.info()["load_lr"]["path"].endswith(".npz")
+
+
+def test_broken_file_keeps_previous_model(tmp_path):
+    path = save_model(_lr(2.0), "load_lr", str(tmp_path))
+    (tmp_path / "load_lr.version").write_text("v1\n")
+    registry = ModelRegistry(str(tmp_path))
+    registry.refresh()
+    with open(path, "wb") as f:
+        f.write(b"half written")
+    assert registry.refresh() == []
+    assert registry.get("load_lr").predict(np.array([[1.0]]))[0] == pytest.approx(2.0)
+    assert registry.info()["load_lr"]["version"] == "v1"
@@ -0,0 +1,95 @@
+import asyncio
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LinearRegression
+
+import preprocess
+import retrain
+import train
+from registry import load_file, model_file
+
+
+def _transactions(hours=120, drift_after=None):
+    """One session per hour; kWh = 2 x duration, 5 x duration from ``drift_after`` on."""
+    start = pd.Timestamp("2024-03-01") + pd.to_timedelta(np.arange(hours), unit="h")
+    duration = np.linspace(0.5, 6, hours)
+    factor = np.where(np.arange(hours) >= (drift_after or hours), 5.0, 2.0)
+    return pd.DataFrame({
+        "id": np.arange(1, hours + 1), "cp_id": "CP_1", "id_tag": "TAG",
+        "start_ts": start, "duration": duration, "kwh": duration * factor,
+    })
+
+
+def _lr(coef):
+    model = LinearRegression()
+    model.fit(pd.DataFrame({"duration": [0.0, 1.0]}), [0.0, coef])
+    return model
+
+
+def _setup(monkeypatch, df_tx):
+    async def rows(df):
+        return df
+
+    async def train_all(model_dir, df_tx):
+        await train.train_load_model(model_dir, df_tx)
+
+    async def close_pool():
+        pass
+
+    monkeypatch.setattr(preprocess, "load_transactions", lambda: rows(df_tx))
+    monkeypatch.setattr(preprocess, "load_connectors", lambda: rows(pd.DataFrame()))
+    monkeypatch.setattr(preprocess, "load_users", lambda: rows(pd.DataFrame()))
+    monkeypatch.setattr(preprocess, "load_charge_point_ids", lambda: rows(["CP_1"]))
+    monkeypatch.setattr(preprocess, "close_pool", close_pool)
+    monkeypatch.setattr(train, "train_all", train_all)
+    monkeypatch.setattr(retrain, "SCORERS", {"load_lr": retrain._score_load})
+
+
+def test_split_holdout():
+    df = _transactions(hours=100)
+    train_tx, cutoff = retrain.split_holdout(df, hours=48)
+    assert cutoff == pd.Timestamp("2024-03-01") + pd.Timedelta(hours=52)
+    assert len(train_tx) == 52 and (train_tx["start_ts"] < cutoff).all()
+    assert retrain.split_holdout(df.iloc[:0])[1] is None
+
+
+def test_accept():
+    assert retrain.accept(1.0, 1.0, tolerance=0.1)
+    assert retrain.accept(1.1, 1.0, tolerance=0.1)
+    assert not retrain.accept(1.2, 1.0, tolerance=0.1)
+    assert retrain.accept(5.0, None)  # tidak ada model lama
+    assert retrain.accept(None, 1.0)  # tidak bisa dinilai (mis. maintenance)
+    assert not retrain.accept(math.inf, None)  # kandidat gagal dinilai
+
+
+def test_candidate_scored_on_holdout_and_refit(monkeypatch, tmp_path):
+    # pola berubah di 48 jam terakhir: kandidat dari data lama lebih buruk dari model 5x
+    df = _transactions(hours=120, drift_after=72)
+    _setup(monkeypatch, df)
+    train.save_model(_lr(5.0), "load_lr", str(tmp_path))
+
+    report = asyncio.run(retrain._retrain(str(tmp_path)))
+    result = report["models"]["load_lr"]
+    assert result["status"] == "rejected"
+    assert result["score_old"] < 1e-6 < result["score_new"]
+    assert load_file(model_file(str(tmp_path), "load_lr")).coef[0] == pytest.approx(5.0)
+
+    # model lama buruk: kandidat lolos, lalu dilatih ulang dengan holdout ikut
+    train.save_model(_lr(0.1), "load_lr", str(tmp_path))
+    result = asyncio.run(retrain._retrain(str(tmp_path)))["models"]["load_lr"]
+    assert result["status"] == "published" and result["refit"]
+    candidate_coef = LinearRegression().fit(df[["duration"]][:72], df["kwh"][:72]).coef_[0]
+    published = load_file(model_file(str(tmp_path), "load_lr")).coef[0]
+    assert abs(candidate_coef - 2.0) < 1e-6 and published > candidate_coef + 0.5
+
+
+def test_unreadable_current_model_does_not_block(monkeypatch, tmp_path):
+    _setup(monkeypatch, _transactions())
+    (tmp_path / "load_lr.npz").write_bytes(b"not a model")
+
+    result = asyncio.run(retrain._retrain(str(tmp_path)))["models"]["load_lr"]
+    assert result["status"] == "published" and result["score_old"] is None
+    assert load_file(model_file(str(tmp_path), "load_lr")).coef[0] > 1.9
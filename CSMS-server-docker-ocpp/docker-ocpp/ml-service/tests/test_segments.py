@@ -0,0 +1,105 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+import segments
+from segments import UserSegments
+
+T0 = datetime(2024, 3, 1, 8)
+
+
+class _Registry:
+    models = {}
+
+    def get(self, name):
+        raise KeyError(name)
+
+
+class _Db:
+    """transactions table: bootstrap GROUP BY and the resync range query on ``stop_ts``."""
+
+    def __init__(self):
+        self.rows = []
+        self.args = []
+
+    def add(self, tx_id, id_tag, stop_ts, hours=1.0, kwh=5.0):
+        start = stop_ts - timedelta(hours=hours)
+        self.rows.append({"id": tx_id, "id_tag": id_tag, "start_ts": start, "stop_ts": stop_ts, "hours": hours, "kwh": kwh})
+
+    def __call__(self, sql, args):
+        if "GROUP BY id_tag" in sql:
+            out = {}
+            for r in self.rows:
+                agg = out.setdefault(r["id_tag"], {"id_tag": r["id_tag"], "sessions": 0, "duration": 0.0, "kwh": 0.0, "start_hours": 0, "last_stop": r["stop_ts"]})
+                agg["sessions"] += 1
+                agg["duration"] += r["hours"]
+                agg["kwh"] += r["kwh"]
+                agg["start_hours"] += r["start_ts"].hour
+                agg["last_stop"] = max(agg["last_stop"], r["stop_ts"])
+            return list(out.values())
+        assert "stop_ts >= %s - INTERVAL %s SECOND" in sql
+        self.args.append(args)
+        since = args[0] - timedelta(seconds=args[1])
+        return [
+            {"id": r["id"], "id_tag": r["id_tag"], "duration": r["hours"], "kwh": r["kwh"], "start_hour": r["start_ts"].hour,
+             "stop_ts": r["stop_ts"], "stop_epoch": r["stop_ts"].timestamp()}
+            for r in sorted(self.rows, key=lambda r: r["stop_ts"]) if r["stop_ts"] >= since
+        ]
+
+
+def test_resync_picks_up_late_commits_once(monkeypatch, fake_pool):
+    db = _Db()
+    db.add(1, "A", T0)
+    db.add(2, "B", T0 + timedelta(minutes=10))
+    monkeypatch.setattr(segments, "get_pool", fake_pool(db))
+    seg = UserSegments(_Registry())
+
+    asyncio.run(seg.resync())
+    assert seg.primed and db.args[-1] == (T0 + timedelta(minutes=10), segments.STOP_OVERLAP)
+    assert seg.stats[seg.index["A"], segments.SESSIONS] == 1 and seg.stats[seg.index["B"], segments.SESSIONS] == 1
+
+    # sesi baru, plus satu yang di-commit terlambat dengan stop_ts sebelum watermark
+    db.add(3, "A", T0 + timedelta(minutes=20))
+    db.add(4, "B", T0 + timedelta(minutes=5))
+    asyncio.run(seg.resync())
+    asyncio.run(seg.resync())  # jendela overlap yang sama tidak dihitung dua kali
+    assert seg.stats[seg.index["A"], segments.SESSIONS] == 2
+    assert seg.stats[seg.index["B"], segments.SESSIONS] == 2
+    assert seg.stats[seg.index["B"], segments.KWH] == pytest.approx(10.0)
+    assert seg._watermark == T0 + timedelta(minutes=20)  # tidak mundur karena overlap
+
+
+def test_mini_batch_moves_only_touched_centers():
+    seg = UserSegments(_Registry())
+    for i, (tag, hours) in enumerate([("A", 1.0), ("B", 1.2), ("C", 8.0), ("D", 8.4)]):
+        seg.add_session(i, tag, hours, hours * 2, 10)
+    seg.primed = True
+    seg.update()  # tanpa model: seed k-means++ dari agregat
+    assert seg.source == "online" and not seg.dirty
+    before, counts = seg.centers.copy(), seg.counts.copy()
+    assert counts.sum() == 4
+
+    seg.add_session(10, "A", 1.0, 2.0, 10)
+    seg.update()
+    x = seg.features([seg.index["A"]])[0]
+    c = segments.nearest(before, x[None])[0]
+    expected = (before[c] * counts[c] + x) / (counts[c] + 1)  # learning rate 1 / jumlah sampel
+    np.testing.assert_allclose(seg.centers[c], expected)
+    np.testing.assert_array_equal(np.delete(seg.centers, c, axis=0), np.delete(before, c, axis=0))
+    assert seg.counts.sum() == pytest.approx(len(seg.tags))  # memori dibatasi satu populasi
+    assert seg.updates == 1 and seg.last_update["users"] == 1
+
+    seg.update()  # tidak ada yang berubah: center tetap
+    assert seg.updates == 1
+
+
+def test_stop_event_without_start_is_skipped():
+    seg = UserSegments(_Registry())
+    seg.primed = True
+    event = {"type": "stop", "ts": 1709290000.0, "transaction_id": 1, "id_tag": "A", "meter_start": 0, "meter_stop": 2000}
+    seg.handle({**event, "start_ts": None})
+    assert seg.tags == []
+    seg.handle({**event, "start_ts": 1709290000.0 - 3600})
+    assert seg.stats[seg.index["A"], segments.DURATION] == pytest.approx(1.0)
@@ -0,0 +1,84 @@
+import asyncio
+from datetime import datetime
+
+import pandas as pd
+
+import store
+
+
+def _tx(i, start_h, stop_h=None, kwh=None):
+    start = datetime(2024, 3, 1, start_h)
+    return {
+        "id": i, "cp_id": "CP_1", "connector_id": 1, "id_tag": f"TAG-{i}",
+        "meter_start": 0, "meter_stop": int(kwh * 1000) if kwh is not None else None,
+        "start_ts": start, "stop_ts": datetime(2024, 3, 1, stop_h) if stop_h is not None else None,
+    }
+
+
+class _Db:
+    def __init__(self, transactions):
+        self.transactions = transactions
+        self.queries = []
+
+    def __call__(self, sql, args):
+        self.queries.append(sql)
+        if "FROM transactions WHERE id >" in sql:
+            return [dict(t) for t in self.transactions if t["id"] > args[0]]
+        if "FROM transactions WHERE stop_ts >=" in sql:
+            floor = (args[0] or datetime(1970, 1, 2)) - pd.Timedelta(seconds=args[1])
+            return [dict(t) for t in self.transactions if t["stop_ts"] and t["stop_ts"] >= floor and t["id"] <= args[2]]
+        return []
+
+
+def _sync(s):
+    asyncio.run(s.sync(force=True))
+
+
+def test_incremental_sync(monkeypatch, fake_pool):
+    db = _Db([_tx(1, 8, 9, 7.0), _tx(2, 10), _tx(3, 11, 12, 5.0)])
+    monkeypatch.setattr(store, "get_pool", fake_pool(db))
+    s = store.FeatureStore()
+    _sync(s)
+    assert s._open == {2} and s.last_tx_id == 3
+    assert s.last_stop_ts == datetime(2024, 3, 1, 12)
+
+    # sesi 2 di-stop, sesi 4 baru (masih terbuka di potongan delta)
+    db.transactions[1] = _tx(2, 10, 13, 11.0)
+    db.transactions.append(_tx(4, 14))
+    _sync(s)
+    assert s.last_sync["new_transactions"] == 1 and s.last_sync["closed_transactions"] == 1
+    assert s._open == {4}
+    assert not any("id IN" in q for q in db.queries)  # tidak ada re-query semua sesi terbuka
+
+    # sesi 4 di-stop selagi masih di potongan yang belum digabung
+    assert len(s._transactions.parts) == 2
+    db.transactions[3] = _tx(4, 14, 15, 3.0)
+    _sync(s)
+    assert not s._open
+
+    df = s.transactions
+    assert list(df["id"]) == [1, 2, 3, 4]
+    assert list(df["kwh"]) == [7.0, 11.0, 5.0, 3.0]
+    assert list(df["duration"]) == [1.0, 3.0, 1.0, 1.0]
+    assert s._transactions.parts == []
+
+
+def test_late_stop_within_overlap(monkeypatch, fake_pool):
+    db = _Db([_tx(1, 8), _tx(2, 9, 12, 1.0)])
+    monkeypatch.setattr(store, "get_pool", fake_pool(db))
+    s = store.FeatureStore()
+    _sync(s)
+    # stop_ts 11:58 < watermark 12:00, tapi di dalam overlap 300 detik
+    db.transactions[0] = dict(_tx(1, 8, 11, 2.0), stop_ts=datetime(2024, 3, 1, 11, 58))
+    _sync(s)
+    assert not s._open
+    assert s.transactions.loc[1, "kwh"] == 2.0
+
+
+def test_parts_merged_after_limit(monkeypatch, fake_pool):
+    monkeypatch.setattr(store, "MERGE_PARTS", 3)
+    chunks = store._Chunks(ignore_index=True)
+    for i in range(5):
+        chunks.append(pd.DataFrame({"id": [i]}))
+    assert len(chunks.parts) == 2 and len(chunks.base) == 3 and len(chunks) == 5
+    assert list(chunks.frame()["id"]) == [0, 1, 2, 3, 4]
@@ -0,0 +1,39 @@
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import api
+from compact import CompactLinear
+from workers import Overloaded, WorkerPool
+
+
+def test_queue_limit_and_endpoint_cap():
+    release = threading.Event()
+
+    async def run():
+        pool = WorkerPool(threads=2, queue_limit=2, limits={"heavy": 1})
+        first = asyncio.create_task(pool.run("heavy", release.wait))
+        second = asyncio.create_task(pool.run("heavy", release.wait))
+        await asyncio.sleep(0.05)
+        stats = dict(pool.stats["heavy"])
+        with pytest.raises(Overloaded):
+            await pool.run("cheap", lambda: 1)  # antrian penuh: ditolak, tidak menunggu
+        release.set()
+        await asyncio.gather(first, second)
+        return stats, pool.info()
+
+    stats, info = asyncio.run(run())
+    assert stats["running"] == 1 and stats["waiting"] == 1  # cap 1 per endpoint
+    assert info["pending"] == 0
+    assert info["endpoints"]["heavy"]["completed"] == 2 and info["endpoints"]["cheap"]["rejected"] == 1
+
+
+def test_full_queue_is_503(monkeypatch):
+    monkeypatch.setattr(api, "WORKERS", WorkerPool(threads=1, queue_limit=0))
+    monkeypatch.setattr(api, "load_model", lambda name: CompactLinear(np.array([2.0]), np.array([0.0])))
+    r = TestClient(api.app).post("/optimize/load/batch", json={"duration": [1.0]})
+    assert r.status_code == 503 and r.headers["Retry-After"] == "1"
+    assert r.json() == {"error": "Inference queue full", "endpoint": "load_batch"}
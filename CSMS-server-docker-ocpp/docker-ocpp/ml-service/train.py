@@ -1,59 +1,89 @@
 import asyncio
 import pickle
 import os
-from preprocess import load_transactions, load_connectors, load_users, prepare_time_series, prepare_anomaly_data, prepare_user_clusters
+from preprocess import load_transactions, load_connectors, load_users, load_charge_point_ids, prepare_time_series, prepare_anomaly_data, prepare_user_clusters, check_memory_budget
 from sklearn.ensemble import IsolationForest
 from sklearn.cluster import KMeans
 from statsmodels.tsa.arima.model import ARIMA
 from sklearn.linear_model import LinearRegression
 import pandas as pd
+import compact
+from fleet import fit_fleet
+from registry import drop_other_formats
 
-MODEL_DIR = 'models'
-os.makedirs(MODEL_DIR, exist_ok=True)
+MODEL_DIR = os.getenv("MODEL_DIR", "models")
+MODEL_FORMAT = os.getenv("MODEL_FORMAT", "npz")  # npz (compact.py) atau pickle
 
-async def train_availability_model():
+def save_model(model, name, model_dir=MODEL_DIR, fmt=None):
+    """Write to a temp file, then rename: readers never see a half-written model.
+
+    Uses the compact .npz format when the model type supports it and
+    MODEL_FORMAT is ``npz``; pickle otherwise.
+    """
+    os.makedirs(model_dir, exist_ok=True)
+    base = os.path.join(model_dir, name)
+    if (fmt or MODEL_FORMAT) == 'npz' and compact.save(model, base + '.npz.tmp'):
+        path = base + '.npz'
+    else:
+        path = base + '.pkl'
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(model, f)
+    os.replace(path + '.tmp', path)
+    drop_other_formats(path)
+    return path
+
+async def train_availability_model(model_dir=MODEL_DIR, df_tx=None):
     """Train ARIMA for availability/demand forecasting."""
-    df_tx = await load_transactions()
+    df_tx = await load_transactions() if df_tx is None else df_tx
     ts = prepare_time_series(df_tx)
     if ts.empty or len(ts) < 10:
         print("Not enough data for ARIMA")
         return
     model = ARIMA(ts['transactions'], order=(1,1,1))  # Simple ARIMA
     model_fit = model.fit()
-    with open(os.path.join(MODEL_DIR, 'availability_arima.pkl'), 'wb') as f:
-        pickle.dump(model_fit, f)
+    save_model(model_fit, 'availability_arima', model_dir)
     print("Availability model trained")
 
-async def train_maintenance_model():
+async def train_fleet_model(model_dir=MODEL_DIR, df_tx=None, cp_ids=None):
+    """Fit per-charge-point demand models for the whole fleet in one pass."""
+    df_tx = await load_transactions() if df_tx is None else df_tx
+    # semua CP terdaftar, juga yang belum pernah dipakai: tetap dapat forecast
+    cp_ids = await load_charge_point_ids() if cp_ids is None else cp_ids
+    model, X = fit_fleet(df_tx, cp_ids=cp_ids)
+    if model is None or X.shape[1] < 48:
+        print("Not enough data for per-CP forecasting")
+        return
+    save_model(model, 'availability_fleet', model_dir)
+    print(f"Fleet model trained ({len(model.cp_ids)} charge points, {X.shape[1]} hours)")
+
+async def train_maintenance_model(model_dir=MODEL_DIR, df_conn=None):
     """Train Isolation Forest for anomaly detection."""
-    df_conn = await load_connectors()
+    df_conn = await load_connectors() if df_conn is None else df_conn
     X = prepare_anomaly_data(df_conn)
     if X.empty or len(X) < 10:
         print("Not enough data for Isolation Forest")
         return
     model = IsolationForest(contamination=0.1, random_state=42)  # Low contamination for anomalies
     model.fit(X)
-    with open(os.path.join(MODEL_DIR, 'maintenance_iforest.pkl'), 'wb') as f:
-        pickle.dump(model, f)
+    save_model(model, 'maintenance_iforest', model_dir)
     print("Maintenance model trained")
 
-async def train_user_model():
+async def train_user_model(model_dir=MODEL_DIR, df_tx=None, df_users=None):
     """Train K-Means for user clustering."""
-    df_tx = await load_transactions()
-    df_users = await load_users()
+    df_tx = await load_transactions() if df_tx is None else df_tx
+    df_users = await load_users() if df_users is None else df_users
     X = prepare_user_clusters(df_tx, df_users)
     if X.empty or len(X) < 3:
         print("Not enough data for K-Means")
         return
     model = KMeans(n_clusters=min(3, len(X)), random_state=42)  # Few clusters
     model.fit(X)
-    with open(os.path.join(MODEL_DIR, 'user_kmeans.pkl'), 'wb') as f:
-        pickle.dump(model, f)
+    save_model(model, 'user_kmeans', model_dir)
     print("User model trained")
 
-async def train_load_model():
+async def train_load_model(model_dir=MODEL_DIR, df_tx=None):
     """Train Linear Regression for load optimization."""
-    df_tx = await load_transactions()
+    df_tx = await load_transactions() if df_tx is None else df_tx
     if df_tx.empty:
         print("No data for load model")
         return
@@ -65,15 +95,17 @@ async def train_load_model():
         return
     model = LinearRegression()
     model.fit(X, y)
-    with open(os.path.join(MODEL_DIR, 'load_lr.pkl'), 'wb') as f:
-        pickle.dump(model, f)
+    save_model(model, 'load_lr', model_dir)
     print("Load model trained")
 
-async def train_all():
-    await train_availability_model()
-    await train_maintenance_model()
-    await train_user_model()
-    await train_load_model()
+async def train_all(model_dir=MODEL_DIR, df_tx=None):
+    # transaksi di-load sekali untuk semua model (dulu sekali per model)
+    if df_tx is None:
+        df_tx = await load_transactions()
+    for train in (train_availability_model, train_fleet_model, train_user_model, train_load_model):
+        await train(model_dir, df_tx)
+        check_memory_budget(train.__name__)
+    await train_maintenance_model(model_dir)
     print("All models trained")
 
 if __name__ == "__main__":
@@ -0,0 +1,85 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# ---------------------
+# Inference worker pool
+# ---------------------
+# pandas/sklearn dijalankan di thread pool terbatas, bukan langsung di
+# event loop, supaya satu request berat tidak menahan request lain
+# (numpy/sklearn melepas GIL di bagian beratnya). Batas:
+# - INFERENCE_QUEUE : total job yang menunggu + berjalan; lebih dari itu
+#                     request langsung ditolak (503) daripada antre lama
+# - per endpoint    : berapa job endpoint itu boleh berjalan bersamaan,
+#                     sehingga endpoint berat tidak memonopoli semua thread
+# INFERENCE_THREADS=0 menjalankan job inline (untuk perbandingan benchmark).
+
+THREADS = int(os.getenv("INFERENCE_THREADS", str(min(4, os.cpu_count() or 1))))
+QUEUE_LIMIT = int(os.getenv("INFERENCE_QUEUE", "32"))
+ENDPOINT_CONCURRENCY = int(os.getenv("INFERENCE_ENDPOINT_CONCURRENCY", "2"))
+
+
+class Overloaded(Exception):
+    pass
+
+
+class WorkerPool:
+    def __init__(self, threads=THREADS, queue_limit=QUEUE_LIMIT, limits=None, default_limit=ENDPOINT_CONCURRENCY):
+        self.threads = threads
+        self.queue_limit = queue_limit
+        self.limits = dict(limits or {})
+        self.default_limit = default_limit
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix="inference") if threads > 0 else None
+        self.pending = 0
+        self._sems = {}
+        self.stats = {}  # endpoint -> counters
+
+    def _endpoint(self, name):
+        if name not in self._sems:
+            self._sems[name] = asyncio.Semaphore(self.limits.get(name, self.default_limit))
+            self.stats[name] = {"running": 0, "waiting": 0, "completed": 0, "rejected": 0, "busy_seconds": 0.0}
+        return self._sems[name], self.stats[name]
+
+    async def run(self, name, fn, *args):
+        """Run ``fn(*args)`` on the pool under the endpoint's cap; raises Overloaded when full."""
+        sem, stats = self._endpoint(name)
+        if self.pending >= self.queue_limit:
+            stats["rejected"] += 1
+            raise Overloaded(name)
+        self.pending += 1
+        stats["waiting"] += 1
+        started = False
+        try:
+            async with sem:
+                stats["waiting"] -= 1
+                stats["running"] += 1
+                started = True
+                t0 = time.perf_counter()
+                try:
+                    if self.executor is None:
+                        return fn(*args)
+                    return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+                finally:
+                    stats["running"] -= 1
+                    stats["completed"] += 1
+                    stats["busy_seconds"] += time.perf_counter() - t0
+        finally:
+            if not started:
+                stats["waiting"] -= 1  # dibatalkan saat menunggu giliran
+            self.pending -= 1
+
+    def info(self):
+        return {
+            "threads": self.threads,
+            "queue_limit": self.queue_limit,
+            "pending": self.pending,
+            "endpoints": {
+                name: dict(s, limit=self.limits.get(name, self.default_limit), busy_seconds=round(s["busy_seconds"], 3))
+                for name, s in self.stats.items()
+            },
+        }
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
@@ -1,5 +1,8 @@
-import asyncio, os, time, logging
+import asyncio, json, os, time, logging
+from datetime import datetime
+from decimal import Decimal
 import aiomysql
+import httpx
 import websockets
 from websockets.server import WebSocketServerProtocol
 from urllib.parse import urlparse
@@ -35,6 +38,92 @@ async def init_pool():
     logger.info("? MySQL pool created")
 
 
+# ---------------------
+# Event forwarding (ml-service)
+# ---------------------
+# Event OCPP dikirim ke ml-service (POST ML_EVENTS_URL) secara batch dari
+# antrian terbatas. Handler OCPP tidak pernah menunggu ml-service: kalau
+# antrian penuh, event baru dibuang dan ml-service menyinkronkan ulang dari
+# DB. Batch yang gagal terkirim (ml-service mati, timeout, 5xx) dikirim
+# ulang dengan backoff sampai ML_EVENTS_RETRY_MAX detik, bukan dibuang;
+# hanya batch yang ditolak permanen (4xx) atau gagal di-encode yang dibuang.
+# ML_EVENTS_URL kosong = forwarding mati.
+ML_EVENTS_URL = os.getenv("ML_EVENTS_URL", "")
+EVENTS = asyncio.Queue(maxsize=int(os.getenv("ML_EVENTS_BUFFER", "10000")))
+EVENT_BATCH = 500
+RETRY_MIN = 1.0
+RETRY_MAX = float(os.getenv("ML_EVENTS_RETRY_MAX", "30"))
+dropped_events = 0
+
+def emit(event_type, **fields):
+    global dropped_events
+    if not ML_EVENTS_URL:
+        return
+    try:
+        EVENTS.put_nowait({"type": event_type, "ts": time.time(), **fields})
+    except asyncio.QueueFull:
+        dropped_events += 1
+
+def meter_reading(meter_value):
+    """Latest total active power (W) and energy register (Wh) in a MeterValues payload."""
+    power_w = energy_wh = None
+    for sample in meter_value[-1:]:
+        for sv in sample.get("sampled_value", []):
+            if sv.get("phase"):
+                continue  # hanya nilai total, bukan per fase
+            measurand = sv.get("measurand", "Energy.Active.Import.Register")
+            unit = sv.get("unit", "")
+            try:
+                value = float(sv["value"]) * (1000 if unit in ("kW", "kWh") else 1)
+            except (KeyError, ValueError):
+                continue
+            if measurand == "Power.Active.Import":
+                power_w = value
+            elif measurand == "Energy.Active.Import.Register":
+                energy_wh = value
+    return power_w, energy_wh
+
+def _json_default(value):
+    # nilai dari DB (DECIMAL, DATETIME) tidak bisa di-encode json bawaan
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return str(value)
+
+def _retryable(error):
+    if isinstance(error, httpx.HTTPStatusError):
+        code = error.response.status_code
+        return code >= 500 or code in (408, 429)
+    return isinstance(error, httpx.TransportError)  # koneksi, timeout
+
+async def forward_events(client=None):
+    async with client or httpx.AsyncClient(timeout=5) as client:
+        batch, delay = [], RETRY_MIN
+        while True:
+            if not batch:
+                batch = [await EVENTS.get()]
+            while len(batch) < EVENT_BATCH and not EVENTS.empty():
+                batch.append(EVENTS.get_nowait())
+            try:
+                body = json.dumps(batch, default=_json_default)
+                resp = await client.post(ML_EVENTS_URL, content=body, headers={"Content-Type": "application/json"})
+                resp.raise_for_status()
+            except Exception as e:  # CancelledError bukan Exception: shutdown tetap jalan
+                if not _retryable(e):
+                    logger.exception("? %d event ke ml-service dibuang: %s", len(batch), e)
+                    batch = []
+                    continue
+                logger.warning(
+                    "? %d event ke ml-service gagal, coba lagi dalam %.0f s (%d dibuang karena antrian penuh): %s",
+                    len(batch), delay, dropped_events, e,
+                )
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RETRY_MAX)
+                continue
+            batch, delay = [], RETRY_MIN
+
+
 # ---------------------
 # ChargePoint class
 # ---------------------
@@ -86,12 +175,24 @@ class ChargePoint(CPBase):
                     """,
                     (self.id, connector_id, status, error_code),
                 )
+        emit("status", cp_id=self.id, connector_id=connector_id, status=status, error_code=error_code)
         return call_result.StatusNotificationPayload()
 
     @on(Action.Authorize)
     async def on_authorize(self, id_tag, **kwargs):
         return call_result.AuthorizePayload(id_tag_info={"status": AuthorizationStatus.accepted})
 
+    @on(Action.MeterValues)
+    async def on_meter_values(self, connector_id, meter_value, **kwargs):
+        # tidak disimpan di DB; hanya diteruskan ke detector ml-service
+        power_w, energy_wh = meter_reading(meter_value)
+        if power_w is not None or energy_wh is not None:
+            emit(
+                "meter", cp_id=self.id, connector_id=connector_id, transaction_id=kwargs.get("transaction_id"),
+                power_w=power_w, energy_wh=energy_wh,
+            )
+        return call_result.MeterValuesPayload()
+
     @on(Action.StartTransaction)
     async def on_start_tx(self, connector_id, id_tag, meter_start, **kwargs):
         async with POOL.acquire() as conn:
@@ -104,6 +205,7 @@ class ChargePoint(CPBase):
                     (self.id, connector_id, id_tag, meter_start),
                 )
                 tx_id = cur.lastrowid
+        emit("start", cp_id=self.id, connector_id=connector_id, transaction_id=tx_id, id_tag=id_tag, meter_start=meter_start)
         return call_result.StartTransactionPayload(
             transaction_id=tx_id,
             id_tag_info={"status": AuthorizationStatus.accepted},
@@ -117,6 +219,19 @@ class ChargePoint(CPBase):
                     "UPDATE transactions SET meter_stop=%s, stop_ts=NOW() WHERE id=%s",
                     (meter_stop, transaction_id),
                 )
+                row = None
+                if ML_EVENTS_URL:
+                    await cur.execute(
+                        "SELECT connector_id, id_tag, meter_start, UNIX_TIMESTAMP(start_ts) FROM transactions WHERE id=%s",
+                        (transaction_id,),
+                    )
+                    row = await cur.fetchone()
+        if row:
+            emit(
+                "stop", cp_id=self.id, transaction_id=transaction_id, connector_id=row[0], id_tag=row[1],
+                meter_start=row[2], meter_stop=meter_stop,
+                start_ts=float(row[3]) if row[3] is not None else None,  # start_ts NULL (data lama): event stop tetap dikirim
+            )
         return call_result.StopTransactionPayload(id_tag_info={"status": AuthorizationStatus.accepted})
 
 
@@ -158,9 +273,10 @@ async def handler(ws: WebSocketServerProtocol, path):
 # ---------------------
 async def main():
     await init_pool()
+    background = [forward_events()] if ML_EVENTS_URL else []
     async with websockets.serve(handler, "0.0.0.0", 9000, subprotocols=["ocpp1.6"]):
         logger.info("?? OCPP Server running on ws://0.0.0.0:9000")
-        await asyncio.Future()  # run forever
+        await asyncio.gather(asyncio.Future(), *background)  # run forever (forwarder ikut di-await, tidak di-GC)
 
 if __name__ == "__main__":
     asyncio.run(main())
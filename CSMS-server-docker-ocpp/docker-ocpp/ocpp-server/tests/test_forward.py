@@ -0,0 +1,106 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import httpx
+import pytest
+
+import server_ocpp
+
+
+@pytest.fixture(autouse=True)
+def forwarding(monkeypatch):
+    monkeypatch.setattr(server_ocpp, "ML_EVENTS_URL", "http://ml-service/events")
+    monkeypatch.setattr(server_ocpp, "RETRY_MIN", 0.001)
+    monkeypatch.setattr(server_ocpp, "RETRY_MAX", 0.004)
+
+
+def _run(responses, events, until, steps=1000):
+    """Forward ``events`` through a mock ml-service answering with ``responses`` (then 200)."""
+    received, calls = [], []
+
+    def handler(request):
+        calls.append(request)
+        reply = responses.pop(0) if responses else 200
+        if isinstance(reply, Exception):
+            raise reply
+        if reply == 200:
+            received.extend(json.loads(request.content))
+        return httpx.Response(reply, json={})
+
+    async def main():
+        server_ocpp.EVENTS = asyncio.Queue()
+        for event in events:
+            server_ocpp.emit(**event)
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        task = asyncio.create_task(server_ocpp.forward_events(client))
+        for _ in range(steps):
+            if until(received, calls):
+                break
+            await asyncio.sleep(0.001)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    return received, calls
+
+
+def test_failed_batch_is_retried():
+    events = [{"event_type": "status", "cp_id": f"CP_{i}"} for i in range(3)]
+    received, calls = _run([503, httpx.ConnectError("down")], events, lambda r, c: len(r) == 3)
+    assert [e["cp_id"] for e in received] == ["CP_0", "CP_1", "CP_2"]
+    assert len(calls) == 3  # 503, gagal koneksi, lalu berhasil
+
+
+def test_rejected_batch_is_dropped():
+    events = [{"event_type": "status", "cp_id": "CP_1"}]
+    # backoff maksimum 4 ms: 50 ms cukup untuk beberapa retry kalau batch tidak dibuang
+    received, calls = _run([422], events, lambda r, c: False, steps=50)
+    assert received == [] and len(calls) == 1
+
+
+def test_db_values_are_encoded():
+    start = datetime(2024, 3, 1, 8, tzinfo=timezone.utc)
+    events = [{"event_type": "stop", "cp_id": "CP_1", "meter_start": Decimal("12.5"), "start_ts": start}]
+    received, _ = _run([], events, lambda r, c: r)
+    assert received[0]["meter_start"] == 12.5 and received[0]["start_ts"] == start.timestamp()
+
+
+class _Db:
+    """POOL stand-in for on_stop_tx: the UPDATE, then the SELECT of the stopped session."""
+
+    def __init__(self, row):
+        self.row, self.executed = row, []
+
+    def acquire(self):
+        return self
+
+    def cursor(self):
+        return self
+
+    async def execute(self, sql, args):
+        self.executed.append(sql.split()[0])
+
+    async def fetchone(self):
+        return self.row
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+@pytest.mark.parametrize("start_epoch, expected", [(1709280000, 1709280000.0), (None, None)])
+def test_stop_event_tolerates_null_start(monkeypatch, start_epoch, expected):
+    db = _Db((1, "TAG", 100, start_epoch))
+    monkeypatch.setattr(server_ocpp, "POOL", db)
+    server_ocpp.EVENTS = asyncio.Queue()
+    cp = type("CP", (), {"id": "CP_1"})()
+    result = asyncio.run(server_ocpp.ChargePoint.on_stop_tx(cp, transaction_id=7, meter_stop=2100))
+    assert result.id_tag_info["status"] == server_ocpp.AuthorizationStatus.accepted
+    assert db.executed == ["UPDATE", "SELECT"]
+    event = server_ocpp.EVENTS.get_nowait()
+    assert event["transaction_id"] == 7 and event["start_ts"] == expected